@@ -0,0 +1,102 @@
+"""Benchmark the capital allocation solver across problem sizes.
+
+Solves random portfolios of candidates with a budget of a third of their total cost. "typical"
+candidates have unrelated prices and cash flows, "correlated" ones have a cash flow close to a
+fixed share of their price, the hard case for branch and bound, and "round" ones have prices in
+whole thousands of dollars, which the dynamic program scales down. For each size it reports the
+time, search nodes and optimality gap of each method, and, up to --brute-force candidates, the
+time of trying every subset.
+
+Usage: python bench/allocation.py [--sizes 16,100,1000,10000] [--time-limit 2]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from itertools import combinations
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.allocate import allocate  # noqa: E402
+from roi.roi import Expense, Income, Investment  # noqa: E402
+
+
+def candidates(kind, count, rng):
+    invests = []
+    for i in range(count):
+        if kind == "round":
+            price = rng.randint(50, 400) * 1000
+        else:
+            price = rng.randint(50000, 400000)
+        if kind == "correlated":
+            rent = price // 100 + rng.randint(0, 50)
+        else:
+            rent = rng.randint(500, 4000)
+        invests.append(
+            Investment(
+                f"{kind}{i}",
+                [Income("Rent", rent)],
+                [Expense("Taxes", rng.randint(0, 400))],
+                price,
+            )
+        )
+    return invests
+
+
+def brute_force(invests, budget_cents):
+    best = 0
+    for size in range(len(invests) + 1):
+        for chosen in combinations(invests, size):
+            if sum(investment.invest_cents for investment in chosen) <= budget_cents:
+                best = max(
+                    best,
+                    sum(
+                        investment.income_cents - investment.expense_cents
+                        for investment in chosen
+                    )
+                    * 12,
+                )
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="16,100,1000,10000")
+    parser.add_argument("--time-limit", type=float, default=2.0)
+    parser.add_argument("--brute-force", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(
+        f"{'kind':<12}{'size':>7} {'method':<22}{'seconds':>9}{'nodes':>10}"
+        f"{'gap':>10}  optimal"
+    )
+    for kind in ("typical", "correlated", "round"):
+        for size in map(int, args.sizes.split(",")):
+            rng = random.Random(args.seed)
+            invests = candidates(kind, size, rng)
+            budget = sum(investment.total_invest for investment in invests) / 3
+            for method in ("auto", "greedy"):
+                allocation = allocate(invests, budget, method, args.time_limit)
+                print(
+                    f"{kind:<12}{size:>7} {method + '/' + allocation.method:<22}"
+                    f"{allocation.elapsed:>9.3f}{allocation.nodes:>10}"
+                    f"{allocation.gap:>10.2e}  {allocation.optimal}"
+                )
+            if size <= args.brute_force:
+                started = time.perf_counter()
+                best = brute_force(invests, allocation.budget_cents)
+                elapsed = time.perf_counter() - started
+                exact = allocate(invests, budget)
+                if exact.optimal and exact.cash_flow_cents != best:
+                    raise AssertionError(
+                        f"{kind} {size}: the solver missed the optimum"
+                    )
+                print(f"{kind:<12}{size:>7} {'brute force':<22}{elapsed:>9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Measure how batch_evaluate scales with the number of worker processes.
+
+Packing the Investments into int64 columns reads every one of them and happens in this process,
+while the workers only do O(1) arithmetic per Investment on the packed totals. The benchmark
+times packing and the in-process evaluation separately first, which gives the best speedup any
+number of workers could reach (Amdahl's law), then times 1, 2, 4, ... workers against it.
+Evaluating in this process, workers=1, is the recommended path.
+
+Usage: python bench/batch_scaling.py [--investments 1000000] [--max-workers 8]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.batch import batch_evaluate, evaluate_packed, pack_investments  # noqa: E402
+from roi.batch import np  # noqa: E402
+from roi.roi import Expense, Income, Investment  # noqa: E402
+
+
+def build(count):
+    return [
+        Investment(
+            f"invest{i}",
+            [Income("Rent", 1000 + i % 2000), Income("Parking", i % 100)],
+            [Expense("Taxes", 100 + i % 300), Expense("Insurance", 50)],
+            100000 + i,
+        )
+        for i in range(count)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--investments", type=int, default=1_000_000)
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    count = args.investments
+    investments = build(count)
+    chunk_size = 50_000
+    chunks = [
+        investments[start : start + chunk_size] for start in range(0, count, chunk_size)
+    ]
+    started = time.perf_counter()
+    packed = [pack_investments(chunk) for chunk in chunks]
+    pack_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for columns in packed:
+        evaluate_packed(columns, np is not None)
+    evaluate_time = time.perf_counter() - started
+    print(
+        f"packing {pack_time:.3f} s in this process, evaluating {evaluate_time:.3f} s, "
+        f"so no number of workers can beat {(pack_time + evaluate_time) / pack_time:.2f}x"
+    )
+
+    baseline = None
+    single = None
+    workers = 1
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>10}")
+    while workers <= args.max_workers:
+        started = time.perf_counter()
+        results = batch_evaluate(investments, workers=workers, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        if baseline is None:
+            baseline, single = results, elapsed
+        elif results != baseline:
+            raise AssertionError(f"results with {workers} workers differ")
+        print(f"{workers:>8}{elapsed:>10.3f}{single / elapsed:>10.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Measure range totals over a History of monthly actuals with and without its block index.
+
+Records --months months of actuals for --investments investments, three line items each, in date
+order, then times the trailing 12 month cash flow of the whole portfolio and of one investment
+and the realized ROI comparison of every investment. Each is timed through the block index and
+as a plain scan of every row, and the blocks each indexed query had to scan are reported.
+
+Usage: python bench/history_scan.py [--investments 1000] [--months 120] [--block-size 4096]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.history import History  # noqa: E402
+from roi.roi import Expense, Income, Investment, User, UserRegistry  # noqa: E402
+
+
+def build(investments, months, block_size):
+    invests = [
+        Investment(
+            f"invest{i}",
+            [Income("Rent", 1000 + i % 2000)],
+            [Expense("Taxes", 100 + i % 300), Expense("Insurance", 50)],
+            100000 + i,
+        )
+        for i in range(investments)
+    ]
+    user = User("owner", invests, registry=UserRegistry())
+    history = History(block_size=block_size)
+    for month in range(months):
+        day = date(2000 + month // 12, month % 12 + 1, 1)
+        for investment in invests:
+            history.record_investment((user, investment), day)
+    return [(user, investment) for investment in invests], history
+
+
+def full_scan(history, investment_id, low, high):
+    # what a range total costs without the block index
+    income = expense = 0
+    kinds = history.kinds
+    for day, row_investment, item, cents in zip(
+        history.days, history.investments, history.items, history.cents
+    ):
+        if low <= day < high and investment_id in (None, row_investment):
+            if kinds[item] > 0:
+                income += cents
+            else:
+                expense += cents
+    return income - expense
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--investments", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=120)
+    parser.add_argument("--block-size", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    invests, history = build(args.investments, args.months, args.block_size)
+    elapsed = time.perf_counter() - started
+    blocks = len(history.min_day)
+    print(
+        f"recorded {len(history):,} actuals in {blocks} blocks in {elapsed:.2f} s "
+        f"({elapsed / len(history) * 1e6:.2f} us each), NumPy scans: {history.use_numpy}"
+    )
+
+    start, end = history.window()
+    low, high = start.toordinal(), end.toordinal()
+    target = invests[len(invests) // 2]
+    target_id = history.investment_id(target)
+    print(f"{'query':<34}{'indexed':>12}{'scanned':>10}{'full scan':>12}")
+    for label, indexed, scan in (
+        (
+            "trailing 12 months, portfolio",
+            lambda: history.cash_flow(None, start, end),
+            lambda: full_scan(history, None, low, high),
+        ),
+        (
+            "trailing 12 months, investment",
+            lambda: history.trailing_cash_flow(target),
+            lambda: full_scan(history, target_id, low, high),
+        ),
+    ):
+        indexed_time, total = timed(indexed, args.repeat)
+        scanned = history.scanned
+        scan_time, scanned_total = timed(scan, 1)
+        if scanned_total != int(total * 100):
+            raise AssertionError(f"{label}: the index and the scan disagree")
+        print(
+            f"{label:<34}{indexed_time * 1000:>10.2f}ms{scanned:>6}/{blocks:<3}"
+            f"{scan_time * 1000:>10.1f}ms"
+        )
+
+    compare_time, _ = timed(lambda: [history.compare(i) for i in invests], 1)
+    print(
+        f"realized vs projected ROI of all {len(invests)} investments: "
+        f"{compare_time:.3f} s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
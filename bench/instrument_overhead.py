@@ -0,0 +1,77 @@
+"""Measure the overhead of roi.instrument, enabled and after it is disabled again.
+
+Runs the same workload of Investment construction, edits, line item parsing and registry lookups
+before instrumentation is ever enabled, while it is enabled and after it is disabled, and
+reports the time per round of each. Exits with 1 if the disabled run is more than --threshold
+slower than the baseline.
+
+Usage: python bench/instrument_overhead.py [--rounds 2000] [--repeat 7] [--threshold 0.05]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi import instrument  # noqa: E402
+from roi.roi import Expense, Income, Investment, User, UserRegistry  # noqa: E402
+
+
+def workload(rounds):
+    registry = UserRegistry()
+    for i in range(100):
+        User(f"user{i}", registry=registry)
+    rent = Income("Rent", "2000")
+
+    def run():
+        for i in range(rounds):
+            invest = Investment(
+                "Duplex", [rent, Income("Parking", "150.50")], [Expense("Tax", "500")]
+            )
+            invest.set_total_invest("100000")
+            rent.set_amount("2100")
+            invest.roi
+            registry.get(f"USER{i % 100}")
+        rent.set_amount("2000")
+
+    return run
+
+
+def measure(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        run()
+        timings.append(time.perf_counter_ns() - started)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--threshold", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    run = workload(args.rounds)
+    run()
+    baseline = measure(run, args.repeat)
+    with instrument.instrumented():
+        enabled = measure(run, args.repeat)
+    disabled = measure(run, args.repeat)
+
+    for label, elapsed in (
+        ("never enabled", baseline),
+        ("enabled", enabled),
+        ("disabled", disabled),
+    ):
+        change = elapsed / baseline - 1
+        print(f"{label:<16}{elapsed / args.rounds:>10.0f} ns/round {change:>+8.1%}")
+    return 1 if disabled / baseline - 1 > args.threshold else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
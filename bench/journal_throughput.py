@@ -0,0 +1,108 @@
+"""Measure journal write throughput with group commit and the time to recover from it.
+
+Edits the total_invest of random Investments and commits every N edits, for several N, then
+runs threads that each commit after every edit so their commits share fsyncs. Finally reopens
+the journal and reports how long recovery takes.
+
+Usage: python bench/journal_throughput.py [--users 200] [--per-user 100] [--edits 50000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.journal import Journal  # noqa: E402
+from roi.roi import Expense, Income, Investment, User, UserRegistry  # noqa: E402
+
+
+def build(users, per_user):
+    registry = UserRegistry()
+    for u in range(users):
+        User(
+            f"user{u}",
+            [
+                Investment(
+                    f"Invest{i}",
+                    [Income("Rent", 1000 + i), Income("Parking", 50)],
+                    [Expense("Taxes", 300)],
+                    100000 + i,
+                )
+                for i in range(per_user)
+            ],
+            registry=registry,
+        )
+    return registry
+
+
+def edit_rate(journal, investments, edits, commit_every):
+    rng = random.Random(commit_every)
+    started = time.perf_counter()
+    for i in range(edits):
+        rng.choice(investments).set_total_invest(rng.randrange(1, 10**7))
+        if (i + 1) % commit_every == 0:
+            journal.commit()
+    journal.commit()
+    return edits / (time.perf_counter() - started)
+
+
+def threaded_rate(journal, investments, edits, threads):
+    per_thread = edits // threads
+
+    def work(seed):
+        rng = random.Random(seed)
+        for _ in range(per_thread):
+            rng.choice(investments).set_total_invest(rng.randrange(1, 10**7))
+            journal.commit()
+
+    commits = journal.commits
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return per_thread * threads / elapsed, journal.commits - commits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=100)
+    parser.add_argument("--edits", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), "portfolio.journal")
+    registry = build(args.users, args.per_user)
+    journal = Journal(path, registry, batch_size=10000, compact_every=None)
+    investments = [
+        investment for user in registry.users() for investment in user.investments
+    ]
+    for commit_every in (1, 10, 100, 1000):
+        count = min(args.edits, 2000 * commit_every)
+        rate = edit_rate(journal, investments, count, commit_every)
+        print(f"commit every {commit_every:>5} edits {rate:>12,.0f} edits/s")
+    for threads in (4, 16):
+        rate, commits = threaded_rate(journal, investments, 4000, threads)
+        print(
+            f"{threads:>2} threads, commit per edit {rate:>9,.0f} edits/s"
+            f" in {commits} fsyncs"
+        )
+    journal.close()
+    print(f"journal size {os.path.getsize(path) / 1e6:.1f} MB")
+
+    started = time.perf_counter()
+    recovered = Journal(path, compact_every=None)
+    elapsed = time.perf_counter() - started
+    print(f"recovered {recovered.recovered} records in {elapsed:.2f} s")
+    recovered.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
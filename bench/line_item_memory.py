@@ -0,0 +1,111 @@
+"""Measure the memory used per line item.
+
+Compares the original dict-backed Decimal line item, the slotted Income and LineItemArray, then
+the line items of a portfolio of Investments built privately and through a LineItemCatalog.
+
+Usage: python bench/line_item_memory.py [--count 100000]
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.catalog import LineItemCatalog  # noqa: E402
+from roi.lineitems import LineItemArray  # noqa: E402
+from roi.roi import Expense, Income, Investment  # noqa: E402
+
+NAMES = ["Rent", "Parking", "Laundry", "Storage"]
+
+
+class DictIncome:
+    """The line item as it was before __slots__ and integer cents."""
+
+    def __init__(self, name: str, amount: str) -> None:
+        self.name = name
+        self.amount = Decimal(amount).quantize(Decimal("1.00"))
+
+
+def amounts(count):
+    for i in range(count):
+        yield NAMES[i % len(NAMES)], f"{1000 + i % 5000}.{i % 100:02d}"
+
+
+def build_dict(count):
+    return [DictIncome(name, amount) for name, amount in amounts(count)]
+
+
+def build_slots(count):
+    return [Income(name, amount) for name, amount in amounts(count)]
+
+
+def build_array(count):
+    line_items = LineItemArray(Income)
+    for name, amount in amounts(count):
+        line_items.append(name, amount)
+    return line_items
+
+
+# typical line items of a rental, amounts repeat across the portfolio
+PORTFOLIO_ITEMS = [
+    (Income, "Rent", lambda i: 1000 + i % 50 * 25),
+    (Income, "Parking", lambda i: 50),
+    (Expense, "Taxes", lambda i: 200 + i % 20 * 10),
+    (Expense, "Insurance", lambda i: 75),
+    (Expense, "Hoa", lambda i: 150),
+]
+
+
+def build_portfolio(count, item=None):
+    if item is None:
+        item = lambda item_class, name, amount: item_class(name, amount)  # noqa: E731
+    investments = []
+    for i in range(count):
+        incomes = []
+        expenses = []
+        for item_class, name, amount in PORTFOLIO_ITEMS:
+            items = incomes if item_class is Income else expenses
+            items.append(item(item_class, name, amount(i)))
+        investments.append(Investment(f"Invest{i}", incomes, expenses, 100000))
+    return investments
+
+
+def build_portfolio_catalog(count):
+    return build_portfolio(count, LineItemCatalog().item)
+
+
+def measure(build, count):
+    tracemalloc.start()
+    items = build(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return current / count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    count = args.count
+    for label, build in (
+        ("dict + Decimal", build_dict),
+        ("__slots__ + cents", build_slots),
+        ("LineItemArray", build_array),
+    ):
+        print(f"{label:<20}{measure(build, count):>10.1f} bytes/item")
+    investments = count // len(PORTFOLIO_ITEMS)
+    for label, build in (
+        ("private items", build_portfolio),
+        ("LineItemCatalog", build_portfolio_catalog),
+    ):
+        size = measure(build, investments)
+        print(f"{label:<20}{size:>10.1f} bytes/investment")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
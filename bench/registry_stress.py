@@ -0,0 +1,116 @@
+"""Stress a shared UserRegistry from writer and reader threads.
+
+Writer threads create users with get_or_create and add and remove their investments. Reader
+threads take registry and user snapshots and total the ROI of a user's investments. Each round
+runs for --seconds with a growing number of readers against the same writers, reports reads and
+writes per second and the p99 read latency, then checks that no investment was lost or
+duplicated.
+
+Usage: python bench/registry_stress.py [--users 1000] [--writers 4] [--seconds 2]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.roi import Expense, Income, Investment, UserRegistry  # noqa: E402
+
+
+def investment(i):
+    return Investment(
+        f"Invest{i}", [Income("Rent", 1000 + i % 100)], [Expense("Taxes", 300)], 100000
+    )
+
+
+def run_round(registry, expected, users, writers, readers, seconds):
+    stop = threading.Event()
+    reads = [0] * readers
+    writes = [0] * writers
+    latencies = [[] for _ in range(readers)]
+    errors = []
+
+    def write(worker):
+        rng = random.Random(worker)
+        try:
+            while not stop.is_set():
+                # some names are new, so creation races with the other writers
+                user, _ = registry.get_or_create(f"user{rng.randrange(users * 2)}")
+                with user.lock:
+                    if rng.random() < 0.5 or not len(user.investments):
+                        user.add_investment(investment(rng.randrange(1000)))
+                        expected[user.username] = expected.get(user.username, 0) + 1
+                    else:
+                        user.remove_investment(user.investments.snapshot()[0])
+                        expected[user.username] -= 1
+                writes[worker] += 1
+        except Exception as e:
+            errors.append(e)
+
+    def read(worker):
+        rng = random.Random(-worker)
+        record = latencies[worker].append
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                snapshot = registry.snapshot()
+                user = snapshot.get(f"user{rng.randrange(users * 2)}")
+                if user is not None:
+                    sum(investment.roi for investment in user.investments.snapshot())
+                record(time.perf_counter() - started)
+                reads[worker] += 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=read, args=(n,)) for n in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    merged = sorted(latency for worker in latencies for latency in worker)
+    p99 = merged[int(len(merged) * 0.99)] if merged else 0
+    return sum(reads) / seconds, sum(writes) / seconds, p99
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    registry = UserRegistry()
+    expected = {}
+    for u in range(args.users):
+        user, _ = registry.get_or_create(f"user{u}")
+        for i in range(10):
+            user.add_investment(investment(i))
+        expected[user.username] = 10
+
+    print(f"{'readers':>8}{'reads/s':>14}{'writes/s':>12}{'p99 read':>12}")
+    for readers in (1, 2, 4, 8):
+        reads, writes, p99 = run_round(
+            registry, expected, args.users, args.writers, readers, args.seconds
+        )
+        print(f"{readers:>8}{reads:>14,.0f}{writes:>12,.0f}{p99 * 1e6:>10.0f}us")
+
+    lost = {
+        username: count
+        for username, count in expected.items()
+        if len(registry[username].investments) != count
+    }
+    print(f"{len(registry)} users, {len(lost)} with a wrong investment count")
+    return 1 if lost else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
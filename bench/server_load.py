@@ -0,0 +1,121 @@
+"""Load test the ROI server with many concurrent, pipelining clients.
+
+Starts a server on a free local port unless --port is given, then runs clients that each keep
+--depth requests in flight over a mix of create, view, edit and delete operations, and reports
+throughput and p50/p99 latency.
+
+Usage: python bench/server_load.py [--clients 50] [--requests 200] [--depth 8] [--port PORT]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.server import ROIServer  # noqa: E402
+
+
+def requests_for(client, count):
+    # every client has its own user, and a few share one so the per-user locks are contended
+    user = f"user{client % 10}" if client % 5 == 0 else f"user{client}"
+    yield {"op": "choose_user", "user": user}
+    for i in range(count - 1):
+        name = f"C{client} Invest{i // 4 % 20}"
+        step = i % 4
+        if step == 0:
+            yield {
+                "op": "create_investment",
+                "user": user,
+                "name": name,
+                "incomes": [{"name": "Rent", "amount": "2000"}],
+                "expenses": [{"name": "Taxes", "amount": "350.25"}],
+                "total_invest": "150000",
+            }
+        elif step == 1:
+            yield {"op": "view_investment", "user": user, "name": name}
+        elif step == 2:
+            yield {
+                "op": "edit_investment",
+                "user": user,
+                "name": name,
+                "total_invest": str(100000 + i),
+            }
+        else:
+            yield {"op": "delete_investment", "user": user, "name": name}
+
+
+async def run_client(host, port, client, count, depth, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    sent = {}
+    requests = iter(requests_for(client, count))
+    errors = 0
+
+    def send_next():
+        request = next(requests, None)
+        if request is None:
+            return False
+        request["id"] = len(sent)
+        sent[request["id"]] = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        return True
+
+    in_flight = 0
+    while in_flight < depth and send_next():
+        in_flight += 1
+    while in_flight:
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - sent[response["id"]])
+        errors += not response["ok"]
+        in_flight -= 1
+        if send_next():
+            in_flight += 1
+    writer.close()
+    await writer.wait_closed()
+    return errors
+
+
+async def run(clients, count, depth, host, port):
+    server = None
+    if port is None:
+        server = ROIServer()
+        await server.start(host, 0)
+        port = server.port
+    latencies = []
+    started = time.perf_counter()
+    errors = await asyncio.gather(
+        *(
+            run_client(host, port, client, count, depth, latencies)
+            for client in range(clients)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        await server.close()
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f} seconds")
+    print(f"throughput {len(latencies) / elapsed:,.0f} requests/s")
+    print(f"p50 {percentiles[49] * 1000:.2f} ms, p99 {percentiles[98] * 1000:.2f} ms")
+    print(f"{sum(errors)} error responses")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="per client")
+    parser.add_argument("--depth", type=int, default=8, help="pipelined requests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="load an already running server")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.clients, args.requests, args.depth, args.host, args.port))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Compare cold start from a binary snapshot with loading from SQLite.
+
+Usage: python bench/snapshot_load.py [--users 2000] [--per-user 100]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.roi import Expense, Income, Investment, User, UserRegistry  # noqa: E402
+from roi.snapshot import Snapshot, write_snapshot  # noqa: E402
+from roi.storage import SQLiteStorage  # noqa: E402
+
+
+def build(users, per_user):
+    registry = UserRegistry()
+    for u in range(users):
+        User(
+            f"user{u}",
+            [
+                Investment(
+                    f"Invest{i}",
+                    [Income("Rent", 1000 + i), Income("Parking", 50)],
+                    [Expense("Taxes", 300), Expense("Insurance", 75)],
+                    100000 + i,
+                )
+                for i in range(per_user)
+            ],
+            registry=registry,
+        )
+    return registry
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    print(f"{label:<40}{(time.perf_counter() - started) * 1000:>12.2f} ms")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--per-user", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    users = args.users
+    registry = build(users, args.per_user)
+    directory = tempfile.mkdtemp()
+    snapshot_path = os.path.join(directory, "portfolio.snap")
+    database_path = os.path.join(directory, "portfolio.db")
+
+    timed("write snapshot", lambda: write_snapshot(snapshot_path, registry.users()))
+    with SQLiteStorage(database_path) as storage:
+        timed("write sqlite", lambda: storage.save_users(registry.users()))
+    print(f"snapshot size {os.path.getsize(snapshot_path) / 1e6:.1f} MB")
+
+    snapshot = timed("open snapshot", lambda: Snapshot(snapshot_path))
+    timed(
+        "snapshot: one user's metrics",
+        lambda: [view.roi for view in snapshot.user_investments(f"user{users // 2}")],
+    )
+    timed("snapshot: compute every metric", snapshot.compute)
+    snapshot.close()
+
+    with SQLiteStorage(database_path) as storage:
+        timed("sqlite: load every user", lambda: storage.load_users(lazy=False))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Measure the cold start time of every python -m roi command.
+
+Runs each command in a fresh interpreter --repeat times and reports the median wall time next to
+a bare interpreter start. Commands run with --help, except evaluate, which evaluates a small
+generated CSV file end to end. Exits with 1 if that evaluate run is slower than --budget seconds.
+
+Usage: python bench/startup.py [--repeat 11] [--budget 0.15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from roi.__main__ import COMMANDS  # noqa: E402
+
+
+def small_import_file(directory, investments=50):
+    path = os.path.join(directory, "small.csv")
+    with open(path, "w") as file:
+        file.write("user,investment,kind,name,amount,total_invest\n")
+        for i in range(investments):
+            file.write(f"user{i % 5},Invest{i},income,Rent,{1000 + i},{100000 + i}\n")
+            file.write(f"user{i % 5},Invest{i},expense,Taxes,300,\n")
+    return path
+
+
+def cold_start(argv, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *argv],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=11)
+    parser.add_argument("--budget", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    path = small_import_file(tempfile.mkdtemp())
+    runs = [("python", ["-c", "pass"])]
+    for command in COMMANDS:
+        if command == "evaluate":
+            runs.append(("evaluate small.csv", ["-m", "roi", "evaluate", path]))
+        else:
+            runs.append((f"{command} --help", ["-m", "roi", command, "--help"]))
+
+    evaluate = None
+    for label, run in runs:
+        elapsed = cold_start(run, args.repeat)
+        print(f"{label:<24}{elapsed * 1000:>10.1f} ms")
+        if run[2:3] == ["evaluate"]:
+            evaluate = elapsed
+    if evaluate > args.budget:
+        print(f"evaluate took {evaluate:.3f} s, over the {args.budget:.3f} s budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""Benchmark suite for the roi package hot paths.
+
+Every benchmark is timed over several repeats and reported as nanoseconds per operation.
+Results are written as JSON, and a previous run can be passed as a baseline to flag regressions.
+
+Usage:
+    python bench/suite.py [--output results.json] [--baseline old.json] [--threshold 0.10]
+                          [--filter NAME] [--repeat 5] [--quick]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.batch import batch_evaluate  # noqa: E402
+from roi.catalog import LineItemCatalog  # noqa: E402
+from roi.frame import InvestmentFrame  # noqa: E402
+from roi.money import to_cents  # noqa: E402
+from roi.rollup import PortfolioRollup  # noqa: E402
+from roi.roi import (  # noqa: E402
+    Expense,
+    Income,
+    Investment,
+    InvestmentCollection,
+    User,
+    UserRegistry,
+)
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark.
+
+    The decorated function takes the scale factor and returns (run, ops), where run is a
+    callable that is timed and ops is the number of operations it performs.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def line_items(count, item_class=Income):
+    return [item_class(f"item{i}", f"{100 + i}.25") for i in range(count)]
+
+
+def investments(count, items=3):
+    return [
+        Investment(
+            f"invest{i}",
+            line_items(items, Income),
+            line_items(items, Expense),
+            str(100000 + i),
+        )
+        for i in range(count)
+    ]
+
+
+for _count in (1, 10, 100):
+
+    @benchmark(f"investment_construction[{_count}]")
+    def _construction(scale, count=_count):
+        incomes = line_items(count, Income)
+        expenses = line_items(count, Expense)
+        ops = 2000 * scale
+
+        def run():
+            for _ in range(ops):
+                Investment("invest", incomes, expenses, "100000")
+
+        return run, ops
+
+
+@benchmark("edit_cycle")
+def _edit_cycle(scale):
+    invest = Investment("invest", line_items(10), line_items(10, Expense), "1000")
+    incomes = line_items(10)
+    expenses = line_items(10, Expense)
+    ops = 2000 * scale
+
+    def run():
+        for i in range(ops):
+            invest.set_incomes(incomes)
+            invest.set_expenses(expenses)
+            invest.set_total_invest("250000")
+            invest.roi
+
+    return run, ops
+
+
+@benchmark("single_line_item_edit")
+def _single_edit(scale):
+    income = Income("Rent", "1000")
+    invest = Investment("invest", [income] + line_items(50), [], "100000")
+    ops = 20000 * scale
+
+    def run():
+        for i in range(ops):
+            income.set_amount("1250.50")
+            invest.roi
+
+    return run, ops
+
+
+@benchmark("line_item_parse")
+def _parse(scale):
+    amounts = [f"{i}.{i % 1000:03d}" for i in range(10000 * scale)]
+
+    def run():
+        for amount in amounts:
+            Income("Rent", amount)
+            Expense("Taxes", amount)
+
+    return run, len(amounts) * 2
+
+
+def money_amounts(count):
+    # typed amounts: whole dollars, cents, and a few that need rounding
+    return [
+        (str(i), f"{i}.{i % 100:02d}", f"{i}.5", f"{i}.{i % 1000:03d}")[i % 4]
+        for i in range(count)
+    ]
+
+
+@benchmark("decimal_quantize")
+def _decimal_quantize(scale):
+    amounts = money_amounts(10000 * scale)
+    cent = Decimal("1.00")
+
+    def run():
+        for amount in amounts:
+            int(Decimal(amount).quantize(cent).scaleb(2))
+
+    return run, len(amounts)
+
+
+@benchmark("money_parse")
+def _money_parse(scale):
+    amounts = money_amounts(10000 * scale)
+
+    def run():
+        for amount in amounts:
+            to_cents(amount)
+
+    return run, len(amounts)
+
+
+@benchmark("user_lookup")
+def _user_lookup(scale):
+    registry = UserRegistry()
+    count = 10000 * scale
+    for i in range(count):
+        User(f"user{i}", registry=registry)
+    collection = InvestmentCollection(investments(count, items=0))
+    names = [f"INVEST{i}" for i in range(0, count, 7)]
+    usernames = [f"User{i}" for i in range(0, count, 7)]
+
+    def run():
+        for name, username in zip(names, usernames):
+            collection.get(name)
+            registry.get(username)
+
+    return run, len(names) * 2
+
+
+@benchmark("user_remove_add")
+def _user_remove(scale):
+    count = 10000 * scale
+    invests = investments(count, items=0)
+    user = User("bench", invests, registry=UserRegistry())
+    targets = invests[::7]
+
+    def run():
+        for invest in targets:
+            user.remove_investment(invest)
+            user.add_investment(invest)
+
+    return run, len(targets) * 2
+
+
+@benchmark("portfolio_frame")
+def _portfolio_frame(scale):
+    invests = investments(20000 * scale)
+
+    def run():
+        InvestmentFrame.from_investments(invests).compute()
+
+    return run, len(invests)
+
+
+@benchmark("portfolio_batch")
+def _portfolio_batch(scale):
+    invests = investments(20000 * scale)
+
+    def run():
+        batch_evaluate(invests, workers=0)
+
+    return run, len(invests)
+
+
+def portfolio(count):
+    return [
+        Investment(
+            f"invest{i}",
+            [Income("Rent", 1000 + i % 50), Income("Parking", 50)],
+            [Expense("Taxes", 200 + i % 20), Expense("Insurance", 75)],
+            str(100000 + i),
+        )
+        for i in range(count)
+    ]
+
+
+@benchmark("line_item_name_total[scan]")
+def _name_total_scan(scale):
+    invests = portfolio(20000 * scale)
+
+    def run():
+        sum(
+            expense.cents
+            for investment in invests
+            for expense in investment.expenses
+            if expense.name == "Taxes"
+        )
+
+    return run, len(invests)
+
+
+@benchmark("line_item_name_total[index]")
+def _name_total_index(scale):
+    catalog = LineItemCatalog()
+    catalog.watch(InvestmentCollection(portfolio(20000 * scale)))
+    ops = 20000 * scale
+
+    def run():
+        for _ in range(ops):
+            catalog.total("Taxes", Expense)
+
+    return run, ops
+
+
+@benchmark("portfolio_summary[scan]")
+def _portfolio_summary_scan(scale):
+    invests = portfolio(20000 * scale)
+
+    def run():
+        income = expense = capital = 0
+        for investment in invests:
+            income += investment.income_cents
+            expense += investment.expense_cents
+            capital += investment.invest_cents
+
+    return run, len(invests)
+
+
+@benchmark("portfolio_summary[rollup]")
+def _portfolio_summary_rollup(scale):
+    rollup = PortfolioRollup(InvestmentCollection(portfolio(20000 * scale)))
+    ops = 20000 * scale
+
+    def run():
+        for _ in range(ops):
+            rollup.summary()
+
+    return run, ops
+
+
+def run_benchmarks(names, repeat, scale):
+    results = {}
+    for name in names:
+        run, ops = BENCHMARKS[name](scale)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter_ns()
+            run()
+            timings.append((time.perf_counter_ns() - started) / ops)
+        results[name] = {
+            "ns_per_op": statistics.median(timings),
+            "min_ns_per_op": min(timings),
+            "ops": ops,
+            "repeat": repeat,
+        }
+        print(f"{name:<36}{results[name]['ns_per_op']:>14.1f} ns/op", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compare results with a baseline run.
+
+    Return: List of (name, baseline ns/op, current ns/op, change) for every benchmark that
+    got slower by more than threshold, as a fraction.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if old is None:
+            continue
+        change = result["ns_per_op"] / old["ns_per_op"] - 1
+        if change > threshold:
+            regressions.append((name, old["ns_per_op"], result["ns_per_op"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks containing this"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--quick", action="store_true", help="one repeat of each")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    repeat = 1 if args.quick else args.repeat
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "benchmarks": run_benchmarks(names, repeat, args.scale),
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report["benchmarks"], baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(
+                f"REGRESSION {name}: {old:.1f} -> {new:.1f} ns/op (+{change:.0%})",
+                file=sys.stderr,
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
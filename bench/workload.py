@@ -0,0 +1,147 @@
+"""Replay a session of calculator operations and report throughput, latency and memory.
+
+Generates a scripted session with roi.workload.generate, or reads one with --script, and replays
+it twice against a fresh registry: once timed, for operations per second and latency
+percentiles, and once under tracemalloc, for the peak traced memory, the largest allocation
+sites and the memory of each type. With --baseline, a previous --output is compared and the run
+fails if throughput fell or memory per object or the peak grew by more than --threshold.
+
+Usage:
+    python bench/workload.py [--operations 100000] [--users 1000]
+                             [--mix create_investment=3,view_investment=4,...] [--seed 0]
+                             [--script session.jsonl] [--save-script session.jsonl]
+                             [--output results.json] [--baseline old.json] [--threshold 0.10]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from roi.workload import MIX, generate, read_script, replay, write_script  # noqa: E402
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        op, _, share = part.partition("=")
+        mix[op.strip()] = float(share)
+    return mix
+
+
+def compare(report, baseline, threshold):
+    """Compare a run with a baseline run.
+
+    Return: List of (what, baseline value, current value, change) for throughput that fell and
+    memory that grew by more than threshold, as a fraction.
+    """
+    regressions = []
+    old, new = baseline["timed"], report["timed"]
+    change = 1 - new["ops_per_second"] / old["ops_per_second"]
+    if change > threshold:
+        regressions.append(
+            ("ops/s", old["ops_per_second"], new["ops_per_second"], -change)
+        )
+    old, new = baseline["traced"], report["traced"]
+    change = new["peak_bytes"] / old["peak_bytes"] - 1
+    if change > threshold:
+        regressions.append(("peak bytes", old["peak_bytes"], new["peak_bytes"], change))
+    for name, sizes in new["memory_by_type"].items():
+        before = old["memory_by_type"].get(name)
+        if not before or not before["count"] or not sizes["count"]:
+            continue
+        # per object, so a session that leaves more objects behind is not a regression
+        per_object = sizes["bytes"] / sizes["count"]
+        per_object_before = before["bytes"] / before["count"]
+        change = per_object / per_object_before - 1
+        if change > threshold:
+            regressions.append(
+                (f"{name} bytes each", per_object_before, per_object, change)
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=MIX,
+        help="op=share,... shares of each operation",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--script", help="replay this JSONL session instead")
+    parser.add_argument("--save-script", help="write the generated session here")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.script:
+        requests = list(read_script(args.script))
+    else:
+        requests = list(generate(args.operations, args.users, args.mix, args.seed))
+        if args.save_script:
+            write_script(args.save_script, requests)
+
+    timed = replay(requests)
+    traced = replay(requests, trace_memory=True)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests": len(requests),
+        "timed": timed.to_dict(),
+        "traced": traced.to_dict(),
+    }
+
+    print(
+        f"{timed.operations:,} operations, {timed.errors} errors, "
+        f"{timed.ops_per_second:,.0f} ops/s"
+    )
+    print(
+        f"{'op':<20}{'count':>8}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'p99.9':>9}"
+    )
+    for op, latency in report["timed"]["latency_us"].items():
+        if latency["count"]:
+            print(
+                f"{op:<20}{latency['count']:>8}"
+                + "".join(
+                    f"{latency[key]:>9.1f}"
+                    for key in ("mean", "p50", "p90", "p99", "p99.9")
+                )
+            )
+    print(
+        f"tracemalloc peak {traced.peak / 1e6:.1f} MB, {traced.traced / 1e6:.1f} MB held"
+    )
+    for name, sizes in report["traced"]["memory_by_type"].items():
+        each = sizes["bytes"] / sizes["count"] if sizes["count"] else 0
+        print(
+            f"  {name:<22}{sizes['count']:>9,}{sizes['bytes'] / 1e6:>9.2f} MB"
+            f"{each:>8.0f} B each"
+        )
+    for site, size, count in traced.top_allocations[:5]:
+        print(f"  {size / 1e6:>7.2f} MB {count:>8,}  {site}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold)
+        for what, old, new, change in regressions:
+            print(
+                f"REGRESSION {what}: {old:,.1f} -> {new:,.1f} ({change:+.0%})",
+                file=sys.stderr,
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Command line entry point, run as python -m roi <command> [arguments].
+
+Each command lives in its own module and is only imported when it is run, so starting one
+command does not pay for the imports of the others, and NumPy, SQLite and asyncio are only
+loaded by the commands that use them.
+"""
+
+import sys
+from importlib import import_module
+
+# command -> (module with a main(argv) function, description)
+COMMANDS = {
+    "interactive": ("roi.repl", "run the interactive calculator (the default)"),
+    "import": ("roi.importer", "import investments from a CSV or JSONL file"),
+    "evaluate": ("roi.evaluate", "evaluate the metrics of every investment in a file"),
+    "allocate": (
+        "roi.allocate",
+        "choose the investments with the most cash flow within a budget",
+    ),
+    "report": ("roi.report", "write portfolio statements for every user"),
+    "serve": ("roi.server", "serve the calculator over newline delimited JSON"),
+}
+
+
+def usage():
+    width = max(len(command) for command in COMMANDS)
+    lines = ["usage: python -m roi <command> [arguments]", "", "commands:"]
+    for command, (_, description) in COMMANDS.items():
+        lines.append(f"  {command:<{width}}  {description}")
+    lines.append("")
+    lines.append("Run python -m roi <command> --help for the arguments of a command.")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    command_line = argv is None
+    if command_line:
+        argv = sys.argv[1:]
+    command = argv[0] if argv else "interactive"
+    if command in ("-h", "--help"):
+        print(usage())
+        return 0
+    if command not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        print(f"\nunknown command {command!r}", file=sys.stderr)
+        return 2
+    if command_line:
+        # argparse names the program after argv[0] in the command's usage and errors
+        sys.argv[0] = f"python -m roi {command}"
+    return import_module(COMMANDS[command][0]).main(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import argparse
+import sys
+import time
+from bisect import bisect_right
+from itertools import accumulate
+from math import gcd
+
+from roi.money import from_cents, to_cents
+
+METHODS = ("auto", "dp", "branch_and_bound", "greedy")
+
+# how many search nodes run between checks of the time limit
+CHECK_EVERY = 1024
+
+
+class Allocation:
+    """The Investments chosen for a budget, and how close the choice is to the best one.
+
+    upper_bound is a proven limit on the annual cash flow any choice within the budget can reach,
+    so gap, the share of it the choice falls short by, is 0 when the choice is optimal. timed_out
+    is True when the time limit ran out first, and nodes counts the branch and bound nodes or the
+    rows of the dynamic program.
+
+    Keyword arguments:
+    investments -- List of the chosen Investment objects, in input order.
+    cash_flow_cents -- Annual cash flow of the chosen Investments in cents.
+    invest_cents -- total_invest of the chosen Investments in cents.
+    budget_cents -- Budget in cents.
+    upper_bound_cents -- Upper bound on the annual cash flow in cents.
+    method -- "dp", "branch_and_bound" or "greedy", the method that made the choice.
+    Return: None
+    """
+
+    def __init__(
+        self,
+        investments,
+        cash_flow_cents,
+        invest_cents,
+        budget_cents,
+        upper_bound_cents,
+        method,
+    ) -> None:
+        self.investments = investments
+        self.cash_flow_cents = cash_flow_cents
+        self.invest_cents = invest_cents
+        self.budget_cents = budget_cents
+        self.upper_bound_cents = max(upper_bound_cents, cash_flow_cents)
+        self.method = method
+        self.optimal = self.upper_bound_cents == cash_flow_cents
+        self.timed_out = False
+        self.nodes = 0
+        self.elapsed = 0.0
+
+    @property
+    def annual_cash_flow(self):
+        return from_cents(self.cash_flow_cents)
+
+    @property
+    def total_invest(self):
+        return from_cents(self.invest_cents)
+
+    @property
+    def upper_bound(self):
+        return from_cents(self.upper_bound_cents)
+
+    @property
+    def gap(self):
+        if self.optimal:
+            return 0.0
+        return (self.upper_bound_cents - self.cash_flow_cents) / self.upper_bound_cents
+
+
+def allocate(investments, budget, method="auto", time_limit=None, dp_cells=1000000):
+    """Choose the Investments with the most annual cash flow whose total_invest fits a budget.
+
+    This is a 0/1 knapsack. Only Investments with a positive annual cash flow are worth choosing,
+    and those without a total_invest are always chosen. The exact dynamic program runs over the
+    budget in cents, divided by the greatest common divisor of the costs, and is used by "auto"
+    when the number of candidates times the scaled budget is at most dp_cells. Larger problems go
+    to a depth first branch and bound that starts from the greedy choice by cash flow per dollar
+    and prunes with the fractional (linear relaxation) bound. When time_limit runs out, the best
+    choice found so far is returned with its gap to the best bound still open.
+
+    Keyword arguments:
+    investments -- Iterable of Investment objects.
+    budget -- Dollar amount that can be invested, as a string, Decimal or int.
+    method -- One of METHODS.
+    time_limit -- Seconds to search for, no limit if None.
+    dp_cells -- Largest problem "auto" solves with the dynamic program.
+    Return: Allocation.
+    Raises ValueError for a negative budget or an unknown method.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}, not {method!r}")
+    budget_cents = to_cents(budget)
+    if budget_cents < 0:
+        raise ValueError("budget must not be negative.")
+    started = time.perf_counter()
+    deadline = None if time_limit is None else started + time_limit
+
+    investments = list(investments)
+    free = []
+    candidates = []
+    for position, investment in enumerate(investments):
+        # annual cash flow, which like total_expense only counts with an income
+        if not investment.incomes:
+            continue
+        cash_flow = (investment.income_cents - investment.expense_cents) * 12
+        cost = investment.invest_cents
+        if cash_flow <= 0 or cost > budget_cents:
+            continue
+        if cost <= 0:
+            free.append((position, cash_flow, cost))
+        else:
+            candidates.append((position, cash_flow, cost))
+
+    scale = 0
+    for _, _, cost in candidates:
+        scale = gcd(scale, cost)
+    capacity = budget_cents // scale if scale else 0
+    if method == "auto":
+        small = len(candidates) * (capacity + 1) <= dp_cells
+        method = "dp" if small else "branch_and_bound"
+
+    if method == "dp":
+        chosen, upper_bound, timed_out, nodes = _dynamic_program(
+            candidates, scale, capacity, deadline
+        )
+    else:
+        chosen, upper_bound, timed_out, nodes = _branch_and_bound(
+            candidates, budget_cents, deadline, method == "greedy"
+        )
+
+    chosen = sorted(free + chosen)
+    free_cash_flow = sum(cash_flow for _, cash_flow, _ in free)
+    allocation = Allocation(
+        [investments[position] for position, _, _ in chosen],
+        sum(cash_flow for _, cash_flow, _ in chosen),
+        sum(cost for _, _, cost in chosen),
+        budget_cents,
+        upper_bound + free_cash_flow,
+        method,
+    )
+    allocation.timed_out = timed_out
+    allocation.nodes = nodes
+    allocation.elapsed = time.perf_counter() - started
+    return allocation
+
+
+def _by_density(candidates):
+    # most cash flow per dollar first
+    return sorted(candidates, key=lambda item: item[1] / item[2], reverse=True)
+
+
+def _greedy(ordered, budget_cents):
+    chosen = []
+    remaining = budget_cents
+    for item in ordered:
+        if item[2] <= remaining:
+            chosen.append(item)
+            remaining -= item[2]
+    # the best single candidate bounds how badly the greedy choice can do
+    best = max(ordered, key=lambda item: item[1], default=None)
+    if best is not None and best[1] > sum(item[1] for item in chosen):
+        chosen = [best]
+    return chosen
+
+
+class _Relaxation:
+    """Fractional knapsack bound over the candidates in density order, O(log n) per query."""
+
+    def __init__(self, ordered) -> None:
+        self.ordered = ordered
+        self.costs = [0, *accumulate(item[2] for item in ordered)]
+        self.values = [0, *accumulate(item[1] for item in ordered)]
+
+    def bound(self, start, remaining):
+        # cash flow of the candidates from start on that fit, and a fraction of the next one
+        costs = self.costs
+        end = bisect_right(costs, costs[start] + remaining) - 1
+        bound = self.values[end] - self.values[start]
+        if end < len(self.ordered):
+            _, cash_flow, cost = self.ordered[end]
+            left = remaining - (costs[end] - costs[start])
+            bound += cash_flow * left // cost
+        return bound
+
+
+def _branch_and_bound(candidates, budget_cents, deadline, greedy_only):
+    ordered = _by_density(candidates)
+    relaxation = _Relaxation(ordered)
+    root_bound = relaxation.bound(0, budget_cents)
+    chosen = _greedy(ordered, budget_cents)
+    best = sum(item[1] for item in chosen)
+    if greedy_only or best >= root_bound:
+        return chosen, root_bound, False, 0
+
+    # nodes are (bound, next candidate, budget left, cash flow so far, chosen so far as a
+    # linked list of (position in ordered, rest))
+    best_path = None
+    stack = [(root_bound, 0, budget_cents, 0, None)]
+    nodes = 0
+    count = len(ordered)
+    timed_out = False
+    while stack:
+        nodes += 1
+        if deadline is not None and not nodes % CHECK_EVERY:
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+        bound, start, remaining, value, path = stack.pop()
+        if bound <= best:
+            continue
+        # take the following candidates while they fit, as the bound assumes
+        while start < count and ordered[start][2] <= remaining:
+            _, cash_flow, cost = ordered[start]
+            # the branch that leaves this candidate out is searched later
+            without = value + relaxation.bound(start + 1, remaining)
+            if without > best:
+                stack.append((without, start + 1, remaining, value, path))
+            remaining -= cost
+            value += cash_flow
+            path = (start, path)
+            start += 1
+        if value > best:
+            best = value
+            best_path = path
+        if start < count:
+            # the candidate at start does not fit, so only leaving it out is possible
+            without = value + relaxation.bound(start + 1, remaining)
+            if without > best:
+                stack.append((without, start + 1, remaining, value, path))
+
+    if best_path is not None:
+        chosen = []
+        while best_path is not None:
+            position, best_path = best_path
+            chosen.append(ordered[position])
+    if timed_out:
+        # every choice not yet ruled out is under the bound of an open node
+        return chosen, max(best, *(node[0] for node in stack)), True, nodes
+    return chosen, best, False, nodes
+
+
+def _dynamic_program(candidates, scale, capacity, deadline):
+    # best[w] is the most cash flow within w * scale cents, and taken[i][w] records whether
+    # candidate i is in the choice that reaches it
+    best = [0] * (capacity + 1)
+    taken = []
+    costs = []
+    for number, (_, cash_flow, cost) in enumerate(candidates):
+        if deadline is not None and time.perf_counter() > deadline:
+            # fall back to the greedy choice, bounded by the fractional relaxation
+            ordered = _by_density(candidates)
+            bound = _Relaxation(ordered).bound(0, capacity * scale)
+            return _greedy(ordered, capacity * scale), bound, True, number
+        weight = cost // scale
+        with_item = [value + cash_flow for value in best[: capacity + 1 - weight]]
+        without_item = best[weight:]
+        taken.append(bytes(map(int.__gt__, with_item, without_item)))
+        best[weight:] = map(max, with_item, without_item)
+        costs.append(weight)
+
+    chosen = []
+    remaining = capacity
+    for number in range(len(candidates) - 1, -1, -1):
+        weight = costs[number]
+        if remaining >= weight and taken[number][remaining - weight]:
+            chosen.append(candidates[number])
+            remaining -= weight
+    return chosen, best[capacity], False, len(candidates)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Choose the investments with the most annual cash flow within a budget."
+    )
+    parser.add_argument("path", help="SQLite database, CSV or JSONL file")
+    parser.add_argument("--budget", required=True, help="dollars that can be invested")
+    parser.add_argument("--method", choices=METHODS, default="auto")
+    parser.add_argument("--time-limit", type=float, help="seconds to search for")
+    args = parser.parse_args(argv)
+
+    from roi.evaluate import load_investments
+
+    owned = load_investments(args.path)
+    try:
+        allocation = allocate(
+            [investment for _, investment in owned],
+            args.budget,
+            args.method,
+            args.time_limit,
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    owners = {id(investment): username for username, investment in owned}
+    for investment in allocation.investments:
+        print(
+            f"{owners[id(investment)]}\t{investment.name}\t"
+            f"{investment.total_invest}\t{investment.annual_cash_flow}"
+        )
+    print(
+        f"Chose {len(allocation.investments)} of {len(owned)} investments for "
+        f"{allocation.total_invest} of {from_cents(allocation.budget_cents)}, with an "
+        f"annual cash flow of {allocation.annual_cash_flow} (upper bound "
+        f"{allocation.upper_bound}, gap {allocation.gap:.2%}) by {allocation.method} "
+        f"in {allocation.elapsed:.3f} seconds.",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
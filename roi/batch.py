@@ -0,0 +1,136 @@
+import os
+import sys
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from roi.frame import NoTotalInvestError, derive_columns
+from roi.money import METRICS
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the array module is used without it
+    np = None
+
+
+def pack_investments(investments):
+    """Pack Investments into the compact form sent to worker processes.
+
+    Each Investment becomes four int64 values: its income total, expense total, number of incomes
+    and total_invest, all from the running totals the Investment already keeps.
+
+    Keyword arguments:
+    investments -- List of Investment objects.
+    Return: Tuple of four bytes objects, one int64 column each.
+    """
+    income = array("q", [investment.income_cents for investment in investments])
+    expense = array("q", [investment.expense_cents for investment in investments])
+    counts = array("q", [len(investment.incomes) for investment in investments])
+    invest = array("q", [investment.invest_cents for investment in investments])
+    return income.tobytes(), expense.tobytes(), counts.tobytes(), invest.tobytes()
+
+
+def evaluate_packed(packed, use_numpy=False):
+    """Derive the metrics of a packed chunk of Investments.
+
+    Keyword arguments:
+    packed -- Tuple returned by pack_investments.
+    use_numpy -- Compute with NumPy instead of a Python loop.
+    Return: Tuple of bytes objects, one int64 column per metric in METRICS order.
+    """
+    income, expense, counts, invest = (_unpack(column) for column in packed)
+    columns = derive_columns(income, expense, counts, invest, use_numpy)
+    if use_numpy:
+        return tuple(columns[metric].astype(np.int64).tobytes() for metric in METRICS)
+    return tuple(columns[metric].tobytes() for metric in METRICS)
+
+
+def _unpack(data):
+    column = array("q")
+    column.frombytes(data)
+    return column
+
+
+def batch_evaluate(investments, workers=1, chunk_size=10000, use_numpy=None):
+    """Derive the metrics of many Investments in packed chunks, optionally across processes.
+
+    Investments are split into chunks, packed into int64 columns and evaluated with
+    evaluate_packed, in this process by default or in a ProcessPoolExecutor. Results are merged
+    in input order and are identical either way.
+
+    Evaluating in this process is the recommended path. Packing reads every Investment's running
+    totals and has to happen here, while the workers only do O(1) arithmetic per Investment on
+    the packed totals. With NumPy packing is most of the in-process time, and without it about a
+    third, so processes can at best save the rest (Amdahl's law) before the cost of sending
+    chunks to them. bench/batch_scaling.py measures both parts.
+
+    Keyword arguments:
+    investments -- Iterable of Investment objects.
+    workers -- Number of processes, os.cpu_count() if None. 0 or 1 evaluates in this process.
+    chunk_size -- Number of Investments per chunk.
+    use_numpy -- Compute with NumPy, by default when it is installed.
+    Return: Dict of metric name to an array("q") column in input order. Money metrics are in cents
+    and roi is in hundredths.
+    Raises NoTotalInvestError if an Investment has a positive cash flow and no total_invest.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if use_numpy is None:
+        use_numpy = np is not None
+    results = {metric: array("q") for metric in METRICS}
+    chunks = _chunks(investments, chunk_size)
+
+    if workers <= 1:
+        start = 0
+        for chunk in chunks:
+            packed = pack_investments(chunk)
+            _merge(results, start, chunk, partial(evaluate_packed, packed, use_numpy))
+            start += len(chunk)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # only a few chunks are in flight, so memory stays bounded for generators
+        pending = deque()
+        start = 0
+        for chunk in chunks:
+            packed = pack_investments(chunk)
+            pending.append((chunk, executor.submit(evaluate_packed, packed, use_numpy)))
+            if len(pending) >= workers * 2:
+                done, future = pending.popleft()
+                _merge(results, start, done, future.result)
+                start += len(done)
+        while pending:
+            done, future = pending.popleft()
+            _merge(results, start, done, future.result)
+            start += len(done)
+    return results
+
+
+def _chunks(investments, chunk_size):
+    iterator = iter(investments)
+    chunk = list(islice(iterator, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, chunk_size))
+
+
+def _merge(results, start, chunk, get_columns):
+    try:
+        columns = get_columns()
+    except NoTotalInvestError as e:
+        raise NoTotalInvestError(start + e.row, chunk[e.row].name) from None
+    for metric, data in zip(METRICS, columns):
+        results[metric].frombytes(data)
+
+
+def main(argv=None):
+    # the command line is python -m roi evaluate, which runs batch_evaluate for large inputs
+    from roi.evaluate import main
+
+    return main(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
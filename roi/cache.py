@@ -0,0 +1,179 @@
+import sqlite3
+from collections import OrderedDict
+
+from roi.money import METRICS, derive_metrics, from_cents
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    key BLOB PRIMARY KEY,
+    total_income INTEGER NOT NULL,
+    total_expense INTEGER NOT NULL,
+    cash_flow INTEGER NOT NULL,
+    annual_cash_flow INTEGER NOT NULL,
+    roi INTEGER NOT NULL
+);
+"""
+
+
+class MetricsCache:
+    """Content addressed LRU cache of the metrics an Investment derives.
+
+    Entries are keyed by Investment.content_key(), which changes whenever set_incomes,
+    set_expenses, set_total_invest or a line item's set_amount changes the inputs, so stale
+    entries are never returned. Investments with the same amounts share an entry. With a path,
+    entries are also written to a SQLite file that survives restarts.
+
+    Keyword arguments:
+    maxsize -- Number of entries kept in memory before the least recently used is evicted.
+    path -- SQLite file for the on-disk tier, memory only if None.
+    Return: None
+    """
+
+    def __init__(self, maxsize=4096, path=None) -> None:
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        self._pending = 0
+        if path is not None:
+            self._connection = sqlite3.connect(path)
+            self._connection.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    """Get the metrics of an Investment, deriving them only on a miss.
+
+    Keyword arguments:
+    investment -- Investment object.
+    Return: Dict of total_income, total_expense, cash_flow, annual_cash_flow and roi as Decimals.
+    Raises ZeroDivisionError if the Investment has a positive cash flow and no total_invest.
+    """
+
+    def metrics(self, investment):
+        return dict(zip(METRICS, map(from_cents, self.metrics_cents(investment))))
+
+    """Get the metrics of an Investment as ints.
+
+    Keyword arguments:
+    investment -- Investment object.
+    Return: Tuple of total_income, total_expense, cash_flow and annual_cash_flow in cents and roi
+    in hundredths.
+    """
+
+    def metrics_cents(self, investment):
+        key = investment.content_key()
+        entries = self._entries
+        values = entries.get(key)
+        if values is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return values
+        values = self._load(key)
+        if values is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            values = derive_metrics(
+                investment.income_cents,
+                investment.expense_cents,
+                len(investment.incomes),
+                investment.invest_cents,
+            )
+            self._store(key, values)
+        entries[key] = values
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return values
+
+    """Get a single metric of an Investment.
+
+    Keyword arguments:
+    investment -- Investment object.
+    metric -- One of METRICS.
+    Return: Decimal value of the metric.
+    """
+
+    def get(self, investment, metric):
+        return from_cents(self.metrics_cents(investment)[METRICS.index(metric)])
+
+    """Get the hit, miss and eviction counts of the cache.
+
+    Keyword arguments:
+    None
+    Return: Dict of hits, disk_hits, misses, evictions, size and hit_rate.
+    """
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    """Remove every entry from memory and from the on-disk tier.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    def clear(self):
+        self._entries.clear()
+        if self._connection is not None:
+            self._connection.execute("DELETE FROM metrics")
+            self._connection.commit()
+            self._pending = 0
+
+    """Write pending entries to the on-disk tier.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    def flush(self):
+        if self._connection is not None and self._pending:
+            self._connection.commit()
+            self._pending = 0
+
+    def close(self):
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def _load(self, key):
+        if self._connection is None:
+            return None
+        row = self._connection.execute(
+            "SELECT total_income, total_expense, cash_flow, annual_cash_flow, roi "
+            "FROM metrics WHERE key = ?",
+            (key,),
+        ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def _store(self, key, values):
+        if self._connection is None:
+            return
+        self._connection.execute(
+            "INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?, ?)", (key,) + values
+        )
+        # writes are committed in batches instead of one transaction per entry
+        self._pending += 1
+        if self._pending >= 1000:
+            self.flush()
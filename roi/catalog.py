@@ -0,0 +1,237 @@
+import sys
+import threading
+
+from roi.money import from_cents, to_cents
+from roi.roi import Expense, Income, InvestmentCollection
+
+
+class LineItemCatalog:
+    """Interned, deduplicated line items shared across Investments.
+
+    Every distinct (class, name, amount) is built once, with an interned name, and frozen, so
+    Investments holding the same "Taxes" of the same amount all point at one object. Frozen
+    items cannot be changed in place: updating one through an Investment gives that Investment
+    a private copy and leaves the other holders untouched (copy-on-write).
+
+    The catalog also keeps the count and total of every line item name across the Investments
+    of the Users or collections it watches, updated as Investments are added, removed or
+    edited, so totals by name do not scan every Investment. Renaming a line item that is not
+    frozen is not an edit of its Investments and is only counted once they next change.
+    Watched collections report changes under their own locks, from any thread, so the catalog
+    keeps a lock of its own around every update and lookup.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    def __init__(self) -> None:
+        # (item class, name, cents) -> frozen item
+        self._items = {}
+        # (item class, name) -> [count, cents] over the watched Investments
+        self._totals = {}
+        # id(investment) -> flat tuple of the key and cents of each counted item
+        self._counted = {}
+        # id(investment) -> number of watched collections holding it
+        self._holders = {}
+        # id(collection) -> collection
+        self._collections = {}
+        # watched collections change under their own locks, which do not cover each other
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    """Get the shared line item for a name and amount.
+
+    Keyword arguments:
+    item_class -- Income or Expense.
+    name -- String name of the line item.
+    amount -- String dollar amount of the line item.
+    Return: Frozen line item, the same object for every call with an equal name and amount.
+    """
+
+    def item(self, item_class, name, amount):
+        return self.item_from_cents(item_class, name, to_cents(amount))
+
+    def item_from_cents(self, item_class, name, cents):
+        key = (item_class, name, cents)
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                item = self._items[key] = item_class.from_cents(
+                    sys.intern(name), cents
+                ).freeze()
+        return item
+
+    """Get the shared equivalent of a line item.
+
+    Keyword arguments:
+    item -- Income or Expense object.
+    Return: Frozen line item with the same class, name and amount.
+    """
+
+    def intern(self, item):
+        return self.item_from_cents(type(item), item.name, item.cents)
+
+    """Replace the line items of Investments with their shared equivalents.
+
+    Keyword arguments:
+    investments -- Iterable of Investment objects.
+    Return: int number of line items replaced.
+    """
+
+    def intern_investments(self, investments):
+        replaced = 0
+        for investment in investments:
+            for items, setter in (
+                (investment.incomes, investment.set_incomes),
+                (investment.expenses, investment.set_expenses),
+            ):
+                shared = [self.intern(item) for item in items]
+                changed = sum(new is not old for new, old in zip(shared, items))
+                if changed:
+                    setter(shared)
+                    replaced += changed
+        return replaced
+
+    """Count the line items of a User or InvestmentCollection and follow its changes.
+
+    Keyword arguments:
+    source -- User or InvestmentCollection.
+    Return: None
+    """
+
+    def watch(self, source):
+        collection = _collection(source)
+        with collection.lock, self._lock:
+            if id(collection) in self._collections:
+                return
+            self._collections[id(collection)] = collection
+            collection.add_watcher(self)
+            for investment in collection:
+                self._count(investment, 1)
+
+    def unwatch(self, source):
+        collection = _collection(source)
+        with collection.lock, self._lock:
+            if self._collections.pop(id(collection), None) is None:
+                return
+            collection.remove_watcher(self)
+            for investment in collection:
+                self._uncount(investment)
+
+    def watch_registry(self, registry):
+        registry.add_watcher(self)
+        for user in registry.users():
+            self.watch(user)
+
+    """Total the line items of a name across the watched Investments.
+
+    Keyword arguments:
+    name -- Name of the line items, e.g. "Taxes".
+    item_class -- Income or Expense, both if None.
+    Return: Decimal total monthly amount, 0 if no watched Investment has such an item.
+    """
+
+    def total(self, name, item_class=None):
+        with self._lock:
+            cents = sum(totals[1] for totals in self._lookup(name, item_class))
+        return from_cents(cents)
+
+    def count(self, name, item_class=None):
+        with self._lock:
+            return sum(totals[0] for totals in self._lookup(name, item_class))
+
+    """Total every line item name across the watched Investments.
+
+    Keyword arguments:
+    item_class -- Income or Expense.
+    Return: Dict of name to a dict of the count and the Decimal total of the items by that name.
+    """
+
+    def totals(self, item_class):
+        with self._lock:
+            return {
+                name: {"count": count, "total": from_cents(cents)}
+                for (kind, name), (count, cents) in self._totals.items()
+                if kind is item_class
+            }
+
+    def _lookup(self, name, item_class):
+        # called with the lock held
+        kinds = (Income, Expense) if item_class is None else (item_class,)
+        return [
+            self._totals[(kind, name)] for kind in kinds if (kind, name) in self._totals
+        ]
+
+    def _count(self, investment, holders=0):
+        # holders is 1 when another watched collection starts holding the Investment, 0 when
+        # it changed. An Investment in two watched collections is only counted once
+        holders += self._holders.get(id(investment), 0)
+        if not holders:
+            # a change reported after the last watched collection removed it
+            return
+        self._holders[id(investment)] = holders
+        self._subtract(investment)
+        counted = []
+        for kind, items in (
+            (Income, investment.incomes),
+            (Expense, investment.expenses),
+        ):
+            for item in items:
+                key = (kind, item.name)
+                totals = self._totals.get(key)
+                if totals is None:
+                    totals = self._totals[key] = [0, 0]
+                totals[0] += 1
+                totals[1] += item.cents
+                counted.append(key)
+                counted.append(item.cents)
+        self._counted[id(investment)] = tuple(counted)
+
+    def _uncount(self, investment):
+        holders = self._holders.get(id(investment))
+        if holders is None:
+            return
+        if holders > 1:
+            self._holders[id(investment)] = holders - 1
+            return
+        del self._holders[id(investment)]
+        self._subtract(investment)
+
+    def _subtract(self, investment):
+        counted = self._counted.pop(id(investment), ())
+        for position in range(0, len(counted), 2):
+            key = counted[position]
+            totals = self._totals[key]
+            totals[0] -= 1
+            totals[1] -= counted[position + 1]
+            if not totals[0]:
+                del self._totals[key]
+
+    # watcher callbacks from UserRegistry and InvestmentCollection
+
+    def _user_added(self, user):
+        self.watch(user)
+
+    def _user_removed(self, user):
+        self.unwatch(user)
+
+    def _investment_added(self, collection, investment):
+        with self._lock:
+            self._count(investment, 1)
+
+    def _investment_removed(self, collection, investment, investment_id):
+        with self._lock:
+            self._uncount(investment)
+
+    def _investment_changed(self, collection, investment):
+        with self._lock:
+            self._count(investment)
+
+
+def _collection(source):
+    if isinstance(source, InvestmentCollection):
+        return source
+    return source.investments
@@ -0,0 +1,118 @@
+import argparse
+import csv
+import sys
+import time
+
+from roi.money import METRICS, derive_metrics, from_cents
+
+
+def evaluate(investments, workers=None, chunk_size=10000):
+    """Derive the metrics of Investments, in this process when there are few of them.
+
+    Up to chunk_size Investments are evaluated with a Python loop over their running totals,
+    which is faster than loading NumPy. Larger inputs, or any input when workers is given, go
+    through roi.batch.batch_evaluate, which packs them into chunks and evaluates those in this
+    process unless workers asks for more.
+
+    Keyword arguments:
+    investments -- List of Investment objects.
+    workers -- Number of processes for batch_evaluate, 1 if None.
+    chunk_size -- Number of Investments per chunk of batch_evaluate.
+    Return: Dict of metric name to a column of ints in input order. Money metrics are in cents
+    and roi is in hundredths.
+    Raises ZeroDivisionError if an Investment has a positive cash flow and no total_invest.
+    """
+    if workers is not None or len(investments) > chunk_size:
+        from roi.batch import batch_evaluate
+
+        return batch_evaluate(
+            investments, 1 if workers is None else workers, chunk_size
+        )
+    columns = {metric: [] for metric in METRICS}
+    appends = [columns[metric].append for metric in METRICS]
+    for investment in investments:
+        try:
+            values = derive_metrics(
+                investment.income_cents,
+                investment.expense_cents,
+                len(investment.incomes),
+                investment.invest_cents,
+            )
+        except ZeroDivisionError:
+            raise ZeroDivisionError(
+                f"{investment.name} has a positive cash flow and no total_invest."
+            ) from None
+        for append, value in zip(appends, values):
+            append(value)
+    return columns
+
+
+def load_investments(path):
+    """Load every Investment of a SQLite database or a CSV or JSONL import file.
+
+    Keyword arguments:
+    path -- Path of the file, SQLite databases end in .db, .sqlite or .sqlite3.
+    Return: List of (username, Investment) tuples.
+    """
+    if str(path).lower().endswith((".db", ".sqlite", ".sqlite3")):
+        from roi.storage import SQLiteStorage
+
+        with SQLiteStorage(path) as storage:
+            registry = storage.load_users(lazy=False)
+    else:
+        from roi.importer import import_file
+
+        registry = import_file(path).registry
+    return [
+        (user.username, investment)
+        for user in registry.users()
+        for investment in user.investments
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate the metrics of every investment in a database or import file."
+    )
+    parser.add_argument("path", help="SQLite database, CSV or JSONL file")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processes, this one by default"
+    )
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument(
+        "--output", help="CSV file to write the metrics to, - for stdout"
+    )
+    args = parser.parse_args(argv)
+
+    owned = load_investments(args.path)
+    started = time.perf_counter()
+    try:
+        results = evaluate(
+            [investment for _, investment in owned], args.workers, args.chunk_size
+        )
+    except ZeroDivisionError as e:
+        print(e, file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+
+    if args.output:
+        file = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+        try:
+            writer = csv.writer(file)
+            writer.writerow(("user", "investment") + METRICS)
+            for row, (username, investment) in enumerate(owned):
+                writer.writerow(
+                    (username, investment.name)
+                    + tuple(str(from_cents(results[metric][row])) for metric in METRICS)
+                )
+        finally:
+            if file is not sys.stdout:
+                file.close()
+    print(
+        f"Evaluated {len(owned)} investments in {elapsed:.3f} seconds.", file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
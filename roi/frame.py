@@ -0,0 +1,292 @@
+from array import array
+from itertools import accumulate
+
+from roi.money import METRICS, derive_metrics, from_cents, to_cents
+from roi.roi import Expense, Income, Investment
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the array module is used without it
+    np = None
+
+
+class InvestmentFrame:
+    """A columnar portfolio of investments that computes every metric in one batched pass.
+
+    Amounts are stored as int64 cents in contiguous arrays. The incomes and
+    expenses of row i are the slice offsets[i]:offsets[i + 1] of the line item
+    columns. Results are cent-exact with the Investment calculations.
+
+    Keyword arguments:
+    use_numpy -- True to compute with NumPy, False to use pure Python, None to use NumPy when it is installed.
+    Return: None
+    """
+
+    def __init__(self, use_numpy=None) -> None:
+        if use_numpy and np is None:
+            raise ImportError("use_numpy=True requires numpy to be installed.")
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self.names = []
+        self.total_invest = array("q")
+        self.income_offsets = array("q", [0])
+        self.income_names = []
+        self.income_cents = array("q")
+        self.expense_offsets = array("q", [0])
+        self.expense_names = []
+        self.expense_cents = array("q")
+        self._metrics = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    """Add a row to the frame.
+
+    Keyword arguments:
+    name -- Name of the investment.
+    incomes -- Iterable of (name, amount) pairs for the incomes.
+    expenses -- Iterable of (name, amount) pairs for the expenses.
+    total_invest -- The total amount of money put into the investment.
+    Return: None
+    """
+
+    def append(self, name, incomes=(), expenses=(), total_invest="0"):
+        self.append_cents(
+            name,
+            [(income_name, to_cents(amount)) for income_name, amount in incomes],
+            [(expense_name, to_cents(amount)) for expense_name, amount in expenses],
+            to_cents(total_invest),
+        )
+
+    """Add a row to the frame from amounts that are already in cents.
+
+    Keyword arguments:
+    name -- Name of the investment.
+    incomes -- Iterable of (name, cents) pairs for the incomes.
+    expenses -- Iterable of (name, cents) pairs for the expenses.
+    invest_cents -- total_invest in cents.
+    Return: None
+    """
+
+    def append_cents(self, name, incomes=(), expenses=(), invest_cents=0):
+        for income_name, cents in incomes:
+            self.income_names.append(income_name)
+            self.income_cents.append(cents)
+        for expense_name, cents in expenses:
+            self.expense_names.append(expense_name)
+            self.expense_cents.append(cents)
+        self.names.append(name)
+        self.total_invest.append(invest_cents)
+        self.income_offsets.append(len(self.income_cents))
+        self.expense_offsets.append(len(self.expense_cents))
+        self._metrics = None
+
+    """Add an Investment object as a row of the frame.
+
+    Keyword arguments:
+    investment -- An Investment object.
+    Return: None
+    """
+
+    def append_investment(self, investment):
+        self.append_cents(
+            investment.name,
+            [(income.name, income.cents) for income in investment.incomes],
+            [(expense.name, expense.cents) for expense in investment.expenses],
+            investment.invest_cents,
+        )
+
+    """Build a frame from a list of Investment objects.
+
+    Keyword arguments:
+    investments -- Iterable of Investment objects.
+    use_numpy -- See InvestmentFrame.
+    Return: InvestmentFrame with one row per Investment, in order.
+    """
+
+    @classmethod
+    def from_investments(cls, investments, use_numpy=None):
+        frame = cls(use_numpy=use_numpy)
+        for investment in investments:
+            frame.append_investment(investment)
+        return frame
+
+    """Build the Investment object for a single row.
+
+    Keyword arguments:
+    row -- Index of the row.
+    Return: A new Investment object.
+    """
+
+    def get_investment(self, row):
+        start, end = self.income_offsets[row], self.income_offsets[row + 1]
+        incomes = [
+            Income.from_cents(self.income_names[i], self.income_cents[i])
+            for i in range(start, end)
+        ]
+        start, end = self.expense_offsets[row], self.expense_offsets[row + 1]
+        expenses = [
+            Expense.from_cents(self.expense_names[i], self.expense_cents[i])
+            for i in range(start, end)
+        ]
+        return Investment(
+            self.names[row], incomes, expenses, from_cents(self.total_invest[row])
+        )
+
+    """Convert every row back into Investment objects.
+
+    Keyword arguments:
+    None
+    Return: List of Investment objects, in row order.
+    """
+
+    def to_investments(self):
+        return [self.get_investment(row) for row in range(len(self))]
+
+    """Compute the metrics for every row.
+
+    Keyword arguments:
+    None
+    Return: Dict of metric name to a column of ints, one per row. Money metrics are in cents and
+    roi is in hundredths. Columns are NumPy arrays when use_numpy is set, otherwise array("q").
+    Raises NoTotalInvestError if a row has a positive cash flow and no total_invest.
+    """
+
+    def compute(self):
+        if self._metrics is None:
+            if self.use_numpy:
+                income_offsets = np.frombuffer(self.income_offsets, dtype=np.int64)
+                expense_offsets = np.frombuffer(self.expense_offsets, dtype=np.int64)
+                income_totals = _segment_sums_numpy(income_offsets, self.income_cents)
+                expense_totals = _segment_sums_numpy(
+                    expense_offsets, self.expense_cents
+                )
+                income_counts = np.diff(income_offsets)
+            else:
+                income_totals = _segment_sums(self.income_offsets, self.income_cents)
+                expense_totals = _segment_sums(self.expense_offsets, self.expense_cents)
+                offsets = self.income_offsets
+                income_counts = [
+                    offsets[row + 1] - offsets[row] for row in range(len(self))
+                ]
+            try:
+                self._metrics = derive_columns(
+                    income_totals,
+                    expense_totals,
+                    income_counts,
+                    self.total_invest,
+                    self.use_numpy,
+                )
+            except NoTotalInvestError as e:
+                raise NoTotalInvestError(e.row, self.names[e.row]) from None
+        return self._metrics
+
+    """Get the metrics of a single row as Decimals.
+
+    Keyword arguments:
+    row -- Index of the row.
+    Return: Dict of metric name to Decimal, matching the Investment attributes of the same name.
+    """
+
+    def row_metrics(self, row):
+        columns = self.compute()
+        return {metric: from_cents(int(columns[metric][row])) for metric in METRICS}
+
+
+class NoTotalInvestError(ZeroDivisionError):
+    """Raised when a row has a positive cash flow and no total_invest to calculate ROI with.
+
+    Keyword arguments:
+    row -- Index of the row.
+    name -- Name of the investment, if known.
+    Return: None
+    """
+
+    def __init__(self, row, name=None) -> None:
+        super().__init__(row, name)
+        self.row = row
+        self.name = name
+
+    def __str__(self) -> str:
+        name = f"row {self.row}" if self.name is None else self.name
+        return f"{name} has a positive cash flow and no total_invest."
+
+
+def derive_columns(
+    income_totals, expense_totals, income_counts, invest_cents, use_numpy=False
+):
+    """Derive every Investment metric for columns of per row totals.
+
+    Keyword arguments:
+    income_totals -- Column of income totals in cents.
+    expense_totals -- Column of expense totals in cents.
+    income_counts -- Column of the number of incomes of each row.
+    invest_cents -- Column of total_invest in cents.
+    use_numpy -- Compute with NumPy instead of a Python loop.
+    Return: Dict of metric name to a column of ints, see InvestmentFrame.compute.
+    Raises NoTotalInvestError if a row has a positive cash flow and no total_invest.
+    """
+    if use_numpy:
+        return _derive_columns_numpy(
+            np.asarray(income_totals, dtype=np.int64),
+            np.asarray(expense_totals, dtype=np.int64),
+            np.asarray(income_counts, dtype=np.int64),
+            (
+                np.frombuffer(invest_cents, dtype=np.int64)
+                if isinstance(invest_cents, array)
+                else np.asarray(invest_cents, dtype=np.int64)
+            ),
+        )
+    columns = {metric: array("q") for metric in METRICS}
+    appends = [columns[metric].append for metric in METRICS]
+    for row, invest in enumerate(invest_cents):
+        try:
+            values = derive_metrics(
+                income_totals[row], expense_totals[row], income_counts[row], invest
+            )
+        except ZeroDivisionError:
+            raise NoTotalInvestError(row) from None
+        for append, value in zip(appends, values):
+            append(value)
+    return columns
+
+
+def _derive_columns_numpy(income_totals, expense_totals, income_counts, invest):
+    # expenses and cash flow only count once there is an income
+    has_incomes = income_counts > 0
+    expense_totals = np.where(has_incomes, expense_totals, 0)
+    cash_flow = np.where(has_incomes, income_totals - expense_totals, 0)
+    annual_cash_flow = cash_flow * 12
+
+    positive = annual_cash_flow > 0
+    no_invest = positive & (invest == 0)
+    if no_invest.any():
+        raise NoTotalInvestError(int(np.argmax(no_invest)))
+    # annual_cash_flow * 100 / total_invest rounded half to even
+    divisor = np.where(positive, np.abs(invest), 1)
+    quotient, remainder = np.divmod(annual_cash_flow * 100, divisor)
+    twice = remainder * 2
+    quotient += (twice > divisor) | ((twice == divisor) & (quotient % 2 == 1))
+    roi = np.where(positive, np.where(invest < 0, -quotient, quotient), 0)
+
+    return {
+        "total_income": income_totals,
+        "total_expense": expense_totals,
+        "cash_flow": cash_flow,
+        "annual_cash_flow": annual_cash_flow,
+        "roi": roi,
+    }
+
+
+def _segment_sums(offsets, cents):
+    # prefix sums turn every row total into a single subtraction
+    prefix = [0]
+    prefix.extend(accumulate(cents))
+    return [
+        prefix[offsets[i + 1]] - prefix[offsets[i]] for i in range(len(offsets) - 1)
+    ]
+
+
+def _segment_sums_numpy(offsets, cents):
+    prefix = np.zeros(len(cents) + 1, dtype=np.int64)
+    np.cumsum(np.frombuffer(cents, dtype=np.int64), out=prefix[1:])
+    return prefix[offsets[1:]] - prefix[offsets[:-1]]
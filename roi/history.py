@@ -0,0 +1,511 @@
+import calendar
+import os
+import struct
+import sys
+from array import array
+from datetime import date
+
+from roi.money import div_round, from_cents, roi_hundredths, to_cents
+from roi.roi import Income
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, blocks are scanned in Python without it
+    np = None
+
+MAGIC = b"ROIHIST\x00"
+VERSION = 1
+BYTE_ORDERS = {"little": 1, "big": 2}
+
+# magic, version, byte order of the columns
+HEADER = struct.Struct("<8sII")
+# type and payload length of every record after the header
+RECORD = struct.Struct("<cI")
+# investment id, kind (1 for incomes, -1 for expenses) of a line item record
+ITEM = struct.Struct("<qb")
+
+INCOME = 1
+EXPENSE = -1
+
+
+class History:
+    """Append-only columnar store of the actual monthly amounts of line items.
+
+    Every actual is a row of four int64 columns: the day (date.toordinal()), the investment id,
+    the line item id and the amount in cents. Investments are identified by a string key, which
+    for a (User, Investment) pair is the username and the Investment's id in the User's
+    collection (investment_key), so Investments of the same name stay apart and renaming one
+    keeps its history. Storage, snapshots and journals save the collection ids, so the keys
+    still match after a reload. Line items are identified by their investment, kind and name;
+    both get ids the first time they are recorded. Rows are never changed, only appended, so
+    corrections are recorded as further rows.
+
+    The rows are split into blocks of block_size, and each block keeps the lowest and highest day
+    and investment id in it and its income and expense totals. Range totals skip the blocks the
+    range cannot touch, add up whole blocks it covers from their totals and only scan the rows
+    of the rest, so a trailing 12 month total over years of history reads a few blocks.
+
+    With a path, rows are appended to that file a block at a time and on flush and close, and
+    an existing file is read back first. A torn record at the end, from a crash mid-write, is
+    ignored.
+
+    Keyword arguments:
+    path -- File to keep the history in, memory only if None.
+    block_size -- Rows per block.
+    use_numpy -- Scan blocks with NumPy, by default when it is installed.
+    Return: None. Raises ValueError if path is not a history file this version can read.
+    """
+
+    def __init__(self, path=None, block_size=4096, use_numpy=None) -> None:
+        self.path = path
+        self.block_size = block_size
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self.days = array("q")
+        self.investments = array("q")
+        self.items = array("q")
+        self.cents = array("q")
+        # block index, one entry per block including the one being filled
+        self.min_day = array("q")
+        self.max_day = array("q")
+        self.min_investment = array("q")
+        self.max_investment = array("q")
+        self.income_cents = array("q")
+        self.expense_cents = array("q")
+        # investment key -> id, and the keys by id
+        self._investment_ids = {}
+        self.keys = []
+        # (investment id, kind, name) -> line item id, and the kinds by id
+        self._item_ids = {}
+        self.item_keys = []
+        self.kinds = array("b")
+        # blocks scanned row by row by the last query
+        self.scanned = 0
+        self._file = None
+        # rows, investments and items already written to the file
+        self._written = [0, 0, 0]
+        if path is not None:
+            valid = None
+            if os.path.exists(path) and os.path.getsize(path):
+                valid = self._load(path)
+            self._file = open(path, "ab")
+            if not self._file.tell():
+                self._file.write(
+                    HEADER.pack(MAGIC, VERSION, BYTE_ORDERS[sys.byteorder])
+                )
+            elif valid < self._file.tell():
+                # drop a record cut short by a crash, so new records follow the last whole one
+                self._file.truncate(valid)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    """Get the id of an investment, giving it one if it has none.
+
+    Keyword arguments:
+    investment -- (User, Investment) pair or string key.
+    Return: int investment id.
+    """
+
+    def investment_id(self, investment):
+        key = _key(investment)
+        investment_id = self._investment_ids.get(key)
+        if investment_id is None:
+            investment_id = self._investment_ids[key] = len(self.keys)
+            self.keys.append(key)
+        return investment_id
+
+    def item_id(self, investment, item):
+        kind = INCOME if isinstance(item, Income) else EXPENSE
+        key = (self.investment_id(investment), kind, item.name)
+        item_id = self._item_ids.get(key)
+        if item_id is None:
+            item_id = self._item_ids[key] = len(self.item_keys)
+            self.item_keys.append(key)
+            self.kinds.append(kind)
+        return item_id
+
+    """Record the actual amount of a line item for a day.
+
+    Keyword arguments:
+    investment -- (User, Investment) pair or string key the line item belongs to.
+    item -- Income or Expense object, which only gives the kind and the name.
+    when -- datetime.date or ISO format string of the day the amount was paid or received.
+    amount -- Dollar amount actually paid or received, the item's amount if None.
+    Return: None
+    """
+
+    def record(self, investment, item, when, amount=None):
+        cents = item.cents if amount is None else to_cents(amount)
+        self.record_cents(self.item_id(investment, item), _day(when), cents)
+
+    def record_cents(self, item_id, day, cents):
+        investment_id = self.item_keys[item_id][0]
+        row = len(self.days)
+        if not row % self.block_size and row and self._file is not None:
+            # the last block is full, write it before starting the next
+            self.flush()
+        self.days.append(day)
+        self.investments.append(investment_id)
+        self.items.append(item_id)
+        self.cents.append(cents)
+        if row % self.block_size:
+            block = len(self.min_day) - 1
+            if day < self.min_day[block]:
+                self.min_day[block] = day
+            elif day > self.max_day[block]:
+                self.max_day[block] = day
+            if investment_id < self.min_investment[block]:
+                self.min_investment[block] = investment_id
+            elif investment_id > self.max_investment[block]:
+                self.max_investment[block] = investment_id
+        else:
+            block = len(self.min_day)
+            for column, value in (
+                (self.min_day, day),
+                (self.max_day, day),
+                (self.min_investment, investment_id),
+                (self.max_investment, investment_id),
+                (self.income_cents, 0),
+                (self.expense_cents, 0),
+            ):
+                column.append(value)
+        if self.kinds[item_id] == INCOME:
+            self.income_cents[block] += cents
+        else:
+            self.expense_cents[block] += cents
+
+    """Record a month of every line item of an Investment at its current amount.
+
+    Keyword arguments:
+    investment -- (User, Investment) pair, or an Investment object with a key.
+    when -- Day of the month's actuals.
+    key -- String key of the investment, from the pair if None.
+    Return: None
+    """
+
+    def record_investment(self, investment, when, key=None):
+        day = _day(when)
+        key, investment = _key_and_investment(investment, key)
+        for item in investment.incomes + investment.expenses:
+            self.record_cents(self.item_id(key, item), day, item.cents)
+
+    """Total the actuals recorded in a date range.
+
+    Keyword arguments:
+    investment -- (User, Investment) pair or string key, every investment if None.
+    start -- First day of the range, from the first actual if None.
+    end -- Day after the range, to the last actual if None.
+    Return: Dict of the Decimal income, expense and cash_flow, income less expense.
+    """
+
+    def totals(self, investment=None, start=None, end=None):
+        income, expense = self.totals_cents(investment, start, end)
+        return {
+            "income": from_cents(income),
+            "expense": from_cents(expense),
+            "cash_flow": from_cents(income - expense),
+        }
+
+    def cash_flow(self, investment=None, start=None, end=None):
+        income, expense = self.totals_cents(investment, start, end)
+        return from_cents(income - expense)
+
+    def totals_cents(self, investment=None, start=None, end=None):
+        investment_id = None
+        if investment is not None:
+            investment_id = self._investment_ids.get(_key(investment))
+            if investment_id is None:
+                self.scanned = 0
+                return 0, 0
+        low = -sys.maxsize if start is None else _day(start)
+        high = sys.maxsize if end is None else _day(end)
+        return self._aggregate(investment_id, low, high)
+
+    """Total the cash flow of the months before a day, e.g. the trailing 12 months.
+
+    Keyword arguments:
+    investment -- (User, Investment) pair or string key, every investment if None.
+    end -- Day after the window, the day after the last actual if None.
+    months -- Length of the window in calendar months.
+    Return: Decimal cash flow of the window.
+    """
+
+    def trailing_cash_flow(self, investment=None, end=None, months=12):
+        start, end = self.window(end, months)
+        return self.cash_flow(investment, start, end)
+
+    """Derive the ROI an Investment actually returned over the months before a day.
+
+    The cash flow of the window is annualized by its number of months and rounded like
+    Investment.roi, which is 0 unless the annual cash flow is positive.
+
+    Keyword arguments:
+    investment -- (User, Investment) pair, or an Investment object with a key. The Investment
+    gives the total_invest.
+    end -- Day after the window, the day after the last actual if None.
+    months -- Length of the window in calendar months.
+    key -- String key the actuals were recorded under, from the pair if None.
+    Return: Decimal realized ROI.
+    """
+
+    def realized_roi(self, investment, end=None, months=12, key=None):
+        return self.compare(investment, end, months, key)["realized_roi"]
+
+    """Compare the realized ROI of an Investment with its projected ROI.
+
+    Keyword arguments:
+    investment -- (User, Investment) pair, or an Investment object with a key.
+    end -- Day after the window, the day after the last actual if None.
+    months -- Length of the window in calendar months.
+    key -- String key the actuals were recorded under, from the pair if None.
+    Return: Dict of the window start and end, the projected and realized annual_cash_flow and
+    roi as Decimals, and roi_difference, realized less projected.
+    """
+
+    def compare(self, investment, end=None, months=12, key=None):
+        start, end = self.window(end, months)
+        key, investment = _key_and_investment(investment, key)
+        income, expense = self.totals_cents(key, start, end)
+        # cents a year at the pace of the window
+        annual = div_round((income - expense) * 12, months)
+        realized = from_cents(roi_hundredths(annual, investment.invest_cents))
+        return {
+            "start": start,
+            "end": end,
+            "projected_annual_cash_flow": investment.annual_cash_flow,
+            "realized_annual_cash_flow": from_cents(annual),
+            "projected_roi": investment.roi,
+            "realized_roi": realized,
+            "roi_difference": realized - investment.roi,
+        }
+
+    """Get the first and last day of a window of months.
+
+    Keyword arguments:
+    end -- Day after the window, the day after the last actual if None.
+    months -- Length of the window in calendar months.
+    Return: Tuple of the datetime.date start and end of the window, end excluded.
+    """
+
+    def window(self, end=None, months=12):
+        if end is None:
+            last = max(self.max_day) if len(self.max_day) else date.today().toordinal()
+            end = date.fromordinal(last + 1)
+        elif not isinstance(end, date):
+            end = date.fromisoformat(end)
+        return _add_months(end, -months), end
+
+    """Write the rows and ids not yet in the file.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    def flush(self):
+        if self._file is None:
+            return
+        rows, investments, items = self._written
+        records = []
+        for key in self.keys[investments:]:
+            records.append((b"K", key.encode("utf-8")))
+        for investment_id, kind, name in self.item_keys[items:]:
+            records.append(
+                (b"I", ITEM.pack(investment_id, kind) + name.encode("utf-8"))
+            )
+        if rows < len(self.days):
+            columns = [
+                column[rows:].tobytes()
+                for column in (self.days, self.investments, self.items, self.cents)
+            ]
+            records.append((b"R", b"".join(columns)))
+        for record_type, payload in records:
+            self._file.write(RECORD.pack(record_type, len(payload)))
+            self._file.write(payload)
+        self._file.flush()
+        self._written = [len(self.days), len(self.keys), len(self.item_keys)]
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def _aggregate(self, investment_id, low, high):
+        income = expense = 0
+        scanned = 0
+        size = self.block_size
+        min_day, max_day = self.min_day, self.max_day
+        min_investment, max_investment = self.min_investment, self.max_investment
+        for block in range(len(min_day)):
+            if max_day[block] < low or min_day[block] >= high:
+                continue
+            if investment_id is not None and not (
+                min_investment[block] <= investment_id <= max_investment[block]
+            ):
+                continue
+            covered = low <= min_day[block] and max_day[block] < high
+            if covered and (
+                investment_id is None
+                or min_investment[block] == max_investment[block] == investment_id
+            ):
+                income += self.income_cents[block]
+                expense += self.expense_cents[block]
+                continue
+            scanned += 1
+            block_income, block_expense = self._scan(
+                block * size,
+                min(block * size + size, len(self.days)),
+                investment_id,
+                low,
+                high,
+            )
+            income += block_income
+            expense += block_expense
+        self.scanned = scanned
+        return income, expense
+
+    def _scan(self, start, stop, investment_id, low, high):
+        if self.use_numpy:
+            days = np.frombuffer(self.days, np.int64)[start:stop]
+            cents = np.frombuffer(self.cents, np.int64)[start:stop]
+            items = np.frombuffer(self.items, np.int64)[start:stop]
+            mask = (days >= low) & (days < high)
+            if investment_id is not None:
+                mask &= (
+                    np.frombuffer(self.investments, np.int64)[start:stop]
+                    == investment_id
+                )
+            incomes = np.frombuffer(self.kinds, np.int8)[items[mask]] == INCOME
+            cents = cents[mask]
+            return int(cents[incomes].sum()), int(cents[~incomes].sum())
+        income = expense = 0
+        kinds = self.kinds
+        for day, row_investment, item, cents in zip(
+            self.days[start:stop],
+            self.investments[start:stop],
+            self.items[start:stop],
+            self.cents[start:stop],
+        ):
+            if low <= day < high and (
+                investment_id is None or row_investment == investment_id
+            ):
+                if kinds[item] == INCOME:
+                    income += cents
+                else:
+                    expense += cents
+        return income, expense
+
+    def _load(self, path):
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is not an roi history file")
+        magic, version, byte_order = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an roi history file")
+        if version != VERSION:
+            raise ValueError(f"unsupported history version {version}")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            raise ValueError("history was written on a machine of another byte order")
+        position = HEADER.size
+        while position + RECORD.size <= len(data):
+            record_type, length = RECORD.unpack_from(data, position)
+            payload = data[position + RECORD.size : position + RECORD.size + length]
+            if len(payload) < length:
+                break
+            if record_type == b"K":
+                self.investment_id(str(payload, "utf-8"))
+            elif record_type == b"I":
+                investment_id, kind = ITEM.unpack_from(payload)
+                name = str(payload[ITEM.size :], "utf-8")
+                self._item_ids[(investment_id, kind, name)] = len(self.item_keys)
+                self.item_keys.append((investment_id, kind, name))
+                self.kinds.append(kind)
+            elif record_type == b"R":
+                columns = array("q", payload)
+                count = len(columns) // 4
+                for number, column in enumerate(
+                    (self.days, self.investments, self.items, self.cents)
+                ):
+                    column.extend(columns[number * count : (number + 1) * count])
+            position += RECORD.size + length
+        self._index()
+        self._written = [len(self.days), len(self.keys), len(self.item_keys)]
+        return position
+
+    def _index(self):
+        size = self.block_size
+        kinds = self.kinds
+        for start in range(0, len(self.days), size):
+            days = self.days[start : start + size]
+            investments = self.investments[start : start + size]
+            self.min_day.append(min(days))
+            self.max_day.append(max(days))
+            self.min_investment.append(min(investments))
+            self.max_investment.append(max(investments))
+            income = expense = 0
+            for item, cents in zip(
+                self.items[start : start + size], self.cents[start : start + size]
+            ):
+                if kinds[item] == INCOME:
+                    income += cents
+                else:
+                    expense += cents
+            self.income_cents.append(income)
+            self.expense_cents.append(expense)
+
+
+def investment_key(user, investment):
+    """Get the key of a User's Investment, stable across renames.
+
+    Keyword arguments:
+    user -- User object holding the Investment.
+    investment -- Investment object.
+    Return: String of the username and the Investment's id in the User's collection.
+    Raises ValueError if the User does not hold the Investment.
+    """
+    investment_id = user.investments.id_of(investment)
+    if investment_id is None:
+        raise ValueError(f"{user.username} does not hold {investment.name}")
+    # ids are digits, so the part after the last # is always the id
+    return f"{user.username}#{investment_id}"
+
+
+def _key(investment):
+    if isinstance(investment, str):
+        return investment
+    if isinstance(investment, tuple):
+        return investment_key(*investment)
+    raise TypeError(
+        "an Investment is recorded as a (User, Investment) pair or under a string key"
+    )
+
+
+def _key_and_investment(investment, key):
+    if isinstance(investment, tuple):
+        return (_key(investment) if key is None else key), investment[1]
+    if key is None:
+        raise TypeError("an Investment without its User needs a key")
+    return key, investment
+
+
+def _day(when):
+    if isinstance(when, int):
+        return when
+    if isinstance(when, str):
+        when = date.fromisoformat(when)
+    return when.toordinal()
+
+
+def _add_months(day, months):
+    month = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month, 12)
+    last = calendar.monthrange(year, month + 1)[1]
+    return date(year, month + 1, min(day.day, last))
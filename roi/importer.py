@@ -0,0 +1,283 @@
+import argparse
+import csv
+import json
+import sys
+from collections import deque, namedtuple
+from functools import partial
+from itertools import islice
+
+from roi.money import from_cents, to_cents
+from roi.roi import Expense, Income, Investment, User, UserRegistry
+
+FIELDS = ("user", "investment", "kind", "name", "amount", "total_invest")
+
+# a validated row with amounts in cents. kind, name and cents are None for a row that only
+# sets total_invest, and invest_cents is None when the row leaves total_invest unchanged.
+ImportRow = namedtuple("ImportRow", "line user investment kind name cents invest_cents")
+
+
+class RowError(Exception):
+    """A row of an import that could not be used.
+
+    Keyword arguments:
+    line -- Line number of the row in the input.
+    message -- What is wrong with the row.
+    Return: None
+    """
+
+    def __init__(self, line, message) -> None:
+        super().__init__(line, message)
+        self.line = line
+        self.message = message
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}"
+
+
+class ImportResult:
+    """Summary of an import.
+
+    Keyword arguments:
+    registry -- The UserRegistry the investments were imported into.
+    Return: None
+    """
+
+    def __init__(self, registry) -> None:
+        self.registry = registry
+        self.rows = 0
+        self.investments = 0
+        self.errors = []
+
+
+def parse_record(line, record):
+    """Validate a single record.
+
+    Keyword arguments:
+    line -- Line number of the record in the input.
+    record -- Dict with the FIELDS keys, missing keys are treated as empty.
+    Return: ImportRow, or a RowError if the record is invalid.
+    """
+    try:
+        user = _text(record.get("user"))
+        investment = _text(record.get("investment"))
+        kind = _text(record.get("kind")).lower()
+        name = _text(record.get("name"))
+        amount = _text(record.get("amount"))
+        total_invest = _text(record.get("total_invest"))
+    except AttributeError:
+        return RowError(line, "row is not an object")
+    if not user:
+        return RowError(line, "user is required")
+    if not investment:
+        return RowError(line, "investment is required")
+    if kind and kind not in ("income", "expense"):
+        return RowError(line, f"kind must be income or expense, not {kind!r}")
+    if kind and not (name and amount):
+        return RowError(line, f"an {kind} needs a name and an amount")
+    try:
+        cents = to_cents(amount) if kind else None
+        invest_cents = to_cents(total_invest) if total_invest else None
+    except (ArithmeticError, ValueError):
+        return RowError(line, "amount and total_invest must be numbers")
+    return ImportRow(
+        line, user, investment, kind or None, name or None, cents, invest_cents
+    )
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def parse_file(path, format=None, workers=0, chunk_size=10000):
+    """Read and validate the rows of a CSV or JSONL file as a stream.
+
+    Keyword arguments:
+    path -- Path of the file to import.
+    format -- "csv" or "jsonl", taken from the file extension by default.
+    workers -- Number of processes to parse with, 0 parses in this process.
+    chunk_size -- Number of lines sent to a worker at a time.
+    Return: Generator of ImportRow and RowError objects in input order.
+    """
+    format = format or _guess_format(path)
+    with open(path, newline="", encoding="utf-8") as file:
+        if workers:
+            yield from _parse_parallel(file, format, workers, chunk_size)
+        elif format == "csv":
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield parse_record(reader.line_num, record)
+        else:
+            for line, text in enumerate(file, 1):
+                if text.strip():
+                    yield _parse_json(line, text)
+
+
+def _guess_format(path):
+    if str(path).lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def _parse_json(line, text):
+    try:
+        return parse_record(line, json.loads(text))
+    except ValueError as e:
+        return RowError(line, f"invalid JSON: {e}")
+
+
+def _parse_chunk(format, fieldnames, first_line, lines):
+    if format == "csv":
+        records = csv.DictReader(lines, fieldnames=fieldnames)
+        return [
+            parse_record(first_line + line, record)
+            for line, record in enumerate(records)
+        ]
+    return [
+        _parse_json(first_line + line, text)
+        for line, text in enumerate(lines)
+        if text.strip()
+    ]
+
+
+def _parse_parallel(file, format, workers, chunk_size):
+    # CSV chunks are split on lines, so quoted fields must not contain newlines
+    fieldnames = None
+    first_line = 1
+    if format == "csv":
+        fieldnames = next(csv.reader([file.readline()]), None)
+        first_line = 2
+    # the process pool is only loaded by parallel imports, it adds to every start up otherwise
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # only a few chunks are in flight, so memory stays bounded
+        pending = deque()
+        while True:
+            lines = list(islice(file, chunk_size))
+            if lines:
+                pending.append(
+                    executor.submit(_parse_chunk, format, fieldnames, first_line, lines)
+                )
+                first_line += len(lines)
+            if pending and (not lines or len(pending) >= workers * 2):
+                yield from pending.popleft().result()
+            if not lines and not pending:
+                return
+
+
+def import_rows(rows, registry=None, catalog=None):
+    """Group validated rows into Investments and add them to their Users.
+
+    Consecutive rows for the same user and investment are grouped. An investment that already exists
+    for the user gets the new incomes and expenses added to it.
+
+    Keyword arguments:
+    rows -- Iterable of ImportRow and RowError objects.
+    registry -- UserRegistry to import into, a new one by default.
+    catalog -- LineItemCatalog to share the line items through, None for private line items.
+    Return: ImportResult.
+    """
+    if registry is None:
+        registry = UserRegistry()
+    result = ImportResult(registry)
+    group = []
+    for row in rows:
+        if isinstance(row, RowError):
+            result.errors.append(row)
+            continue
+        result.rows += 1
+        if group and (
+            row.user.lower() != group[0].user.lower()
+            or row.investment.lower() != group[0].investment.lower()
+        ):
+            _add_group(result, group, catalog)
+            group = []
+        group.append(row)
+    if group:
+        _add_group(result, group, catalog)
+    return result
+
+
+def _add_group(result, group, catalog):
+    first = group[0]
+    incomes = []
+    expenses = []
+    invest_cents = None
+    if catalog is None:
+        income_item = Income.from_cents
+        expense_item = Expense.from_cents
+    else:
+        income_item = partial(catalog.item_from_cents, Income)
+        expense_item = partial(catalog.item_from_cents, Expense)
+    for row in group:
+        if row.kind == "income":
+            incomes.append(income_item(row.name, row.cents))
+        elif row.kind == "expense":
+            expenses.append(expense_item(row.name, row.cents))
+        if row.invest_cents is not None:
+            invest_cents = row.invest_cents
+
+    user = result.registry.get(first.user)
+    if user is None:
+        user = User(first.user, registry=result.registry)
+    investment = user.get_investment(first.investment)
+    if investment is None:
+        investment = Investment(
+            first.investment, incomes, expenses, from_cents(invest_cents or 0)
+        )
+        user.add_investment(investment)
+        result.investments += 1
+    else:
+        for income in incomes:
+            investment.add_income(income)
+        for expense in expenses:
+            investment.add_expense(expense)
+        if invest_cents is not None:
+            investment.set_total_invest(from_cents(invest_cents))
+
+
+def import_file(path, registry=None, format=None, workers=0, catalog=None):
+    """Import a CSV or JSONL file of (user, investment, kind, name, amount, total_invest) rows.
+
+    Keyword arguments:
+    path -- Path of the file to import.
+    registry -- UserRegistry to import into, a new one by default.
+    format -- "csv" or "jsonl", taken from the file extension by default.
+    workers -- Number of processes to parse with, 0 parses in this process.
+    catalog -- LineItemCatalog to share the line items through, None for private line items.
+    Return: ImportResult.
+    """
+    return import_rows(parse_file(path, format, workers), registry, catalog)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Import investments from a CSV or JSONL file."
+    )
+    parser.add_argument(
+        "path", help="file of user,investment,kind,name,amount,total_invest rows"
+    )
+    parser.add_argument("--format", choices=("csv", "jsonl"))
+    parser.add_argument("--workers", type=int, default=0, help="parse in N processes")
+    parser.add_argument("--db", help="SQLite database to save the imported users to")
+    args = parser.parse_args(argv)
+
+    result = import_file(args.path, format=args.format, workers=args.workers)
+    for error in result.errors:
+        print(error, file=sys.stderr)
+    if args.db:
+        from roi.storage import SQLiteStorage
+
+        with SQLiteStorage(args.db) as storage:
+            storage.save_users(result.registry.users())
+    print(
+        f"Imported {result.rows} rows into {result.investments} investments "
+        f"for {len(result.registry)} users, {len(result.errors)} rows had errors."
+    )
+    return 1 if result.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from roi.roi import Investment, LineItem, UserRegistry
+
+# (class, attribute, operation name) of every instrumented hot path
+TARGETS = (
+    (Investment, "__init__", "investment.construct"),
+    (Investment, "roi", "investment.roi"),
+    (Investment, "set_incomes", "investment.set_incomes"),
+    (Investment, "set_expenses", "investment.set_expenses"),
+    (Investment, "set_total_invest", "investment.set_total_invest"),
+    (Investment, "add_income", "investment.add_income"),
+    (Investment, "remove_income", "investment.remove_income"),
+    (Investment, "add_expense", "investment.add_expense"),
+    (Investment, "remove_expense", "investment.remove_expense"),
+    (Investment, "_line_item_changed", "investment.line_item_changed"),
+    (LineItem, "__init__", "line_item.parse"),
+    (LineItem, "set_amount", "line_item.set_amount"),
+    (UserRegistry, "register", "registry.register"),
+    (UserRegistry, "unregister", "registry.unregister"),
+    (UserRegistry, "get", "registry.get"),
+    (UserRegistry, "__getitem__", "registry.getitem"),
+    (UserRegistry, "__contains__", "registry.contains"),
+)
+
+# operation name -> [calls, nanoseconds], including the time of nested operations
+_stats = {}
+# (class, attribute) -> the original attribute while instrumentation is enabled
+_originals = {}
+_lock = threading.Lock()
+
+
+def enable():
+    """Start recording counts and cumulative time of the roi hot paths.
+
+    The instrumented methods are swapped for timing wrappers only while enabled, so the
+    roi classes run their original code with no overhead at all when it is disabled.
+    """
+    with _lock:
+        if _originals:
+            return
+        for cls, attribute, name in TARGETS:
+            original = cls.__dict__[attribute]
+            _stats.setdefault(name, [0, 0])
+            _originals[(cls, attribute)] = original
+            if isinstance(original, property):
+                wrapped = property(
+                    _timed(name, original.fget), original.fset, original.fdel
+                )
+            else:
+                wrapped = _timed(name, original)
+            setattr(cls, attribute, wrapped)
+
+
+def disable():
+    """Stop recording and restore the original methods. Recorded stats are kept."""
+    with _lock:
+        for (cls, attribute), original in _originals.items():
+            setattr(cls, attribute, original)
+        _originals.clear()
+
+
+def enabled():
+    return bool(_originals)
+
+
+def reset():
+    """Clear every recorded count and time."""
+    for stat in _stats.values():
+        stat[0] = stat[1] = 0
+
+
+@contextmanager
+def instrumented(clear=True):
+    """Record the roi hot paths for the duration of a with block.
+
+    Keyword arguments:
+    clear -- Reset the stats when the block starts.
+    Return: Context manager yielding the snapshot function.
+    """
+    if clear:
+        reset()
+    was_enabled = enabled()
+    enable()
+    try:
+        yield snapshot
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def _timed(name, func):
+    stat = _stats[name]
+    clock = time.perf_counter_ns
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stat[0] += 1
+            stat[1] += clock() - started
+
+    return wrapper
+
+
+def snapshot():
+    """Get the recorded stats.
+
+    Return: Dict of operation name to {"count", "seconds"} for every operation called at least once.
+    """
+    return {
+        name: {"count": calls, "seconds": nanoseconds / 1e9}
+        for name, (calls, nanoseconds) in sorted(_stats.items())
+        if calls
+    }
+
+
+def to_json():
+    return json.dumps(
+        {"timestamp": time.time(), "operations": snapshot()}, indent=2, sort_keys=True
+    )
+
+
+def to_prometheus():
+    """Format the recorded stats in the Prometheus text exposition format.
+
+    Return: String with roi_operation_calls_total and roi_operation_seconds_total counters.
+    """
+    stats = snapshot()
+    lines = [
+        "# HELP roi_operation_calls_total Calls of instrumented roi operations.",
+        "# TYPE roi_operation_calls_total counter",
+    ]
+    lines += [
+        f'roi_operation_calls_total{{operation="{name}"}} {stat["count"]}'
+        for name, stat in stats.items()
+    ]
+    lines += [
+        "# HELP roi_operation_seconds_total Cumulative time of instrumented roi operations.",
+        "# TYPE roi_operation_seconds_total counter",
+    ]
+    lines += [
+        f'roi_operation_seconds_total{{operation="{name}"}} {stat["seconds"]:.9f}'
+        for name, stat in stats.items()
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class CollapsedStackProfiler:
+    """Sampling profiler that writes collapsed stacks for flamegraph tools.
+
+    While the with block runs, a background thread samples the stack of the thread that entered
+    it every interval seconds. Each output line is a semicolon separated stack from the outermost
+    frame followed by its sample count, the format flamegraph.pl and speedscope read.
+
+    Keyword arguments:
+    path -- File to write the collapsed stacks to on exit, None to only keep them in self.stacks.
+    interval -- Seconds between samples.
+    Return: None
+    """
+
+    def __init__(self, path=None, interval=0.001) -> None:
+        self.path = path
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def __enter__(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if self.path is not None:
+            self.write(self.path)
+
+    def write(self, path):
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None or self._target == me:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(
+                    f"{os.path.basename(code.co_filename)}:{code.co_name}"
+                    f":{code.co_firstlineno}"
+                )
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+
+def profile(path=None, interval=0.001):
+    """Profile a with block into a collapsed-stack file, e.g. with profile("out.folded"): ...
+
+    Keyword arguments:
+    path -- File to write the collapsed stacks to.
+    interval -- Seconds between samples.
+    Return: CollapsedStackProfiler.
+    """
+    return CollapsedStackProfiler(path, interval)
@@ -0,0 +1,451 @@
+import json
+import os
+import threading
+import weakref
+import zlib
+
+from roi.money import from_cents
+from roi.roi import Expense, Income, Investment, User, UserRegistry
+from roi.snapshot import Snapshot, saved_user, write_snapshot
+
+
+class Journal:
+    """Write-ahead journal of the edits made to the Users of a registry.
+
+    The journal watches the registry and every User's investments, and appends a record for
+    each User added or removed and each Investment added, edited or removed. Records are kept
+    in memory until commit writes them in one batch followed by a single fsync, and threads
+    that commit while a batch is being written wait for it and share the next one (group
+    commit). Edits only append records, and once batch_size are pending a background thread
+    commits them, so an edit never waits for the disk or a compaction while it holds its User's
+    lock. An Investment edited several times before a commit is written once with its latest
+    state, and replaying a record twice has the same effect as replaying it once.
+
+    Compaction writes the whole registry to a snapshot and starts a new journal holding only
+    the records since, so recovery reads one snapshot and at most compact_every records. When
+    the journal file already exists it is recovered into the registry and compacted on open.
+
+    Line item renames are not edits of the Investment and are written with its next edit or
+    compaction.
+
+    Keyword arguments:
+    path -- Path of the journal file, snapshots are written next to it.
+    registry -- UserRegistry to journal, a new one by default. Must be empty if the journal
+    file exists.
+    batch_size -- Number of pending records that makes the background thread commit.
+    compact_every -- Number of committed records after which commit compacts, None to only
+    compact when asked to.
+    fsync -- Whether commits wait for the data to reach the disk.
+    Return: None. Raises ValueError if path is not a journal.
+    """
+
+    def __init__(
+        self, path, registry=None, batch_size=1000, compact_every=100000, fsync=True
+    ) -> None:
+        self.path = os.fspath(path)
+        self.registry = registry if registry is not None else UserRegistry()
+        self.batch_size = batch_size
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        # records waiting for a commit, put records are (username, id, investment)
+        self._pending = []
+        self._pending_puts = set()
+        self._appended = 0
+        self._durable = 0
+        self._writing = False
+        self._error = None
+        self._since_compaction = 0
+        # batches taken while a compaction reads the users, one list per compaction
+        self._captures = []
+        # id(collection) -> (collection, username)
+        self._collections = {}
+        self._file = None
+        self._generation = 0
+        self._snapshot = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self.commits = 0
+        self.compactions = 0
+        self.recovered = 0
+        if os.path.exists(self.path):
+            if len(self.registry):
+                raise ValueError(
+                    "a journal can only be recovered into an empty registry"
+                )
+            self._generation, self._snapshot, self.recovered = _replay(
+                self.path, self.registry
+            )
+        self.compact()
+        self.registry.add_watcher(self)
+        for user in self.registry.users():
+            self._watch(user)
+        self._flusher = threading.Thread(
+            target=_flush, args=(weakref.ref(self), self._wake), daemon=True
+        )
+        self._flusher.start()
+        # an unclosed journal that is collected lets its thread end
+        weakref.finalize(self, self._wake.set)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._stopping = True
+            self._wake.set()
+            self._flusher.join()
+            self.commit()
+            self.registry.remove_watcher(self)
+            for collection, _ in self._collections.values():
+                collection.remove_watcher(self)
+            self._collections = {}
+            self._file.close()
+            self._file = None
+
+    """Write every pending record to the journal and wait until it is on disk.
+
+    Keyword arguments:
+    None
+    Return: None. Compacts the journal once compact_every records were committed since the
+    last compaction.
+    """
+
+    def commit(self):
+        with self._lock:
+            target = self._appended
+            while self._durable < target:
+                if self._error is not None:
+                    raise self._error
+                if self._writing:
+                    # another thread is writing, the next batch picks up our records
+                    self._written.wait()
+                    continue
+                batch, end = self._take()
+                self._lock.release()
+                try:
+                    data = self._encode(batch)
+                    self._file.write(data)
+                    self._file.flush()
+                    if self.fsync:
+                        os.fsync(self._file.fileno())
+                except BaseException as e:
+                    self._error = e
+                    raise
+                finally:
+                    self._lock.acquire()
+                    self._writing = False
+                    self._written.notify_all()
+                self._durable = end
+                self._since_compaction += len(batch)
+                self.commits += 1
+            compact = (
+                self.compact_every is not None
+                and self._since_compaction >= self.compact_every
+            )
+        if compact:
+            self.compact()
+
+    """Write the registry to a new snapshot and restart the journal from it.
+
+    The snapshot is written and synced first, then the new journal replaces the old one and
+    the previous snapshot is removed, so a crash at any point leaves a journal and the snapshot
+    it starts from. The users are read before the pending records are taken, without waiting
+    for a commit in progress, and records committed meanwhile are written again after the
+    snapshot; replaying them twice is harmless. Puts and deletes of a User removed later in
+    the batch are left out, as the snapshot may no longer have that User.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    def compact(self):
+        captured = []
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            self._captures.append(captured)
+        try:
+            # read without the journal's lock, so a commit never waits on a User's lock
+            users = [saved_user(user) for user in self.registry.snapshot().values()]
+        except BaseException:
+            with self._lock:
+                self._captures.remove(captured)
+            raise
+        with self._lock:
+            while self._writing and self._error is None:
+                self._written.wait()
+            # batches taken up to our own go to the new journal too
+            self._captures.remove(captured)
+            if self._error is not None:
+                raise self._error
+            batch, end = self._take()
+        batch = _without_dropped(
+            [record for taken in captured for record in taken] + batch
+        )
+        try:
+            self._compact(users, batch)
+        except BaseException as e:
+            with self._lock:
+                self._error = e
+                self._writing = False
+                self._written.notify_all()
+            raise
+        with self._lock:
+            self._durable = max(self._durable, end)
+            self._writing = False
+            self._written.notify_all()
+
+    def _take(self):
+        # called with the lock held
+        self._writing = True
+        batch = self._pending
+        self._pending = []
+        self._pending_puts = set()
+        for captured in self._captures:
+            captured.append(batch)
+        return batch, self._appended
+
+    def _compact(self, users, batch):
+        directory, name = os.path.split(self.path)
+        generation = self._generation + 1
+        snapshot = None
+        if users:
+            snapshot = f"{name}.{generation}.snap"
+            snapshot_path = os.path.join(directory, snapshot)
+            write_snapshot(snapshot_path, users)
+            if self.fsync:
+                _sync_path(snapshot_path)
+        base = {
+            "op": "base",
+            "generation": generation,
+            "snapshot": snapshot,
+        }
+
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(_encode_record(base))
+            file.write(self._encode(batch))
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(temporary, self.path)
+        if self.fsync:
+            _sync_path(directory or ".")
+        self._file = open(self.path, "ab")
+
+        previous = self._snapshot
+        self._generation = generation
+        self._snapshot = snapshot
+        self._since_compaction = len(batch)
+        self.compactions += 1
+        if previous is not None and previous != snapshot:
+            try:
+                os.remove(os.path.join(directory, previous))
+            except FileNotFoundError:
+                pass
+
+    def _encode(self, batch):
+        records = []
+        for record in batch:
+            if type(record) is tuple:
+                record = _put_record(*record)
+            records.append(_encode_record(record))
+        return b"".join(records)
+
+    def _append(self, record):
+        # called by watchers with the collection's lock held, so it only hands a full batch to
+        # the background thread
+        with self._lock:
+            self._pending.append(record)
+            self._appended += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _put(self, username, investment_id, investment):
+        key = (username, investment_id)
+        with self._lock:
+            # the record is encoded at commit, so one pending put covers every later edit
+            if key in self._pending_puts:
+                return
+            self._pending_puts.add(key)
+        self._append((username, investment_id, investment))
+
+    def _watch(self, user):
+        collection = user.investments
+        self._collections[id(collection)] = (collection, user.username)
+        collection.add_watcher(self)
+
+    # watcher callbacks from UserRegistry and InvestmentCollection
+
+    def _user_added(self, user):
+        self._append({"op": "user", "user": user.username})
+        self._watch(user)
+        for investment in user.investments:
+            self._put(user.username, user.investments.id_of(investment), investment)
+
+    def _user_removed(self, user):
+        collection = user.investments
+        if self._collections.pop(id(collection), None) is not None:
+            collection.remove_watcher(self)
+        with self._lock:
+            # a User registered again under this name starts its ids from 0
+            self._pending_puts = {
+                key for key in self._pending_puts if key[0] != user.username
+            }
+        self._append({"op": "drop", "user": user.username})
+
+    def _investment_added(self, collection, investment):
+        username = self._collections[id(collection)][1]
+        self._put(username, collection.id_of(investment), investment)
+
+    def _investment_removed(self, collection, investment, investment_id):
+        username = self._collections[id(collection)][1]
+        self._append({"op": "delete", "user": username, "id": investment_id})
+
+    def _investment_changed(self, collection, investment):
+        investment_id = collection.id_of(investment)
+        if investment_id is not None:
+            self._put(self._collections[id(collection)][1], investment_id, investment)
+
+
+def _flush(ref, wake):
+    # background thread of a Journal, holds it only while committing
+    while True:
+        wake.wait()
+        wake.clear()
+        journal = ref()
+        if journal is None or journal._stopping:
+            return
+        try:
+            journal.commit()
+        except Exception:
+            # kept in journal._error, the next commit or compaction raises it
+            pass
+        del journal
+
+
+def _without_dropped(batch):
+    # leaves out the puts and deletes of a User that a later record of the batch removes
+    dropped = set()
+    kept = []
+    for record in reversed(batch):
+        if type(record) is tuple:
+            op, username = "put", record[0]
+        else:
+            op, username = record["op"], record["user"]
+        if op == "drop":
+            dropped.add(username)
+        elif op == "user":
+            dropped.discard(username)
+        elif username in dropped:
+            continue
+        kept.append(record)
+    kept.reverse()
+    return kept
+
+
+def _put_record(username, investment_id, investment):
+    return {
+        "op": "put",
+        "user": username,
+        "id": investment_id,
+        "name": investment.name,
+        "invest": investment.invest_cents,
+        "incomes": [[income.name, income.cents] for income in investment.incomes],
+        "expenses": [[expense.name, expense.cents] for expense in investment.expenses],
+    }
+
+
+# a record is a line of its crc32 in hex and its JSON, so a torn or corrupt tail is detected
+def _encode_record(record):
+    data = json.dumps(record, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(data), data)
+
+
+def _read_records(file):
+    for line in file:
+        if not line.endswith(b"\n"):
+            return
+        checksum, _, data = line[:-1].partition(b" ")
+        try:
+            if int(checksum, 16) != zlib.crc32(data):
+                return
+        except ValueError:
+            return
+        yield json.loads(data)
+
+
+def _sync_path(path):
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _replay(path, registry):
+    # returns the generation and snapshot of the journal and the number of records replayed
+    with open(path, "rb") as file:
+        records = _read_records(file)
+        base = next(records, None)
+        if base is None or base.get("op") != "base":
+            raise ValueError(f"{path} is not an roi journal")
+        snapshot = base["snapshot"]
+        if snapshot is not None:
+            # the snapshot keeps the collection ids the records refer to, and every User is
+            # loaded before it is closed
+            with Snapshot(os.path.join(os.path.dirname(path), snapshot)) as loaded:
+                loaded.load_users(registry)
+                for user in registry.users():
+                    user.investments
+        count = 0
+        for record in records:
+            _apply(registry, record)
+            count += 1
+    return base["generation"], snapshot, count
+
+
+def _apply(registry, record):
+    op = record["op"]
+    username = record["user"]
+    if op == "user":
+        if username not in registry:
+            User(username, registry=registry)
+    elif op == "drop":
+        registry.unregister(username)
+    elif username not in registry:
+        # a put or delete of a User that was removed before the snapshot, written by a
+        # journal that kept such records through compaction
+        return
+    elif op == "put":
+        collection = registry[username].investments
+        incomes = [Income.from_cents(name, cents) for name, cents in record["incomes"]]
+        expenses = [
+            Expense.from_cents(name, cents) for name, cents in record["expenses"]
+        ]
+        investment = collection.get_by_id(record["id"])
+        if investment is None:
+            investment = Investment(record["name"], incomes, expenses)
+            investment.set_total_invest(from_cents(record["invest"]))
+            collection.add(investment, record["id"])
+        else:
+            investment.set_name(record["name"])
+            investment.set_incomes(incomes)
+            investment.set_expenses(expenses)
+            investment.set_total_invest(from_cents(record["invest"]))
+    elif op == "delete":
+        collection = registry[username].investments
+        investment = collection.get_by_id(record["id"])
+        if investment is not None:
+            collection.remove(investment)
+    else:
+        raise ValueError(f"unknown journal record {op!r}")
@@ -0,0 +1,80 @@
+import sys
+from array import array
+
+from roi.money import from_cents, to_cents
+from roi.roi import Income
+
+
+class LineItemArray:
+    """Array-backed bulk storage for many Incomes or Expenses.
+
+    Amounts live in a single array of int64 cents and names are interned, so repeated names
+    like "Rent" or "Taxes" are stored once. Line item objects are only built when an item is read.
+
+    Keyword arguments:
+    item_class -- Income or Expense, the class of the items read back out.
+    Return: None
+    """
+
+    def __init__(self, item_class=Income) -> None:
+        self.item_class = item_class
+        self.names = []
+        self.cents = array("q")
+
+    def __len__(self) -> int:
+        return len(self.cents)
+
+    def __getitem__(self, index):
+        return self.item_class.from_cents(self.names[index], self.cents[index])
+
+    def __iter__(self):
+        from_cents_item = self.item_class.from_cents
+        for name, cents in zip(self.names, self.cents):
+            yield from_cents_item(name, cents)
+
+    """Add a line item.
+
+    Keyword arguments:
+    name -- String name of the line item.
+    amount -- String dollar amount of the line item.
+    Return: None
+    """
+
+    def append(self, name, amount):
+        self.append_cents(name, to_cents(amount))
+
+    def append_cents(self, name, cents):
+        self.names.append(sys.intern(name))
+        self.cents.append(cents)
+
+    """Add Income or Expense objects.
+
+    Keyword arguments:
+    items -- Iterable of line item objects.
+    Return: None
+    """
+
+    def extend(self, items):
+        for item in items:
+            self.append_cents(item.name, item.cents)
+
+    """Build an array from Income or Expense objects.
+
+    Keyword arguments:
+    items -- Iterable of line item objects.
+    item_class -- Class of the items read back out.
+    Return: A new LineItemArray.
+    """
+
+    @classmethod
+    def from_items(cls, items, item_class=Income):
+        line_items = cls(item_class)
+        line_items.extend(items)
+        return line_items
+
+    def total_cents(self):
+        return sum(self.cents)
+
+    # returns a Decimal object
+    def total(self):
+        return from_cents(self.total_cents())
@@ -0,0 +1,266 @@
+from decimal import ROUND_HALF_EVEN, ROUND_HALF_UP, Decimal
+from functools import total_ordering
+
+# shared quantization constant, every amount is rounded to whole cents
+CENT = Decimal("1.00")
+
+# rounding modes of div_round, Money.scale and Money.divide
+ROUNDINGS = (ROUND_HALF_EVEN, ROUND_HALF_UP)
+
+# names of the metrics derive_metrics returns, in its order
+METRICS = ("total_income", "total_expense", "cash_flow", "annual_cash_flow", "roi")
+
+
+def to_cents(amount, rounding=ROUND_HALF_EVEN) -> int:
+    """Convert a dollar amount to integer cents.
+
+    Rounds exactly like Decimal(amount).quantize(Decimal("1.00"), rounding) does, and raises
+    the same errors. Strings with at most two decimal places need no rounding and are parsed
+    straight to an int, everything else goes through Decimal.
+
+    Keyword arguments:
+    amount -- String, int, Decimal or Money dollar amount.
+    rounding -- Decimal rounding mode, ROUND_HALF_EVEN (banker's rounding) by default.
+    Return: int number of cents.
+    """
+    kind = type(amount)
+    if kind is int:
+        return amount * 100
+    if kind is str:
+        whole, dot, fraction = amount.partition(".")
+        # "1_.5" or "1 ." would turn valid once the dot is dropped, so they are left to Decimal
+        if (
+            len(fraction) <= 2
+            and len(whole) <= 20
+            and (fraction.isdigit() or not dot)
+            and "_" not in whole
+        ):
+            try:
+                return int(whole + fraction) * _SCALES[len(fraction)]
+            except ValueError:
+                pass
+    elif kind is Money:
+        return amount.cents
+    return int(Decimal(amount).quantize(CENT, rounding=rounding).scaleb(2))
+
+
+# multiplier from an amount with 0, 1 or 2 decimal places to cents
+_SCALES = (100, 10, 1)
+
+
+def from_cents(cents: int) -> Decimal:
+    """Convert integer cents back into a two decimal place Decimal.
+
+    Keyword arguments:
+    cents -- int number of cents.
+    Return: Decimal dollar amount, e.g. 15012 -> Decimal("150.12").
+    """
+    return Decimal(cents).scaleb(-2)
+
+
+def format_cents(cents: int) -> str:
+    """Format integer cents like str(from_cents(cents)) does, without building a Decimal.
+
+    Keyword arguments:
+    cents -- int number of cents.
+    Return: String dollar amount, e.g. -5 -> "-0.05".
+    """
+    if cents < 0:
+        return f"-{-cents // 100}.{-cents % 100:02d}"
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def div_round_half_even(numerator: int, denominator: int) -> int:
+    """Divide two ints and round the quotient half to even.
+
+    This is the rounding Decimal.quantize uses under the default context.
+
+    Keyword arguments:
+    numerator -- int dividend.
+    denominator -- int divisor, must not be zero.
+    Return: int quotient rounded half to even.
+    """
+    return div_round(numerator, denominator, ROUND_HALF_EVEN)
+
+
+def div_round(numerator: int, denominator: int, rounding=ROUND_HALF_EVEN) -> int:
+    """Divide two ints and round the quotient to the nearest int.
+
+    Keyword arguments:
+    numerator -- int dividend.
+    denominator -- int divisor, must not be zero.
+    rounding -- ROUND_HALF_EVEN to round ties to even, ROUND_HALF_UP to round them away from zero.
+    Return: int rounded quotient.
+    """
+    if denominator == 0:
+        raise ZeroDivisionError("division by zero")
+    if rounding not in ROUNDINGS:
+        raise ValueError(f"rounding must be one of {', '.join(ROUNDINGS)}")
+    negative = (numerator < 0) != (denominator < 0)
+    quotient, remainder = divmod(abs(numerator), abs(denominator))
+    twice = remainder * 2
+    if twice > abs(denominator):
+        quotient += 1
+    elif twice == abs(denominator) and (rounding == ROUND_HALF_UP or quotient % 2):
+        quotient += 1
+    return -quotient if negative else quotient
+
+
+def derive_metrics(
+    income_cents: int, expense_cents: int, income_count: int, invest_cents: int
+):
+    """Derive the Investment metrics from its totals in cents.
+
+    Follows the Investment rules: expenses and cash flow only count once the
+    investment has at least one income, and ROI is only calculated for a
+    positive annual cash flow.
+
+    Keyword arguments:
+    income_cents -- Sum of all income amounts in cents.
+    expense_cents -- Sum of all expense amounts in cents.
+    income_count -- Number of incomes on the investment.
+    invest_cents -- total_invest in cents.
+    Return: Tuple of (total_income, total_expense, cash_flow, annual_cash_flow) in cents
+    and roi in hundredths.
+    """
+    if income_count > 0:
+        cash_flow = income_cents - expense_cents
+    else:
+        expense_cents = 0
+        cash_flow = 0
+    annual_cash_flow = cash_flow * 12
+    roi = roi_hundredths(annual_cash_flow, invest_cents)
+    return income_cents, expense_cents, cash_flow, annual_cash_flow, roi
+
+
+def roi_hundredths(annual_cash_flow: int, invest_cents: int) -> int:
+    """Calculate ROI from cents, rounded to hundredths like the Investment ROI.
+
+    Keyword arguments:
+    annual_cash_flow -- Annual cash flow in cents.
+    invest_cents -- total_invest in cents.
+    Return: int ROI in hundredths, 0 when the annual cash flow is not positive.
+    """
+    if annual_cash_flow > 0:
+        return div_round_half_even(annual_cash_flow * 100, invest_cents)
+    return 0
+
+
+@total_ordering
+class Money:
+    """An exact dollar amount stored as integer cents.
+
+    Parsing rounds to cents once, with an explicit rounding mode. Adding, subtracting and
+    multiplying by ints are exact, and scale and divide round explicitly. Income, Expense and
+    Investment keep the same integer cents internally and convert to Decimal only when a value
+    is read, so Money and those classes always agree.
+
+    Keyword arguments:
+    amount -- String, int, Decimal or Money dollar amount.
+    rounding -- ROUND_HALF_EVEN (banker's rounding) or ROUND_HALF_UP.
+    Return: None
+    """
+
+    __slots__ = ("cents",)
+
+    def __init__(self, amount="0", rounding=ROUND_HALF_EVEN) -> None:
+        self.cents = to_cents(amount, rounding)
+
+    @classmethod
+    def from_cents(cls, cents: int):
+        money = cls.__new__(cls)
+        money.cents = cents
+        return money
+
+    def to_decimal(self) -> Decimal:
+        return from_cents(self.cents)
+
+    def __str__(self) -> str:
+        return str(from_cents(self.cents))
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+    # equal to the Decimal of the same amount, so it must hash like it
+    def __hash__(self) -> int:
+        return hash(from_cents(self.cents))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        if isinstance(other, (int, Decimal)):
+            return from_cents(self.cents) == other
+        return NotImplemented
+
+    def __lt__(self, other) -> bool:
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        if isinstance(other, (int, Decimal)):
+            return from_cents(self.cents) < other
+        return NotImplemented
+
+    def __bool__(self) -> bool:
+        return self.cents != 0
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money.from_cents(self.cents + other.cents)
+        if type(other) is int and other == 0:
+            # lets sum() start from 0
+            return self
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money.from_cents(self.cents - other.cents)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money.from_cents(-self.cents)
+
+    def __abs__(self):
+        return Money.from_cents(abs(self.cents))
+
+    def __mul__(self, other):
+        if type(other) is int:
+            return Money.from_cents(self.cents * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    """Multiply by a factor and round back to cents.
+
+    Keyword arguments:
+    factor -- int, string or Decimal factor, e.g. "1.035" for a 3.5% increase.
+    rounding -- ROUND_HALF_EVEN or ROUND_HALF_UP.
+    Return: Money.
+    """
+
+    def scale(self, factor, rounding=ROUND_HALF_EVEN):
+        numerator, denominator = Decimal(factor).as_integer_ratio()
+        return Money.from_cents(
+            div_round(self.cents * numerator, denominator, rounding)
+        )
+
+    """Divide by an int or by another amount.
+
+    Dividing by an int splits the amount and rounds to cents. Dividing by Money gives their
+    ratio rounded to places decimal places, like the ROI of an Investment.
+
+    Keyword arguments:
+    divisor -- int or Money.
+    places -- Decimal places of a ratio.
+    rounding -- ROUND_HALF_EVEN or ROUND_HALF_UP.
+    Return: Money when dividing by an int, Decimal when dividing by Money.
+    """
+
+    def divide(self, divisor, places=2, rounding=ROUND_HALF_EVEN):
+        if isinstance(divisor, Money):
+            scale = 10**places
+            ratio = div_round(self.cents * scale, divisor.cents, rounding)
+            return Decimal(ratio).scaleb(-places)
+        if type(divisor) is int:
+            return Money.from_cents(div_round(self.cents, divisor, rounding))
+        raise TypeError(f"cannot divide Money by {type(divisor).__name__}")
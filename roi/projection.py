@@ -0,0 +1,324 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional for the rest of the package
+    np = None
+
+SERIES = (
+    "income",
+    "expense",
+    "debt_service",
+    "cash_flow",
+    "cumulative_cash_flow",
+    "cumulative_roi",
+    "loan_balance",
+)
+
+
+class Assumptions:
+    """Assumptions for projecting Investments month by month.
+
+    Every rate is annual and given as a fraction, e.g. 0.03 for 3%. Except for years, each value
+    can be a single number for every investment or a sequence with one value per investment.
+
+    Keyword arguments:
+    years -- Whole number of years to project, at least 1.
+    rent_growth -- Yearly growth of the incomes, applied at the start of each year.
+    expense_inflation -- Yearly growth of the expenses, applied at the start of each year.
+    vacancy -- Fraction of the income lost to vacancy.
+    loan_rate -- Interest rate of the loan.
+    loan_years -- Term of the loan, it is paid off in equal monthly payments.
+    discount_rate -- Rate the monthly cash flows are discounted at for NPV.
+    Return: None
+    """
+
+    def __init__(
+        self,
+        years=10,
+        rent_growth=0.0,
+        expense_inflation=0.0,
+        vacancy=0.0,
+        loan_rate=0.0,
+        loan_years=30,
+        discount_rate=0.08,
+    ) -> None:
+        self.years = years
+        self.rent_growth = rent_growth
+        self.expense_inflation = expense_inflation
+        self.vacancy = vacancy
+        self.loan_rate = loan_rate
+        self.loan_years = loan_years
+        self.discount_rate = discount_rate
+
+
+class Projection:
+    """Month by month projections of many Investments.
+
+    Series are float arrays in dollars with one row per investment and one column per month,
+    or None when the projection was made with series=False.
+    Summary arrays have one value per investment.
+
+    Keyword arguments:
+    months -- Number of months projected.
+    Return: None
+    """
+
+    def __init__(self, months) -> None:
+        self.months = months
+        for name in SERIES:
+            setattr(self, name, None)
+        self.total_invest = None
+        # summaries, one value per investment
+        self.total_cash_flow = None
+        self.final_roi = None
+        self.payback_months = None
+        self.npv = None
+        self.irr = None
+
+    """Get the summary of a single investment.
+
+    Keyword arguments:
+    row -- Index of the investment.
+    Return: Dict with total_cash_flow, final_roi, payback_months (None if the investment never pays
+    back), npv and irr (None if it has no IRR).
+    """
+
+    def summary(self, row):
+        payback = int(self.payback_months[row])
+        irr = float(self.irr[row])
+        return {
+            "total_cash_flow": float(self.total_cash_flow[row]),
+            "final_roi": float(self.final_roi[row]),
+            "payback_months": payback if payback >= 0 else None,
+            "npv": float(self.npv[row]),
+            "irr": irr if irr == irr else None,
+        }
+
+
+def project(
+    investments, assumptions=None, loan_amounts=None, series=True, chunk_size=10000
+):
+    """Project the monthly cash flows of many Investments at once.
+
+    Income starts at the Investment's total_income less vacancy and grows with rent_growth each year,
+    expenses start at total_expense and grow with expense_inflation, and each loan is paid off in
+    equal monthly payments. The monthly cash flow is income - expenses - debt service.
+
+    Keyword arguments:
+    investments -- List of Investment objects.
+    assumptions -- Assumptions, the defaults if None.
+    loan_amounts -- Sequence of loan principals, one per investment, no loans if None.
+    series -- Keep the month by month series. Without them memory is bounded by chunk_size.
+    chunk_size -- Number of investments projected at a time when series is False.
+    Return: Projection. Raises ValueError if assumptions.years is not a whole number above 0.
+    """
+    _require_numpy()
+    if assumptions is None:
+        assumptions = Assumptions()
+    years = assumptions.years
+    if years < 1 or years != int(years):
+        raise ValueError(f"years must be a whole number of at least 1, not {years!r}")
+    months = int(years) * 12
+    count = len(investments)
+    income = np.array([i.income_cents for i in investments], dtype=float) / 100
+    # expenses only count once the investment has an income, like Investment.total_expense
+    expense = (
+        np.array(
+            [i.expense_cents if i.incomes else 0 for i in investments], dtype=float
+        )
+        / 100
+    )
+    invest = np.array([i.invest_cents for i in investments], dtype=float) / 100
+    if loan_amounts is None:
+        loans = np.zeros(count)
+    else:
+        loans = np.array([float(amount or 0) for amount in loan_amounts], dtype=float)
+
+    projection = Projection(months)
+    projection.total_invest = invest
+    step = max(count, 1) if series else max(chunk_size, 1)
+    parts = []
+    for start in range(0, max(count, 1), step):
+        rows = slice(start, min(start + step, count))
+        parts.append(
+            _project_chunk(
+                income[rows],
+                expense[rows],
+                invest[rows],
+                loans[rows],
+                _per_row(assumptions, rows, count),
+                months,
+                series,
+            )
+        )
+    for name in ("total_cash_flow", "final_roi", "payback_months", "npv", "irr"):
+        setattr(projection, name, np.concatenate([part[name] for part in parts]))
+    if series:
+        for name in SERIES:
+            setattr(projection, name, parts[0][name])
+    return projection
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("roi.projection requires numpy to be installed.")
+
+
+def _per_row(assumptions, rows, count):
+    # every assumption becomes a column vector that broadcasts over the months
+    values = {}
+    for name in (
+        "rent_growth",
+        "expense_inflation",
+        "vacancy",
+        "loan_rate",
+        "loan_years",
+        "discount_rate",
+    ):
+        column = np.broadcast_to(
+            np.asarray(getattr(assumptions, name), dtype=float), (count,)
+        )
+        values[name] = column[rows][:, None]
+    return values
+
+
+def _project_chunk(income, expense, invest, loans, rates, months, series):
+    month = np.arange(months)
+    year = month // 12
+    income = (
+        income[:, None] * (1 + rates["rent_growth"]) ** year * (1 - rates["vacancy"])
+    )
+    expense = expense[:, None] * (1 + rates["expense_inflation"]) ** year
+
+    payment, balance = amortize(
+        loans[:, None], rates["loan_rate"], rates["loan_years"] * 12, month
+    )
+    debt_service = np.where(month < rates["loan_years"] * 12, payment, 0.0)
+    cash_flow = income - expense - debt_service
+    cumulative = np.cumsum(cash_flow, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cumulative_roi = cumulative / invest[:, None]
+
+    paid_back = cumulative >= invest[:, None]
+    payback = np.where(paid_back.any(axis=1), paid_back.argmax(axis=1) + 1, -1)
+
+    flows = np.concatenate([-invest[:, None], cash_flow], axis=1)
+    monthly_discount = (1 + rates["discount_rate"][:, 0]) ** (1 / 12) - 1
+    monthly_irr = irr(flows)
+
+    result = {
+        "total_cash_flow": cumulative[:, -1],
+        "final_roi": cumulative_roi[:, -1],
+        "payback_months": payback,
+        "npv": npv(monthly_discount, flows),
+        "irr": (1 + monthly_irr) ** 12 - 1,
+    }
+    if series:
+        result.update(
+            income=income,
+            expense=np.broadcast_to(expense, income.shape),
+            debt_service=np.broadcast_to(debt_service, income.shape),
+            cash_flow=cash_flow,
+            cumulative_cash_flow=cumulative,
+            cumulative_roi=cumulative_roi,
+            loan_balance=np.broadcast_to(balance, income.shape),
+        )
+    return result
+
+
+def amortize(principal, annual_rate, payments, month):
+    """Monthly payment and remaining balance of fully amortizing loans.
+
+    Keyword arguments:
+    principal -- Array of loan principals.
+    annual_rate -- Array of annual interest rates.
+    payments -- Array of the number of monthly payments.
+    month -- Array of month indexes to give the balance after.
+    Return: Tuple of (payment, balance) arrays broadcast from the arguments.
+    """
+    rate = np.asarray(annual_rate, dtype=float) / 12
+    payments = np.maximum(np.asarray(payments, dtype=float), 1)
+    growth = (1 + rate) ** payments
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = np.where(
+            rate > 0, principal * rate * growth / (growth - 1), principal / payments
+        )
+        paid = np.minimum(month + 1, payments)
+        grown = (1 + rate) ** paid
+        balance = np.where(
+            rate > 0,
+            principal * grown - payment * (grown - 1) / np.where(rate > 0, rate, 1),
+            principal - payment * paid,
+        )
+    return payment, np.maximum(balance, 0.0)
+
+
+def npv(rate, cash_flows):
+    """Net present value of rows of cash flows.
+
+    Keyword arguments:
+    rate -- Discount rate per period, a number or one per row.
+    cash_flows -- 2D array with one row of cash flows per investment, the first at period 0.
+    Return: Array with the NPV of each row.
+    """
+    _require_numpy()
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    periods = np.arange(cash_flows.shape[1])
+    rate = np.asarray(rate, dtype=float).reshape(-1, 1)
+    return (cash_flows / (1 + rate) ** periods).sum(axis=1)
+
+
+def irr(cash_flows, max_iterations=50, tolerance=1e-10):
+    """Internal rate of return of rows of cash flows, solved for every row at once.
+
+    Newton's method runs on all unsolved rows together, and rows it cannot solve fall back to
+    bisection. Only rows with both negative and positive cash flows have an IRR.
+
+    Keyword arguments:
+    cash_flows -- 2D array with one row of cash flows per investment, the first at period 0.
+    max_iterations -- Newton iterations before falling back to bisection.
+    tolerance -- A row is solved once its Newton step is smaller than this.
+    Return: Array with the rate per period of each row, NaN for rows without an IRR.
+    """
+    _require_numpy()
+    cash_flows = np.asarray(cash_flows, dtype=float)
+    periods = np.arange(cash_flows.shape[1])
+    rate = np.full(len(cash_flows), np.nan)
+    has_root = (cash_flows > 0).any(axis=1) & (cash_flows < 0).any(axis=1)
+    active = np.flatnonzero(has_root)
+    guess = np.full(len(active), 0.01)
+
+    with np.errstate(all="ignore"):
+        for _ in range(max_iterations):
+            if not len(active):
+                break
+            flows = cash_flows[active]
+            discount = np.exp(-periods * np.log1p(guess)[:, None])
+            value = (flows * discount).sum(axis=1)
+            slope = -(periods * flows * discount).sum(axis=1) / (1 + guess)
+            new_guess = guess - value / slope
+            valid = np.isfinite(new_guess) & (new_guess > -1)
+            converged = valid & (np.abs(new_guess - guess) < tolerance)
+            rate[active[converged]] = new_guess[converged]
+            # rows that left the valid range are handed to bisection
+            keep = valid & ~converged
+            active, guess = active[keep], new_guess[keep]
+
+        unsolved = has_root & np.isnan(rate)
+        if unsolved.any():
+            rate[unsolved] = _bisect(cash_flows[unsolved])
+    return rate
+
+
+def _bisect(cash_flows, low=-0.5, high=1.0, iterations=80):
+    low = np.full(len(cash_flows), low)
+    high = np.full(len(cash_flows), high)
+    low_value = npv(low, cash_flows)
+    bracketed = np.sign(low_value) != np.sign(npv(high, cash_flows))
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        middle_value = npv(middle, cash_flows)
+        same = np.sign(middle_value) == np.sign(low_value)
+        low = np.where(same, middle, low)
+        low_value = np.where(same, middle_value, low_value)
+        high = np.where(same, high, middle)
+    return np.where(bracketed, (low + high) / 2, np.nan)
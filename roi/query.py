@@ -0,0 +1,363 @@
+import threading
+from bisect import bisect_left, insort
+
+from roi import money
+from roi.money import div_round_half_even, from_cents, roi_hundredths, to_cents
+from roi.roi import InvestmentCollection, User
+
+METRICS = money.METRICS + ("total_invest",)
+
+
+class InvestmentIndex:
+    """Sorted indexes of Investments by every derived metric, kept up to date as they change.
+
+    The index watches Users, InvestmentCollections or a whole UserRegistry. Investments added to
+    or removed from a watched collection are added to or removed from the index, and an edit to
+    an Investment marks it for re-indexing on the next query. Each metric is kept in a sorted list
+    of (value, entry id), so top-K is O(k) and range queries are O(log n + k).
+
+    An Investment held by several watched collections is indexed once, under the username of
+    the first of them that still holds it, and leaves the index when the last one removes it.
+
+    Watched collections report changes under their own locks, from any thread, so the index
+    keeps a lock of its own around every update and query.
+
+    Money metrics are compared in cents and roi in hundredths, the same rounding Investment
+    uses. Investments with a positive cash flow and no total_invest have no ROI and are left out
+    of the roi index.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    def __init__(self) -> None:
+        self._next_id = 0
+        # id(investment) -> entry id
+        self._ids = {}
+        self._investments = {}
+        self._usernames = {}
+        # entry id -> list of id(collection) of the watched collections holding it
+        self._holders = {}
+        # entry id -> metric values in METRICS order
+        self._values = {}
+        self._sorted = {metric: [] for metric in METRICS}
+        self._totals = dict.fromkeys(METRICS, 0)
+        # username -> set of entry ids
+        self._by_user = {}
+        # id(collection) -> (collection, username)
+        self._collections = {}
+        self._dirty = set()
+        # watched collections change under their own locks, which do not cover each other
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, investment) -> bool:
+        return id(investment) in self._ids
+
+    """Build an index over every User of a registry, including Users registered later.
+
+    Keyword arguments:
+    registry -- UserRegistry to index, User.all_users by default.
+    Return: InvestmentIndex.
+    """
+
+    @classmethod
+    def from_registry(cls, registry=None):
+        index = cls()
+        index.watch_registry(User.all_users if registry is None else registry)
+        return index
+
+    def watch_registry(self, registry):
+        registry.add_watcher(self)
+        for user in registry.users():
+            self.watch(user)
+
+    """Index the Investments of a User or InvestmentCollection and follow its changes.
+
+    Keyword arguments:
+    source -- User or InvestmentCollection.
+    username -- Name the Investments are reported under, the User's username by default.
+    Return: None
+    """
+
+    def watch(self, source, username=None):
+        collection = source
+        if not isinstance(source, InvestmentCollection):
+            collection = source.investments
+            username = source.username if username is None else username
+        with collection.lock, self._lock:
+            if id(collection) in self._collections:
+                return
+            self._collections[id(collection)] = (collection, username)
+            collection.add_watcher(self)
+            for investment in collection:
+                self._add(investment, id(collection))
+
+    """Stop following a User or InvestmentCollection and drop its Investments from the index.
+
+    Keyword arguments:
+    source -- User or InvestmentCollection.
+    Return: None
+    """
+
+    def unwatch(self, source):
+        collection = source
+        if not isinstance(source, InvestmentCollection):
+            collection = source.investments
+        with collection.lock, self._lock:
+            if self._collections.pop(id(collection), None) is None:
+                return
+            collection.remove_watcher(self)
+            for investment in collection:
+                self._discard(investment, id(collection))
+
+    """Get the Investments with the highest value of a metric.
+
+    Keyword arguments:
+    metric -- One of METRICS.
+    k -- Number of Investments to return.
+    Return: List of up to k Investments, highest first.
+    """
+
+    def top(self, metric, k=10):
+        with self._lock:
+            entries = self._entries(metric)
+            return [
+                self._investments[entry]
+                for _, entry in reversed(entries[max(len(entries) - k, 0) :])
+            ]
+
+    """Get the Investments with the lowest value of a metric.
+
+    Keyword arguments:
+    metric -- One of METRICS.
+    k -- Number of Investments to return.
+    Return: List of up to k Investments, lowest first.
+    """
+
+    def bottom(self, metric, k=10):
+        with self._lock:
+            entries = self._entries(metric)
+            return [self._investments[entry] for _, entry in entries[: max(k, 0)]]
+
+    """Get the Investments with a metric between two bounds.
+
+    For example range("roi", "0.05", "0.12"), or range("cash_flow", high=0, inclusive=False)
+    for the Investments with a negative cash flow.
+
+    Keyword arguments:
+    metric -- One of METRICS.
+    low -- Lowest value as a dollar amount or ROI, unbounded if None.
+    high -- Highest value as a dollar amount or ROI, unbounded if None.
+    inclusive -- Whether values equal to low or high match.
+    Return: List of Investments in ascending order of the metric.
+    """
+
+    def range(self, metric, low=None, high=None, inclusive=True):
+        with self._lock:
+            entries = self._entries(metric)
+            start, stop = self._bounds(entries, low, high, inclusive)
+            return [self._investments[entry] for _, entry in entries[start:stop]]
+
+    """Count the Investments with a metric between two bounds, without building a list.
+
+    Keyword arguments:
+    metric -- One of METRICS.
+    low -- Lowest value as a dollar amount or ROI, unbounded if None.
+    high -- Highest value as a dollar amount or ROI, unbounded if None.
+    inclusive -- Whether values equal to low or high match.
+    Return: int number of Investments.
+    """
+
+    def count(self, metric, low=None, high=None, inclusive=True):
+        with self._lock:
+            start, stop = self._bounds(self._entries(metric), low, high, inclusive)
+        return max(stop - start, 0)
+
+    """Aggregate a metric across every indexed Investment, or the Investments of one user.
+
+    Keyword arguments:
+    metric -- One of METRICS.
+    username -- Only aggregate this user's Investments, every user if None.
+    Return: Dict of count, total, mean, min and max as Decimals, None when there are none.
+    """
+
+    def summary(self, metric, username=None):
+        with self._lock:
+            return self._summary(metric, username)
+
+    def _summary(self, metric, username):
+        entries = self._entries(metric)
+        position = METRICS.index(metric)
+        if username is None:
+            count = len(entries)
+            total = self._totals[metric]
+            low = entries[0][0] if entries else None
+            high = entries[-1][0] if entries else None
+        else:
+            values = [
+                self._values[entry][position]
+                for entry in self._by_user.get(username.lower(), ())
+            ]
+            values = [value for value in values if value is not None]
+            count = len(values)
+            total = sum(values)
+            low = min(values, default=None)
+            high = max(values, default=None)
+        if not count:
+            return {"count": 0, "total": None, "mean": None, "min": None, "max": None}
+        return {
+            "count": count,
+            "total": from_cents(total),
+            "mean": from_cents(div_round_half_even(total, count)),
+            "min": from_cents(low),
+            "max": from_cents(high),
+        }
+
+    """Aggregate a metric for every user.
+
+    Keyword arguments:
+    metric -- One of METRICS.
+    Return: Dict of username to the summary of that user's Investments.
+    """
+
+    def by_user(self, metric):
+        with self._lock:
+            return {
+                username: self._summary(metric, username)
+                for username in self._by_user
+                if username is not None
+            }
+
+    def user_of(self, investment):
+        with self._lock:
+            entry = self._ids.get(id(investment))
+            return self._usernames.get(entry)
+
+    def _entries(self, metric):
+        # called with the lock held
+        if metric not in self._sorted:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+        if self._dirty:
+            self._reindex()
+        return self._sorted[metric]
+
+    def _bounds(self, entries, low, high, inclusive):
+        # values are ints, so exclusive bounds are inclusive bounds one unit further in
+        start = 0
+        stop = len(entries)
+        if low is not None:
+            low = to_cents(low) + (0 if inclusive else 1)
+            start = bisect_left(entries, (low,))
+        if high is not None:
+            high = to_cents(high) + (1 if inclusive else 0)
+            stop = bisect_left(entries, (high,))
+        return start, stop
+
+    def _add(self, investment, holder):
+        entry = self._ids.get(id(investment))
+        if entry is not None:
+            self._holders[entry].append(holder)
+            return
+        entry = self._next_id
+        self._next_id += 1
+        self._ids[id(investment)] = entry
+        self._investments[entry] = investment
+        self._holders[entry] = [holder]
+        self._set_user(entry, self._collections[holder][1])
+        self._insert(entry, _metric_values(investment))
+
+    def _discard(self, investment, holder):
+        entry = self._ids.get(id(investment))
+        if entry is None:
+            return
+        holders = self._holders[entry]
+        holders.remove(holder)
+        self._unset_user(entry)
+        if holders:
+            # still held by another watched collection, now reported under its username
+            self._set_user(entry, self._collections[holders[0]][1])
+            return
+        del self._ids[id(investment)]
+        del self._holders[entry]
+        self._remove(entry)
+        self._dirty.discard(entry)
+        del self._investments[entry]
+
+    def _set_user(self, entry, username):
+        key = username.lower() if username is not None else None
+        self._usernames[entry] = key
+        self._by_user.setdefault(key, set()).add(entry)
+
+    def _unset_user(self, entry):
+        key = self._usernames.pop(entry)
+        owned = self._by_user[key]
+        owned.discard(entry)
+        if not owned:
+            del self._by_user[key]
+
+    def _insert(self, entry, values):
+        self._values[entry] = values
+        for metric, value in zip(METRICS, values):
+            if value is not None:
+                insort(self._sorted[metric], (value, entry))
+                self._totals[metric] += value
+
+    def _remove(self, entry):
+        values = self._values.pop(entry)
+        for metric, value in zip(METRICS, values):
+            if value is not None:
+                entries = self._sorted[metric]
+                del entries[bisect_left(entries, (value, entry))]
+                self._totals[metric] -= value
+
+    def _reindex(self):
+        for entry in self._dirty:
+            values = _metric_values(self._investments[entry])
+            if values != self._values[entry]:
+                self._remove(entry)
+                self._insert(entry, values)
+        self._dirty.clear()
+
+    # watcher callbacks from UserRegistry and InvestmentCollection
+
+    def _user_added(self, user):
+        self.watch(user)
+
+    def _user_removed(self, user):
+        self.unwatch(user)
+
+    def _investment_added(self, collection, investment):
+        with self._lock:
+            self._add(investment, id(collection))
+
+    def _investment_removed(self, collection, investment, investment_id):
+        with self._lock:
+            self._discard(investment, id(collection))
+
+    def _investment_changed(self, collection, investment):
+        # edits are batched until the next query, so a burst of edits re-indexes once
+        with self._lock:
+            entry = self._ids.get(id(investment))
+            if entry is not None:
+                self._dirty.add(entry)
+
+
+def _metric_values(investment):
+    income = investment.income_cents
+    invest = investment.invest_cents
+    if investment.incomes:
+        expense = investment.expense_cents
+        cash_flow = income - expense
+    else:
+        expense = 0
+        cash_flow = 0
+    annual_cash_flow = cash_flow * 12
+    try:
+        roi = roi_hundredths(annual_cash_flow, invest)
+    except ZeroDivisionError:
+        roi = None
+    return (income, expense, cash_flow, annual_cash_flow, roi, invest)
@@ -0,0 +1,274 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from roi.money import format_cents, roi_hundredths
+
+FIELDS = (
+    "user",
+    "investment",
+    "total_invest",
+    "total_income",
+    "total_expense",
+    "cash_flow",
+    "annual_cash_flow",
+    "roi",
+)
+
+# column widths of the fixed-width format, names are cut to fit and amounts that do not fit
+# are filled with OVERFLOW
+WIDTHS = (16, 24, 16, 14, 14, 14, 16, 10)
+OVERFLOW = "#"
+
+
+def report_rows(users):
+    """Walk Users and their Investments and yield one report row per Investment.
+
+    Keyword arguments:
+    users -- Iterable of User objects.
+    Return: Generator of tuples of strings in FIELDS order. roi is empty for an Investment with
+    a positive cash flow and no total_invest.
+    """
+    for user in users:
+        username = user.username
+        # a snapshot, so other threads can change the user while the report is written
+        for investment in user.investments.snapshot():
+            yield _row(username, investment)
+
+
+def _row(username, investment):
+    income = investment.income_cents
+    invest = investment.invest_cents
+    # expenses and cash flow only count once the investment has an income
+    if investment.incomes:
+        expense = investment.expense_cents
+        cash_flow = income - expense
+    else:
+        expense = cash_flow = 0
+    try:
+        roi = format_cents(roi_hundredths(cash_flow * 12, invest))
+    except ZeroDivisionError:
+        roi = ""
+    return (
+        username,
+        investment.name,
+        format_cents(invest),
+        format_cents(income),
+        format_cents(expense),
+        format_cents(cash_flow),
+        format_cents(cash_flow * 12),
+        roi,
+    )
+
+
+def _chunks(rows, chunk_size):
+    rows = iter(rows)
+    chunk = list(islice(rows, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, chunk_size))
+
+
+def write_csv(rows, file, chunk_size=1000, header=True):
+    writer = csv.writer(file)
+    if header:
+        writer.writerow(FIELDS)
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(chunk)
+
+
+def write_jsonl(rows, file, chunk_size=1000, header=True):
+    dumps = json.dumps
+    for chunk in _chunks(rows, chunk_size):
+        file.write(
+            "".join(
+                dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n"
+                for row in chunk
+            )
+        )
+
+
+def write_fixed_width(rows, file, chunk_size=1000, header=True):
+    text_columns = len(FIELDS) - 6
+    if header:
+        file.write(_fixed_line(FIELDS, text_columns))
+        file.write(" ".join("-" * width for width in WIDTHS) + "\n")
+    for chunk in _chunks(rows, chunk_size):
+        file.write("".join(_fixed_line(row, text_columns) for row in chunk))
+
+
+def _fixed_line(row, text_columns):
+    # names are left aligned and amounts right aligned
+    cells = [
+        value[:width].ljust(width) if column < text_columns else _amount(value, width)
+        for column, (value, width) in enumerate(zip(row, WIDTHS))
+    ]
+    return " ".join(cells) + "\n"
+
+
+def _amount(value, width):
+    # an amount cut short would read as a different amount
+    if len(value) > width:
+        return OVERFLOW * width
+    return value.rjust(width)
+
+
+FORMATS = {"csv": write_csv, "jsonl": write_jsonl, "text": write_fixed_width}
+EXTENSIONS = {"csv": ".csv", "jsonl": ".jsonl", "text": ".txt"}
+
+
+def write_report(users, path, format="csv", chunk_size=1000):
+    """Stream a statement of every Investment of every User to a file.
+
+    Rows are generated as the Users are walked and written in chunks, so memory use does not
+    grow with the size of the portfolio.
+
+    Keyword arguments:
+    users -- Iterable of User objects.
+    path -- File to write, or "-" for stdout.
+    format -- "csv", "jsonl" or "text" for fixed-width columns.
+    chunk_size -- Number of rows formatted and written at a time.
+    Return: int number of rows written.
+    """
+    writer = _writer(format)
+    counted = _Counter(report_rows(users))
+    if path == "-":
+        writer(counted, sys.stdout, chunk_size)
+    else:
+        with open(path, "w", newline="", encoding="utf-8", buffering=1 << 20) as file:
+            writer(counted, file, chunk_size)
+    return counted.count
+
+
+def write_user_reports(users, directory, format="csv", workers=None, chunk_size=1000):
+    """Write one statement per User, fanned out across a thread pool.
+
+    Keyword arguments:
+    users -- Iterable of User objects.
+    directory -- Directory the reports are written to, named after the usernames. A username
+    that is not a safe file name gets a hash of it appended, and a name already used in this
+    call gets a number, so no two Users share a report.
+    format -- "csv", "jsonl" or "text" for fixed-width columns.
+    workers -- Number of threads, 0 writes in this thread. Defaults to os.cpu_count() + 4.
+    chunk_size -- Number of rows formatted and written at a time.
+    Return: List of (User, path of the User's report) pairs in the order of users, so Users of
+    the same name from different registries are all listed.
+    """
+    _writer(format)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    # lowercase file names given out, for file systems that ignore case
+    taken = set()
+
+    def path_of(user):
+        name = _file_name(user.username)
+        unique = name
+        number = 1
+        while unique.lower() in taken:
+            number += 1
+            unique = f"{name}-{number}"
+        taken.add(unique.lower())
+        return os.path.join(directory, unique + EXTENSIONS[format])
+
+    def write(user, path):
+        write_report([user], path, format, chunk_size)
+        return user, path
+
+    if workers == 0:
+        for user in users:
+            paths.append(write(user, path_of(user)))
+        return paths
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) + 4
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # only a few users are in flight, so memory stays bounded for generators
+        pending = deque()
+        for user in users:
+            # lazy investments are loaded here, storage connections belong to this thread
+            user.investments
+            pending.append(executor.submit(write, user, path_of(user)))
+            if len(pending) >= workers * 2:
+                paths.append(pending.popleft().result())
+        while pending:
+            paths.append(pending.popleft().result())
+    return paths
+
+
+def _writer(format):
+    writer = FORMATS.get(format)
+    if writer is None:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    return writer
+
+
+def _file_name(username):
+    # usernames are free text, keep them from escaping the directory, and keep the names of
+    # usernames that only differ in the replaced characters apart
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in username)
+    safe = safe.lstrip(".") or "_"
+    if safe != username:
+        digest = hashlib.blake2b(username.encode(), digest_size=4).hexdigest()
+        safe = f"{safe}-{digest}"
+    return safe
+
+
+class _Counter:
+    def __init__(self, rows) -> None:
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write portfolio statements for every user in a database or import file."
+    )
+    parser.add_argument("path", help="SQLite database, CSV or JSONL file")
+    parser.add_argument("--format", choices=tuple(FORMATS), default="csv")
+    parser.add_argument("--output", default="-", help="report file, stdout by default")
+    parser.add_argument(
+        "--per-user", metavar="DIRECTORY", help="write one report per user instead"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    registry = _load_registry(args.path)
+    started = time.perf_counter()
+    if args.per_user:
+        paths = write_user_reports(
+            registry.snapshot().values(), args.per_user, args.format, args.workers
+        )
+        summary = f"Wrote {len(paths)} user reports"
+    else:
+        rows = write_report(registry.snapshot().values(), args.output, args.format)
+        summary = f"Wrote {rows} rows"
+    print(f"{summary} in {time.perf_counter() - started:.3f} seconds.", file=sys.stderr)
+    return 0
+
+
+def _load_registry(path):
+    if str(path).lower().endswith((".db", ".sqlite", ".sqlite3")):
+        from roi.storage import SQLiteStorage
+
+        # investments are loaded user by user as the report reaches them
+        storage = SQLiteStorage(path)
+        return storage.load_users(lazy=True)
+    from roi.importer import import_file
+
+    return import_file(path).registry
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,15 @@
+import hashlib
+import threading
+import weakref
+from array import array
 from decimal import Decimal
+from types import MappingProxyType
+
+from roi.money import Money, from_cents, roi_hundredths, to_cents
 
 
 class UserAlreadyExistsError(Exception):
-    """Custom exception for when a username is already contained in the User.usernames class attribute list.
+    """Custom exception for when a username is already contained in a UserRegistry.
 
     Raises:
         UserAlreadyExistsError: username is already in User.usernames"""
@@ -12,70 +19,469 @@ class UserAlreadyExistsError(Exception):
         self.message = "That username already exists."
 
 
+class UserRegistry:
+    """A registry of Users indexed by their lowercase username.
+
+    Lookups are case-insensitive, and every registry is independent, so several can exist in one process.
+
+    Registering and unregistering are atomic, and get_or_create creates a User only if the
+    username is free, so threads can share a registry. Threads that iterate it should read a
+    snapshot, which never changes and does not hold up writers.
+
+    portfolio is a roi.rollup.PortfolioRollup of the investments of every registered User.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    def __init__(self) -> None:
+        self._users = {}
+        # live view of every registered username, in lowercase
+        self.usernames = self._users.keys()
+        self._watchers = None
+        self._lock = threading.RLock()
+        # read-only copy of _users, dropped whenever a User is registered or unregistered
+        self._snapshot = None
+        self._portfolio = None
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def __contains__(self, username) -> bool:
+        return isinstance(username, str) and username.lower() in self._users
+
+    def __getitem__(self, username):
+        return self._users[username.lower()]
+
+    """Add a User to the registry.
+
+    Keyword arguments:
+    user -- A User object.
+    Return: None. Raises UserAlreadyExistsError if the username is taken.
+    """
+
+    def register(self, user):
+        key = user.username.lower()
+        with self._lock:
+            if key in self._users:
+                raise UserAlreadyExistsError(user.username)
+            self._users[key] = user
+            self._snapshot = None
+            if self._watchers:
+                _notify_watchers(self, "_user_added", user)
+
+    """Remove a User from the registry.
+
+    Keyword arguments:
+    username -- Username of the User, in any case.
+    Return: The removed User, or None if there is no User by that name.
+    """
+
+    def unregister(self, username):
+        with self._lock:
+            user = self._users.pop(username.lower(), None)
+            if user is not None:
+                self._snapshot = None
+                if self._watchers:
+                    _notify_watchers(self, "_user_removed", user)
+        return user
+
+    """Get a User by username, creating it if there is none, as a single atomic step.
+
+    Keyword arguments:
+    username -- Username of the User, in any case.
+    Return: Tuple of the User and whether it was created.
+    """
+
+    def get_or_create(self, username):
+        user = self._users.get(username.lower())
+        if user is not None:
+            return user, False
+        with self._lock:
+            user = self._users.get(username.lower())
+            if user is not None:
+                return user, False
+            return User(username, registry=self), True
+
+    """Get a User by username.
+
+    Keyword arguments:
+    username -- Username of the User, in any case.
+    default -- Returned when there is no User by that name.
+    Return: User object if it exists, otherwise default.
+    """
+
+    def get(self, username, default=None):
+        return self._users.get(username.lower(), default)
+
+    def users(self):
+        return self._users.values()
+
+    """Get a read-only snapshot of the registered Users.
+
+    The snapshot is copied once after a change and shared by every reader until the next one,
+    so reading it takes no lock and later registrations do not change it.
+
+    Keyword arguments:
+    None
+    Return: Read-only mapping of lowercase username to User.
+    """
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._snapshot = MappingProxyType(dict(self._users))
+        return snapshot
+
+    # running totals of every User's investments, started the first time they are read
+    @property
+    def portfolio(self):
+        if self._portfolio is None:
+            from roi.rollup import PortfolioRollup
+
+            with self._lock:
+                if self._portfolio is None:
+                    portfolio = PortfolioRollup()
+                    portfolio.watch_registry(self)
+                    self._portfolio = portfolio
+        return self._portfolio
+
+    """Watch the registry for Users being added and removed.
+
+    Keyword arguments:
+    watcher -- Object with _user_added(user) and _user_removed(user) methods, held weakly.
+    Return: None
+    """
+
+    def add_watcher(self, watcher):
+        _add_watcher(self, watcher)
+
+    def remove_watcher(self, watcher):
+        _remove_watcher(self, watcher)
+
+
+class InvestmentCollection:
+    """An ordered collection of Investments indexed by id and by name.
+
+    Every Investment gets a stable id when it is added, and ids are never reused. Storage,
+    snapshots and journals save the ids and the next id, so they survive a reload. Adding,
+    removing and looking up by id or by name are all O(1), and iteration follows insertion order.
+
+    Adding and removing hold the collection's lock, and snapshot gives threads an immutable
+    tuple of the Investments to iterate while others change the collection.
+
+    Keyword arguments:
+    investments -- Iterable of Investment objects to start with, or of (id, Investment) pairs
+    to restore saved ids.
+    lock -- threading.RLock guarding the collection, a new one by default.
+    next_id -- Id of the next Investment added, raised past the ids of investments.
+    Return: None
+    """
+
+    def __init__(self, investments=None, lock=None, next_id=0) -> None:
+        self.lock = lock if lock is not None else threading.RLock()
+        self._snapshot = None
+        self._next_id = next_id
+        self._by_id = {}
+        # id(investment) -> collection id
+        self._ids = {}
+        # lowercase name -> {collection id: investment}
+        self._by_name = {}
+        self._watchers = None
+        if investments is not None:
+            for investment in investments:
+                if type(investment) is tuple:
+                    self.add(investment[1], investment[0])
+                else:
+                    self.add(investment)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __contains__(self, investment) -> bool:
+        return id(investment) in self._ids
+
+    """Add an Investment to the collection.
+
+    Keyword arguments:
+    investment -- An Investment object.
+    investment_id -- Saved id to give the Investment, the next id if None.
+    Return: int id of the Investment in this collection.
+    Raises ValueError if investment_id belongs to another Investment.
+    """
+
+    def add(self, investment, investment_id=None):
+        with self.lock:
+            if id(investment) in self._ids:
+                return self._ids[id(investment)]
+            if investment_id is None:
+                investment_id = self._next_id
+            elif investment_id in self._by_id:
+                raise ValueError(f"investment id {investment_id} is already taken")
+            self._next_id = max(self._next_id, investment_id + 1)
+            self._by_id[investment_id] = investment
+            self._ids[id(investment)] = investment_id
+            self._by_name.setdefault(_name_key(investment.name), {})[
+                investment_id
+            ] = investment
+            self._snapshot = None
+            _add_owner(investment, weakref.ref(self))
+            if self._watchers:
+                _notify_watchers(self, "_investment_added", self, investment)
+            return investment_id
+
+    """Remove an Investment from the collection.
+
+    Keyword arguments:
+    investment -- The Investment object to remove.
+    Return: The removed Investment, or None if it is not in the collection.
+    """
+
+    def remove(self, investment):
+        with self.lock:
+            investment_id = self._ids.pop(id(investment), None)
+            if investment_id is None:
+                return None
+            del self._by_id[investment_id]
+            self._unindex_name(investment.name, investment_id)
+            self._snapshot = None
+            _remove_owner(investment, self)
+            if self._watchers:
+                _notify_watchers(
+                    self, "_investment_removed", self, investment, investment_id
+                )
+            return investment
+
+    """Get an Investment by name.
+
+    Keyword arguments:
+    name -- Name of the Investment, in any case.
+    Return: The first Investment added with that name, or None.
+    """
+
+    def get(self, name):
+        named = self._by_name.get(_name_key(name))
+        if named:
+            return next(iter(named.values()))
+        return None
+
+    def get_by_id(self, investment_id):
+        return self._by_id.get(investment_id)
+
+    """Get an immutable snapshot of the Investments.
+
+    Keyword arguments:
+    None
+    Return: Tuple of the Investments in insertion order, shared until the collection changes.
+    """
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self.lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._snapshot = tuple(self._by_id.values())
+        return snapshot
+
+    def id_of(self, investment):
+        return self._ids.get(id(investment))
+
+    @property
+    def next_id(self):
+        return self._next_id
+
+    """Watch the collection for Investments being added, removed or changed.
+
+    Keyword arguments:
+    watcher -- Object with _investment_added(collection, investment),
+    _investment_removed(collection, investment, investment_id) and
+    _investment_changed(collection, investment) methods, held weakly.
+    Return: None
+    """
+
+    def add_watcher(self, watcher):
+        _add_watcher(self, watcher)
+
+    def remove_watcher(self, watcher):
+        _remove_watcher(self, watcher)
+
+    def _investment_changed(self, investment):
+        if self._watchers:
+            _notify_watchers(self, "_investment_changed", self, investment)
+
+    def _renamed(self, investment, old_name):
+        with self.lock:
+            investment_id = self._ids[id(investment)]
+            self._unindex_name(old_name, investment_id)
+            self._by_name.setdefault(_name_key(investment.name), {})[
+                investment_id
+            ] = investment
+        self._investment_changed(investment)
+
+    def _unindex_name(self, name, investment_id):
+        key = _name_key(name)
+        named = self._by_name[key]
+        del named[investment_id]
+        if not named:
+            del self._by_name[key]
+
+
+def _add_watcher(subject, watcher):
+    if subject._watchers is None:
+        subject._watchers = []
+    subject._watchers.append(weakref.ref(watcher))
+
+
+def _remove_watcher(subject, watcher):
+    if subject._watchers:
+        subject._watchers = [
+            ref for ref in subject._watchers if ref() not in (None, watcher)
+        ]
+
+
+def _notify_watchers(subject, method, *args):
+    for ref in list(subject._watchers):
+        watcher = ref()
+        if watcher is None:
+            subject._watchers.remove(ref)
+        else:
+            getattr(watcher, method)(*args)
+
+
+def _name_key(name):
+    return name.lower()
+
+
 class User:
-    """Create a User with a unique username and a list of their investments.
+    """Create a User with a unique username and a collection of their investments.
 
     Keyword arguments:
     username -- a unique username
     investments -- a list of Investments objects
+    registry -- the UserRegistry to add the User to, User.all_users by default
+    investment_loader -- callable returning the User's investments, called on first access instead of using investments
+    next_investment_id -- id of the next Investment added, for Users whose investments are (id, Investment) pairs
     Return: None
+
+    Each User has its own lock, shared with its InvestmentCollection. Adding and removing
+    investments hold it, and threads editing a User's investments in several steps can hold
+    it too: with user.lock: ...
+
+    portfolio is a roi.rollup.PortfolioRollup of the User's investments, kept current as
+    they change, so portfolio totals and the capital weighted ROI are read without a loop.
     """
 
-    """class attribute list for all usernames"""
+    """class attribute registry of all users and a live view of their usernames"""
 
-    usernames = []
-    all_users = {}
+    all_users = UserRegistry()
+    usernames = all_users.usernames
 
-    def __init__(self, username, investments=None):
+    def __init__(
+        self,
+        username,
+        investments=None,
+        registry=None,
+        investment_loader=None,
+        next_investment_id=0,
+    ):
+        if registry is None:
+            registry = User.all_users
+        self.lock = threading.RLock()
+        if investment_loader is None:
+            self._investments = InvestmentCollection(
+                investments, self.lock, next_investment_id
+            )
+        else:
+            self._investments = None
+        self._investment_loader = investment_loader
+        self._next_investment_id = next_investment_id
+        self._portfolio = None
+        self.username = username.lower()
         try:
-            if username.lower() not in self.usernames:
-                # self.usernames.append(username.lower())
-                self.username = username.lower()
-            else:
-                raise UserAlreadyExistsError(username)
-        except Exception as e:
+            registry.register(self)
+        except UserAlreadyExistsError as e:
             print(e)
 
-        if investments is None:
-            self.investments = []
-        else:
-            self.investments = investments
-
-        # add the object to a dict of all objects with the username as the key
-        User.all_users[username] = self
-
     def __str__(self) -> str:
         return self.username
 
-    """Adds an Investment object to the users list of investments.
+    # investments are hydrated from the loader the first time they are used
+    @property
+    def investments(self):
+        if self._investments is None:
+            with self.lock:
+                if self._investments is None:
+                    self._investments = InvestmentCollection(
+                        self._investment_loader(), self.lock, self._next_investment_id
+                    )
+                    self._investment_loader = None
+        return self._investments
+
+    # running totals of the User's investments, started the first time they are read
+    @property
+    def portfolio(self):
+        if self._portfolio is None:
+            from roi.rollup import PortfolioRollup
+
+            with self.lock:
+                if self._portfolio is None:
+                    self._portfolio = PortfolioRollup(self)
+        return self._portfolio
+
+    """Check if the User's investments have been loaded.
+
+    Keyword arguments:
+    None
+    Return: False until a lazily loaded User's investments are first accessed, otherwise True.
+    """
+
+    def investments_loaded(self):
+        return self._investments is not None
+
+    """Adds an Investment object to the users collection of investments.
 
     Keyword arguments:
     investment -- An Investment object
-    Return: None
+    Return: int id of the Investment in the User's collection.
     """
 
     def add_investment(self, investment):
-        self.investments.append(investment)
+        return self.investments.add(investment)
 
     """Delete an Investment of the user.
 
     Keyword arguments:
-    investment -- An Investment of the user to delete.
-    Return: None
+    investment -- An Investment of the user to delete, or its name.
+    Return: The removed Investment, or None if the user does not have it.
     """
 
     def remove_investment(self, investment):
-        if investment in self.investments:
-            self.investments.remove(investment)
+        with self.lock:
+            if isinstance(investment, str):
+                investment = self.investments.get(investment)
+            return self.investments.remove(investment)
 
     """Get and return a User's Investment object
 
     Keyword arguments:
-    investment -- A User's Investment object.
+    investment -- A User's Investment object, or its name.
     Return: Investment object if it exists, otherwise returns None.
     """
 
     def get_investment(self, investment):
+        if isinstance(investment, str):
+            return self.investments.get(investment)
         if investment in self.investments:
             return investment
         else:
@@ -92,36 +498,109 @@ class User:
         return self.username
 
 
-class Income:
-    """Income represents a single stream or source of income that comes from an investment."""
+class LineItem:
+    """Base for Income and Expense, a named monthly amount stored as integer cents.
 
-    """Creates an Income object used in an Investment.
+    Uses __slots__ so each item only holds its name, its cents and its owners.
 
     Keyword arguments:
-    name -- String name of the stream of income.
-    amount -- String dollar amount of the income.
+    name -- String name of the line item.
+    amount -- String dollar amount of the line item.
     Return: None
     """
 
+    __slots__ = ("name", "_cents", "_owners")
+
     def __init__(self, name: str, amount: str) -> None:
         self.name = name
-        self.amount = Decimal(amount).quantize(Decimal("1.00"))
+        self._cents = to_cents(amount)
+        # Investments holding this item, notified when the amount changes
+        self._owners = None
+
+    """Create a line item straight from integer cents, skipping the Decimal parsing.
+
+    Keyword arguments:
+    name -- String name of the line item.
+    cents -- int amount in cents.
+    Return: A new line item of the class it is called on.
+    """
+
+    @classmethod
+    def from_cents(cls, name: str, cents: int):
+        item = cls.__new__(cls)
+        item.name = name
+        item._cents = cents
+        item._owners = None
+        return item
+
+    @property
+    def amount(self):
+        return from_cents(self._cents)
+
+    @amount.setter
+    def amount(self, amount):
+        self.set_amount(amount)
+
+    @property
+    def cents(self):
+        return self._cents
+
+    @property
+    def money(self):
+        return Money.from_cents(self._cents)
 
     def get_name(self):
         return self.name
 
     # returns Decimal object
     def get_amount(self):
-        return self.amount
+        return from_cents(self._cents)
+
+    """Make the line item immutable so many Investments can share it.
+
+    A shared item keeps no owners. Its set_name and set_amount raise TypeError, and
+    Investment.update_income and update_expense give the Investment a private copy instead.
+
+    Keyword arguments:
+    None
+    Return: The line item itself.
+    """
+
+    def freeze(self):
+        self._owners = _SHARED
+        return self
+
+    def is_shared(self):
+        return self._owners is _SHARED
 
     def set_name(self, name: str):
+        if self._owners is _SHARED:
+            raise TypeError(_SHARED_MESSAGE)
         self.name = name
 
     def set_amount(self, amount: str):
-        self.amount = Decimal(amount).quantize(Decimal("1.00"))
+        if self._owners is _SHARED:
+            raise TypeError(_SHARED_MESSAGE)
+        old_cents = self._cents
+        self._cents = to_cents(amount)
+        _notify_owners(self, self._cents - old_cents)
+
+
+class Income(LineItem):
+    """Income represents a single stream or source of income that comes from an investment."""
 
+    """Creates an Income object used in an Investment.
 
-class Expense:
+    Keyword arguments:
+    name -- String name of the stream of income.
+    amount -- String dollar amount of the income.
+    Return: None
+    """
+
+    __slots__ = ()
+
+
+class Expense(LineItem):
     """Expense represents a single expense for an investment.
 
     Keyword arguments:
@@ -130,27 +609,60 @@ class Expense:
     Return: None
     """
 
-    def __init__(self, name: str, amount: str) -> None:
-        self.name = name
-        self.amount = Decimal(amount).quantize(Decimal("1.00"))
+    __slots__ = ()
 
-    def get_name(self):
-        return self.name
 
-    # returns a Decimal object
-    def get_amount(self):
-        return self.amount
+# owners of frozen line items, which never change and so have no one to notify
+_SHARED = ()
+_SHARED_MESSAGE = (
+    "shared line items cannot change, update them through their Investment"
+)
 
-    def set_name(self, name: str):
-        self.name = name
 
-    def set_amount(self, amount: str):
-        self.amount = Decimal(amount).quantize(Decimal("1.00"))
+# owners are held through weak references, so a shared item does not keep every
+# Investment or collection that ever held it alive
+def _add_owner(item, owner_ref):
+    owners = item._owners
+    if owners is None:
+        item._owners = [owner_ref]
+        return
+    if owners is _SHARED:
+        return
+    count = len(owners)
+    if count >= 4 and not count & (count - 1):
+        # drop collected owners whenever the list doubles, amortized O(1) per add
+        owners[:] = [ref for ref in owners if ref() is not None]
+    owners.append(owner_ref)
+
+
+def _remove_owner(item, owner):
+    owners = item._owners
+    if owners:
+        for index, ref in enumerate(owners):
+            if ref() is owner:
+                del owners[index]
+                return
+
+
+def _live_owners(item):
+    if not item._owners:
+        return []
+    owners = [ref() for ref in item._owners]
+    return [owner for owner in owners if owner is not None]
+
+
+def _notify_owners(item, delta):
+    if item._owners and delta:
+        for investment in _live_owners(item):
+            investment._line_item_changed(item, delta)
 
 
 class Investment:
     """An Investment or property and it's attributes including Incomes and Expenses along with other calculations.
 
+    Totals are kept as running sums in cents that are adjusted on every edit, and ROI is
+    only derived when it is read.
+
     Keyword arguments:
     name -- Name of the investment or property.
     incomes -- List of the Incomes that come from the investment.
@@ -163,48 +675,113 @@ class Investment:
         self, name: str, incomes=None, expenses=None, total_invest="0"
     ) -> None:
         self.name = name
-        # check the contents of the lists passed in
-        if incomes is None:
-            self.incomes = []
-        else:
-            self.incomes = incomes
-        if expenses is None:
-            self.expenses = []
-        else:
-            self.expenses = expenses
+        # InvestmentCollections holding this investment, notified on rename
+        self._owners = None
+        self.incomes = []
+        self.expenses = []
+        self._income_cents = 0
+        self._expense_cents = 0
         # round based on value of total_invest to two decimal places.
-        self.total_invest = Decimal(total_invest).quantize(Decimal("1.00"))
+        self._invest_cents = to_cents(total_invest)
+        self._roi = None
+        self._content_key = None
 
-        # get total incomes and expenses
-        income_count = Decimal("0")
-        if len(self.incomes) > 0:
-            for income in incomes:
-                income_count += income.amount
-        self.total_income = income_count.quantize(Decimal("1.00"))
+        if incomes is not None:
+            self.set_incomes(incomes)
+        if expenses is not None:
+            self.set_expenses(expenses)
+
+    @property
+    def total_invest(self):
+        return from_cents(self._invest_cents)
+
+    @property
+    def invest_cents(self):
+        return self._invest_cents
 
-        expense_count = Decimal("0")
+    @property
+    def income_cents(self):
+        return self._income_cents
+
+    @property
+    def expense_cents(self):
+        return self._expense_cents
+
+    @property
+    def total_income(self):
+        return from_cents(self._income_cents)
+
+    # expenses only count once the investment has an income
+    @property
+    def total_expense(self):
         if len(self.incomes) > 0:
-            for expense in expenses:
-                expense_count += expense.amount
-        self.total_expense = expense_count
+            return from_cents(self._expense_cents)
+        return Decimal("0")
+
+    @property
+    def cash_flow(self):
+        return from_cents(self._cash_flow_cents())
+
+    @property
+    def annual_cash_flow(self):
+        return from_cents(self._cash_flow_cents() * 12)
+
+    # ROI is derived lazily and cached until an input changes
+    @property
+    def roi(self):
+        if self._roi is None:
+            annual_cash_flow = self._cash_flow_cents() * 12
+            if annual_cash_flow > 0:
+                self._roi = from_cents(
+                    roi_hundredths(annual_cash_flow, self._invest_cents)
+                )
+            else:
+                self._roi = Decimal("0")
+        return self._roi
 
-        # set cash flow (I-E)
+    def _cash_flow_cents(self):
         if len(self.incomes) > 0:
-            self.cash_flow = self.total_income - self.total_expense
+            return self._income_cents - self._expense_cents
+        return 0
+
+    def _line_item_changed(self, item, delta):
+        if isinstance(item, Income):
+            self._income_cents += delta
         else:
-            self.cash_flow = Decimal("0")
+            self._expense_cents += delta
+        self._inputs_changed()
 
-        # set annual cash flow to cash_flow * 12
-        self.annual_cash_flow = self.cash_flow * Decimal("12.00")
-        self.annual_cash_flow = self.annual_cash_flow.quantize(Decimal("1.00"))
+    # clears the derived values and tells the collections holding this investment
+    def _inputs_changed(self):
+        self._roi = None
+        self._content_key = None
+        if self._owners:
+            for collection in _live_owners(self):
+                collection._investment_changed(self)
 
-        # set ROI to annual_cash_flow / total_invest
-        if self.annual_cash_flow > 0:
-            self.roi = self.annual_cash_flow / self.total_invest
-            self.roi = self.roi.quantize(Decimal("1.00"))
+    """Get a stable hash of the inputs the metrics are derived from.
 
-        else:
-            self.roi = Decimal("0")
+    Line items are hashed by their amounts in sorted order, so Investments with the same
+    amounts and total_invest share a key regardless of names and order. The key is kept until
+    an input changes.
+
+    Keyword arguments:
+    None
+    Return: bytes digest of the incomes, expenses and total_invest.
+    """
+
+    def content_key(self):
+        if self._content_key is None:
+            incomes = sorted(income.cents for income in self.incomes)
+            expenses = sorted(expense.cents for expense in self.expenses)
+            # the counts keep the boundary between incomes and expenses unambiguous
+            content = array("q", [self._invest_cents, len(incomes), len(expenses)])
+            content.extend(incomes)
+            content.extend(expenses)
+            self._content_key = hashlib.blake2b(
+                content.tobytes(), digest_size=16
+            ).digest()
+        return self._content_key
 
     """Set the Incomes for the Investment.
 
@@ -214,32 +791,17 @@ class Investment:
     """
 
     def set_incomes(self, incomes=None):
-        if incomes is not None:
-            self.incomes = incomes
-
-        # update the total_income with the new Incomes
-        income_count = Decimal("0")
-        if len(self.incomes) > 0:
-            for income in self.incomes:
-                income_count += income.amount
-        self.total_income = income_count
-
-        # update the cash_flow
-        if len(self.incomes) > 0:
-            self.cash_flow = self.total_income - self.total_expense
-        else:
-            self.cash_flow = Decimal("0")
-
-        # update annual_cash_flow
-        self.annual_cash_flow = self.cash_flow * Decimal("12.00")
-        self.annual_cash_flow = self.annual_cash_flow.quantize(Decimal("1.00"))
-
-        # update roi
-        if self.annual_cash_flow > 0:
-            self.roi = self.annual_cash_flow / self.total_invest
-            self.roi = self.roi.quantize(Decimal("1.00"))
-        else:
-            self.roi = Decimal("0")
+        if incomes is None:
+            return
+        for income in self.incomes:
+            _remove_owner(income, self)
+        self.incomes = list(incomes)
+        self._income_cents = 0
+        owner_ref = weakref.ref(self)
+        for income in self.incomes:
+            _add_owner(income, owner_ref)
+            self._income_cents += income.cents
+        self._inputs_changed()
 
     """Gets all the Incomes for the Investment
 
@@ -254,40 +816,69 @@ class Investment:
         else:
             return Decimal("0")
 
-    """Set the Expenses for the Investment
+    """Add a single Income to the Investment.
 
     Keyword arguments:
-    expenses -- List of Expenses.
-    Return: None. If no Expenses are passed in, method has no effect.
+    income -- An Income object.
+    Return: None
     """
 
-    def set_expenses(self, expenses=None):
-        if expenses is not None:
-            self.expenses = expenses
+    def add_income(self, income):
+        self.incomes.append(income)
+        _add_owner(income, weakref.ref(self))
+        self._income_cents += income.cents
+        self._inputs_changed()
 
-        # update the total_expense with the new Expenses
-        expense_count = Decimal("0")
-        if len(self.incomes) > 0:
-            for expense in expenses:
-                expense_count += expense.amount
-        self.total_expense = expense_count
+    """Remove a single Income from the Investment.
 
-        # update the cash_flow
-        if len(self.incomes) > 0:
-            self.cash_flow = self.total_income - self.total_expense
-        else:
-            self.cash_flow = Decimal("0")
+    Keyword arguments:
+    income -- The Income object or the name of the Income to remove.
+    Return: The removed Income. Raises KeyError if the Investment has no such Income.
+    """
 
-        # update annual_cash_flow
-        self.annual_cash_flow = self.cash_flow * Decimal("12.00")
-        self.annual_cash_flow = self.annual_cash_flow.quantize(Decimal("1.00"))
+    def remove_income(self, income):
+        income = _find_item(self.incomes, income)
+        self.incomes.remove(income)
+        _remove_owner(income, self)
+        self._income_cents -= income.cents
+        self._inputs_changed()
+        return income
 
-        # update roi
-        if self.annual_cash_flow > 0:
-            self.roi = self.annual_cash_flow / self.total_invest
-            self.roi = self.roi.quantize(Decimal("1.00"))
-        else:
-            self.roi = Decimal("0")
+    """Change the amount of a single Income of the Investment.
+
+    Keyword arguments:
+    name -- Name of the Income to update.
+    amount -- String dollar amount of the income.
+    Return: The updated Income, a private copy if it was shared. Raises KeyError if the
+    Investment has no such Income.
+    """
+
+    def update_income(self, name, amount):
+        income = _find_item(self.incomes, name)
+        if income.is_shared():
+            return self._copy_on_write(self.incomes, income, amount)
+        income.set_amount(amount)
+        return income
+
+    """Set the Expenses for the Investment
+
+    Keyword arguments:
+    expenses -- List of Expenses.
+    Return: None. If no Expenses are passed in, method has no effect.
+    """
+
+    def set_expenses(self, expenses=None):
+        if expenses is None:
+            return
+        for expense in self.expenses:
+            _remove_owner(expense, self)
+        self.expenses = list(expenses)
+        self._expense_cents = 0
+        owner_ref = weakref.ref(self)
+        for expense in self.expenses:
+            _add_owner(expense, owner_ref)
+            self._expense_cents += expense.cents
+        self._inputs_changed()
 
     """Get all Expenses for the Investment.
 
@@ -302,6 +893,58 @@ class Investment:
         else:
             return Decimal("0")
 
+    """Add a single Expense to the Investment.
+
+    Keyword arguments:
+    expense -- An Expense object.
+    Return: None
+    """
+
+    def add_expense(self, expense):
+        self.expenses.append(expense)
+        _add_owner(expense, weakref.ref(self))
+        self._expense_cents += expense.cents
+        self._inputs_changed()
+
+    """Remove a single Expense from the Investment.
+
+    Keyword arguments:
+    expense -- The Expense object or the name of the Expense to remove.
+    Return: The removed Expense. Raises KeyError if the Investment has no such Expense.
+    """
+
+    def remove_expense(self, expense):
+        expense = _find_item(self.expenses, expense)
+        self.expenses.remove(expense)
+        _remove_owner(expense, self)
+        self._expense_cents -= expense.cents
+        self._inputs_changed()
+        return expense
+
+    """Change the amount of a single Expense of the Investment.
+
+    Keyword arguments:
+    name -- Name of the Expense to update.
+    amount -- String dollar amount of the expense.
+    Return: The updated Expense, a private copy if it was shared. Raises KeyError if the
+    Investment has no such Expense.
+    """
+
+    def update_expense(self, name, amount):
+        expense = _find_item(self.expenses, name)
+        if expense.is_shared():
+            return self._copy_on_write(self.expenses, expense, amount)
+        expense.set_amount(amount)
+        return expense
+
+    # the other Investments holding a shared item keep it, this one gets a private copy
+    def _copy_on_write(self, items, item, amount):
+        copy = type(item).from_cents(item.name, to_cents(amount))
+        items[items.index(item)] = copy
+        _add_owner(copy, weakref.ref(self))
+        self._line_item_changed(copy, copy.cents - item.cents)
+        return copy
+
     """Set the name of the Investment.
 
     Keyword arguments:
@@ -310,7 +953,10 @@ class Investment:
     """
 
     def set_name(self, name):
+        old_name = self.name
         self.name = name
+        for collection in _live_owners(self):
+            collection._renamed(self, old_name)
 
     """Get the name of the Investment
 
@@ -330,11 +976,8 @@ class Investment:
     """
 
     def set_total_invest(self, total_invest):
-        self.total_invest = Decimal(total_invest).quantize(Decimal("1.00"))
-
-        # update roi
-        self.roi = self.annual_cash_flow / self.total_invest
-        self.roi = self.roi.quantize(Decimal("1.00"))
+        self._invest_cents = to_cents(total_invest)
+        self._inputs_changed()
 
     """Get the total investment into the Investment.
 
@@ -345,3 +988,14 @@ class Investment:
 
     def get_total_invest(self):
         return self.total_invest
+
+
+def _find_item(items, item):
+    # accept either the line item itself or its name
+    if isinstance(item, str):
+        for candidate in items:
+            if candidate.name == item:
+                return candidate
+    elif item in items:
+        return item
+    raise KeyError(item)
@@ -0,0 +1,193 @@
+import threading
+
+from roi.money import from_cents, roi_hundredths
+from roi.roi import InvestmentCollection
+
+# order of the running totals, and of the summary after "investments"
+TOTALS = (
+    "total_income",
+    "total_expense",
+    "cash_flow",
+    "annual_cash_flow",
+    "total_invest",
+)
+
+_NOTHING = (0,) * (len(TOTALS) + 2)
+
+
+class PortfolioRollup:
+    """Running totals over the Investments of Users or collections.
+
+    Each watched Investment's contribution is kept, and is swapped for its new one when it is
+    added, removed or edited, so the totals are always current and reading them costs the same
+    whatever the number of Investments. Expenses and cash flow follow the Investment rules and
+    only count for Investments with an income.
+
+    roi is weighted by capital: the ROI of each Investment weighted by its total_invest, which is
+    the positive annual cash flow of the Investments with capital over the total capital.
+
+    Keyword arguments:
+    source -- User or InvestmentCollection to watch from the start, none if None.
+    Return: None
+    """
+
+    def __init__(self, source=None) -> None:
+        # investments, then the TOTALS in cents, then the annual cash flow behind roi; replaced
+        # as a whole on every change, so a reader never sees half of an update
+        self._totals = _NOTHING
+        # id(investment) -> (number of watched collections holding it, tuple of what it adds
+        # to _totals)
+        self._counted = {}
+        # id(collection) -> collection
+        self._collections = {}
+        # watched collections change under their own locks, which do not cover each other
+        self._lock = threading.Lock()
+        if source is not None:
+            self.watch(source)
+
+    def __len__(self) -> int:
+        return self._totals[0]
+
+    @property
+    def total_income(self):
+        return from_cents(self._totals[1])
+
+    @property
+    def total_expense(self):
+        return from_cents(self._totals[2])
+
+    @property
+    def cash_flow(self):
+        return from_cents(self._totals[3])
+
+    @property
+    def annual_cash_flow(self):
+        return from_cents(self._totals[4])
+
+    @property
+    def total_invest(self):
+        return from_cents(self._totals[5])
+
+    @property
+    def roi(self):
+        totals = self._totals
+        return from_cents(roi_hundredths(totals[6], totals[5]))
+
+    """Get every total at once, all from the same moment.
+
+    Keyword arguments:
+    None
+    Return: Dict of the number of investments and the Decimal total_income, total_expense,
+    cash_flow, annual_cash_flow, total_invest and capital weighted roi.
+    """
+
+    def summary(self):
+        totals = self._totals
+        summary = {"investments": totals[0]}
+        for name, cents in zip(TOTALS, totals[1:]):
+            summary[name] = from_cents(cents)
+        summary["roi"] = from_cents(roi_hundredths(totals[6], totals[5]))
+        return summary
+
+    """Count the Investments of a User or InvestmentCollection and follow its changes.
+
+    Watching a lazily loaded User loads its investments.
+
+    Keyword arguments:
+    source -- User or InvestmentCollection.
+    Return: None
+    """
+
+    def watch(self, source):
+        collection = _collection(source)
+        with collection.lock:
+            if id(collection) in self._collections:
+                return
+            self._collections[id(collection)] = collection
+            collection.add_watcher(self)
+            for investment in collection:
+                self._count(investment, 1)
+
+    def unwatch(self, source):
+        collection = _collection(source)
+        with collection.lock:
+            if self._collections.pop(id(collection), None) is None:
+                return
+            collection.remove_watcher(self)
+            for investment in collection:
+                self._uncount(investment)
+
+    def watch_registry(self, registry):
+        registry.add_watcher(self)
+        for user in registry.snapshot().values():
+            self.watch(user)
+
+    def _count(self, investment, holders=0):
+        # holders is 1 when another watched collection starts holding the Investment, 0 when
+        # it changed
+        income = investment.income_cents
+        if investment.incomes:
+            expense = investment.expense_cents
+            cash_flow = income - expense
+        else:
+            expense = cash_flow = 0
+        invest = investment.invest_cents
+        annual = cash_flow * 12
+        contribution = (
+            1,
+            income,
+            expense,
+            cash_flow,
+            annual,
+            invest,
+            annual if annual > 0 and invest > 0 else 0,
+        )
+        with self._lock:
+            # an Investment in two watched collections is only counted once
+            counted = self._counted.get(id(investment))
+            if counted is None:
+                if not holders:
+                    # a change reported after the last watched collection removed it
+                    return
+                counted = (0, _NOTHING)
+            self._totals = [
+                total - before + after
+                for total, before, after in zip(self._totals, counted[1], contribution)
+            ]
+            self._counted[id(investment)] = (counted[0] + holders, contribution)
+
+    def _uncount(self, investment):
+        with self._lock:
+            counted = self._counted.get(id(investment))
+            if counted is None:
+                return
+            if counted[0] > 1:
+                self._counted[id(investment)] = (counted[0] - 1, counted[1])
+                return
+            del self._counted[id(investment)]
+            self._totals = [
+                total - before for total, before in zip(self._totals, counted[1])
+            ]
+
+    # watcher callbacks from UserRegistry and InvestmentCollection
+
+    def _user_added(self, user):
+        self.watch(user)
+
+    def _user_removed(self, user):
+        self.unwatch(user)
+
+    def _investment_added(self, collection, investment):
+        self._count(investment, 1)
+
+    def _investment_removed(self, collection, investment, investment_id):
+        self._uncount(investment)
+
+    def _investment_changed(self, collection, investment):
+        self._count(investment)
+
+
+def _collection(source):
+    if isinstance(source, InvestmentCollection):
+        return source
+    return source.investments
@@ -0,0 +1,298 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional for the rest of the package
+    np = None
+
+FACTORS = ("income", "expense", "total_invest")
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+class Uniform:
+    """A factor drawn uniformly between low and high.
+
+    Keyword arguments:
+    low -- Lowest factor.
+    high -- Highest factor.
+    Return: None
+    """
+
+    def __init__(self, low, high) -> None:
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        return rng.uniform(self.low, self.high, size)
+
+
+class Normal:
+    """A factor drawn from a normal distribution, e.g. Normal(1.0, 0.1) for income +-10%.
+
+    Keyword arguments:
+    mean -- Mean of the factor.
+    std -- Standard deviation of the factor.
+    Return: None
+    """
+
+    def __init__(self, mean, std) -> None:
+        self.mean = mean
+        self.std = std
+
+    def sample(self, rng, size):
+        return rng.normal(self.mean, self.std, size)
+
+
+class ScenarioSummary:
+    """Distribution of an Investment's metrics across scenarios.
+
+    ROI follows the Investment rules: it is annual_cash_flow / total_invest when the annual cash flow
+    is positive and 0 otherwise, without rounding. Scenarios with a positive cash flow and no
+    total_invest have no ROI and are left out of the ROI statistics. Percentiles are exact up to
+    max_samples scenarios and estimated from a seeded random sample beyond that.
+
+    Keyword arguments:
+    name -- Name of the Investment.
+    Return: None
+    """
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.scenarios = 0
+        self.mean_roi = None
+        self.min_roi = None
+        self.max_roi = None
+        self.roi_percentiles = {}
+        self.mean_cash_flow = None
+        self.cash_flow_percentiles = {}
+        self.negative_cash_flow_probability = None
+
+
+def sweep(
+    investments,
+    income=1.0,
+    expense=1.0,
+    total_invest=1.0,
+    scenarios=None,
+    seed=0,
+    chunk_size=100000,
+    workers=0,
+    max_samples=10000,
+):
+    """Evaluate what-if scenarios for a portfolio in vectorized chunks.
+
+    Each scenario multiplies the incomes, expenses and total_invest of every Investment by a factor.
+    A factor is a number, a list of values or a distribution such as Normal or Uniform. Without
+    distributions every combination of the lists is evaluated as a grid. With a distribution,
+    scenarios random scenarios are drawn and lists are sampled uniformly.
+
+    Keyword arguments:
+    investments -- Iterable of Investment objects, the base case.
+    income -- Factor for the incomes.
+    expense -- Factor for the expenses.
+    total_invest -- Factor for total_invest.
+    scenarios -- Number of random scenarios, required when a factor is a distribution.
+    seed -- Seed for the random scenarios and samples, results only depend on the seed.
+    chunk_size -- Number of scenario x investment evaluations per chunk.
+    workers -- Number of processes to evaluate chunks in, 0 evaluates in this process.
+    max_samples -- Number of scenarios kept per investment for percentiles, with chunk_size and
+    workers this bounds the memory use regardless of the number of scenarios.
+    Return: List of ScenarioSummary, one per Investment.
+    """
+    if np is None:
+        raise ImportError("roi.scenarios requires numpy to be installed.")
+    investments = list(investments)
+    specs = {"income": income, "expense": expense, "total_invest": total_invest}
+    random = any(hasattr(spec, "sample") for spec in specs.values())
+    if random:
+        if scenarios is None:
+            raise ValueError("scenarios is required when a factor is a distribution.")
+        total = int(scenarios)
+    else:
+        total = 1
+        for spec in specs.values():
+            total *= len(_values(spec))
+
+    base = (
+        np.array([i.income_cents for i in investments], dtype=float) / 100,
+        # expenses only count once the investment has an income
+        np.array(
+            [i.expense_cents if i.incomes else 0 for i in investments], dtype=float
+        )
+        / 100,
+        np.array([i.invest_cents for i in investments], dtype=float) / 100,
+    )
+    step = max(1, chunk_size // max(1, len(investments)))
+    # the sample is allocated once, no larger than the number of scenarios, so it fills up
+    max_samples = max(1, min(max_samples, total))
+    jobs = (
+        (random, start, min(start + step, total), seed, max_samples)
+        for start in range(0, total, step)
+    )
+    # chunks are folded into running totals and a fixed size sample as they finish, in order
+    totals = None
+    if workers:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_start_worker, initargs=(base, specs)
+        ) as executor:
+            # a few chunks per worker in flight, so finished chunks do not pile up
+            pending = deque()
+            for job in jobs:
+                pending.append(executor.submit(_evaluate_in_worker, *job))
+                if len(pending) >= 2 * workers:
+                    totals = _fold(totals, pending.popleft().result(), max_samples)
+            while pending:
+                totals = _fold(totals, pending.popleft().result(), max_samples)
+    else:
+        for job in jobs:
+            totals = _fold(totals, _evaluate_chunk(base, specs, *job), max_samples)
+    return _summarize(investments, totals, total)
+
+
+def _values(spec):
+    if isinstance(spec, (list, tuple)) or (
+        np is not None and isinstance(spec, np.ndarray)
+    ):
+        return np.asarray(spec, dtype=float)
+    return np.asarray([spec], dtype=float)
+
+
+def _factors(specs, random, start, end, seed):
+    if random:
+        # every chunk has its own stream, so results do not depend on the chunking order
+        rng = np.random.default_rng([seed, start])
+        factors = []
+        for name in FACTORS:
+            spec = specs[name]
+            if hasattr(spec, "sample"):
+                factors.append(spec.sample(rng, end - start))
+            else:
+                factors.append(rng.choice(_values(spec), end - start))
+        return factors
+    axes = [_values(specs[name]) for name in FACTORS]
+    indexes = np.unravel_index(np.arange(start, end), [len(axis) for axis in axes])
+    return [axis[index] for axis, index in zip(axes, indexes)]
+
+
+# base and specs of the sweep a worker process evaluates chunks of, sent once per process
+_worker = None
+
+
+def _start_worker(base, specs):
+    global _worker
+    _worker = (base, specs)
+
+
+def _evaluate_in_worker(random, start, end, seed, max_samples):
+    return _evaluate_chunk(*_worker, random, start, end, seed, max_samples)
+
+
+def _evaluate_chunk(base, specs, random, start, end, seed, max_samples):
+    income_factor, expense_factor, invest_factor = _factors(
+        specs, random, start, end, seed
+    )
+    income, expense, invest = base
+    # one row per investment, one column per scenario
+    cash_flow = (
+        income[:, None] * income_factor[None, :]
+        - expense[:, None] * expense_factor[None, :]
+    )
+    annual_cash_flow = cash_flow * 12
+    scaled_invest = invest[:, None] * invest_factor[None, :]
+    positive = annual_cash_flow > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roi = np.where(positive, annual_cash_flow / scaled_invest, 0.0)
+    roi[positive & (scaled_invest == 0)] = np.nan
+
+    # every scenario gets a random key and the sample keeps the max_samples lowest, so it is
+    # the same whatever the chunking and can be merged chunk by chunk
+    rng = np.random.default_rng([seed, start, 1])
+    keys = rng.random(end - start)
+    keep = _lowest(keys, max_samples)
+    valid = ~np.isnan(roi)
+    return {
+        "roi_count": valid.sum(axis=1),
+        "roi_sum": np.where(valid, roi, 0.0).sum(axis=1),
+        "roi_min": np.where(valid, roi, np.inf).min(axis=1),
+        "roi_max": np.where(valid, roi, -np.inf).max(axis=1),
+        "cash_flow_sum": cash_flow.sum(axis=1),
+        "negatives": (cash_flow < 0).sum(axis=1),
+        "sample_keys": keys[keep],
+        "roi_sample": roi[:, keep],
+        "cash_flow_sample": cash_flow[:, keep],
+    }
+
+
+def _lowest(keys, count):
+    if len(keys) <= count:
+        return np.arange(len(keys))
+    return np.argpartition(keys, count - 1)[:count]
+
+
+def _fold(totals, part, max_samples):
+    # adds a chunk to the totals in place, the sample keeps the max_samples lowest keys seen
+    if totals is None:
+        rows = len(part["roi_sum"])
+        totals = {
+            "roi_count": np.zeros(rows, dtype=np.int64),
+            "roi_sum": np.zeros(rows),
+            "roi_min": np.full(rows, np.inf),
+            "roi_max": np.full(rows, -np.inf),
+            "cash_flow_sum": np.zeros(rows),
+            "negatives": np.zeros(rows, dtype=np.int64),
+            # free slots of the sample have an infinite key
+            "sample_keys": np.full(max_samples, np.inf),
+            "roi_sample": np.empty((rows, max_samples)),
+            "cash_flow_sample": np.empty((rows, max_samples)),
+        }
+    totals["roi_count"] += part["roi_count"]
+    totals["roi_sum"] += part["roi_sum"]
+    np.minimum(totals["roi_min"], part["roi_min"], out=totals["roi_min"])
+    np.maximum(totals["roi_max"], part["roi_max"], out=totals["roi_max"])
+    totals["cash_flow_sum"] += part["cash_flow_sum"]
+    totals["negatives"] += part["negatives"]
+
+    keys = totals["sample_keys"]
+    new_keys = part["sample_keys"]
+    # only scenarios below the highest kept key can enter, few once the sample is full
+    candidates = np.flatnonzero(new_keys < keys.max())
+    if len(candidates):
+        kept = np.zeros(max_samples + len(candidates), dtype=bool)
+        kept[_lowest(np.concatenate([keys, new_keys[candidates]]), max_samples)] = True
+        slots = np.flatnonzero(~kept[:max_samples])
+        entering = candidates[kept[max_samples:]]
+        keys[slots] = new_keys[entering]
+        totals["roi_sample"][:, slots] = part["roi_sample"][:, entering]
+        totals["cash_flow_sample"][:, slots] = part["cash_flow_sample"][:, entering]
+    return totals
+
+
+def _summarize(investments, totals, total):
+    summaries = []
+    for row, investment in enumerate(investments):
+        summary = ScenarioSummary(investment.name)
+        summary.scenarios = total
+        if totals is None:
+            summaries.append(summary)
+            continue
+        roi_count = int(totals["roi_count"][row])
+        if roi_count:
+            summary.mean_roi = float(totals["roi_sum"][row]) / roi_count
+            summary.min_roi = float(totals["roi_min"][row])
+            summary.max_roi = float(totals["roi_max"][row])
+            roi_sample = totals["roi_sample"][row]
+            roi_sample = roi_sample[~np.isnan(roi_sample)]
+            if len(roi_sample):
+                summary.roi_percentiles = _percentiles(roi_sample)
+        summary.mean_cash_flow = float(totals["cash_flow_sum"][row]) / total
+        cash_flow_sample = totals["cash_flow_sample"][row]
+        if len(cash_flow_sample):
+            summary.cash_flow_percentiles = _percentiles(cash_flow_sample)
+        summary.negative_cash_flow_probability = int(totals["negatives"][row]) / total
+        summaries.append(summary)
+    return summaries
+
+
+def _percentiles(values):
+    return dict(zip(PERCENTILES, np.percentile(values, PERCENTILES).tolist()))
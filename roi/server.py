@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from roi.money import to_cents
+from roi.roi import Expense, Income, Investment, UserRegistry
+
+# a single request line may carry many line items
+LINE_LIMIT = 1 << 20
+
+OPERATIONS = {}
+# operations that can change the registry, answered once a journal has committed them
+MUTATIONS = set()
+
+
+class RequestError(Exception):
+    """A request that could not be carried out, sent back to the client as an error.
+
+    Keyword arguments:
+    message -- What is wrong with the request.
+    Return: None
+    """
+
+    def __init__(self, message) -> None:
+        super().__init__(message)
+        self.message = message
+
+
+def operation(name, mutates=False):
+    """Register a request handler under an operation name.
+
+    The handler is called as handler(registry, user, request) while user.lock is held. user is
+    None, and no lock is held, for operations that may create the user. mutates marks handlers that can
+    change the registry.
+    """
+
+    def register(handler):
+        OPERATIONS[name] = handler
+        if mutates:
+            MUTATIONS.add(name)
+        return handler
+
+    return register
+
+
+class ROIServer:
+    """Asyncio server for many concurrent users of the ROI calculator.
+
+    Speaks newline delimited JSON. Each request is an object with an "op", a "user" and the
+    operation's fields, and an optional "id" that is echoed back. Each response is
+    {"id", "ok": true, "result"} or {"id", "ok": false, "error"}. Requests on a connection can be
+    pipelined: they are handled concurrently and answered in the order they were sent. Handlers
+    are synchronous and run under the User's own lock, so they do not interleave with each
+    other or with threads editing the same User.
+
+    With a journal, a request that changes the registry is only answered once its edits are
+    committed. Commits run in a worker thread, so concurrent requests share one fsync. If the
+    commit fails the edit has still been made in memory, and the response is
+    {"id", "ok": false, "applied": true, "result", "error"}: the edit took effect but may be
+    lost on a restart.
+
+    Keyword arguments:
+    registry -- UserRegistry the users are kept in, the journal's registry or a new one by
+    default.
+    max_pipeline -- Number of requests a connection can have in flight.
+    journal -- roi.journal.Journal recording the edits, None to keep them only in memory.
+    Return: None
+    """
+
+    def __init__(self, registry=None, max_pipeline=64, journal=None) -> None:
+        if registry is None:
+            registry = journal.registry if journal is not None else UserRegistry()
+        self.registry = registry
+        self.max_pipeline = max_pipeline
+        self.journal = journal
+        self.server = None
+        self.port = None
+
+    """Start listening for connections.
+
+    Keyword arguments:
+    host -- Interface to listen on.
+    port -- Port to listen on, 0 picks a free port which is stored in self.port.
+    Return: The asyncio.Server.
+    """
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=LINE_LIMIT
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    """Handle a single request.
+
+    Keyword arguments:
+    request -- Dict with the op, user and fields of the request.
+    Return: Response dict.
+    """
+
+    async def handle_request(self, request):
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            handler = OPERATIONS.get(request.get("op"))
+            if handler is None:
+                raise RequestError(f"unknown op {request.get('op')!r}")
+            username = _field(request, "user")
+            if request["op"] == "choose_user":
+                result = handler(self.registry, None, request)
+            else:
+                user = self.registry.get(username)
+                if user is None:
+                    raise RequestError(f"unknown user {username.lower()!r}")
+                with user.lock:
+                    result = handler(self.registry, user, request)
+        except RequestError as e:
+            return {"id": request_id, "ok": False, "error": e.message}
+        except (ArithmeticError, ValueError) as e:
+            return {"id": request_id, "ok": False, "error": f"invalid amount: {e}"}
+        except Exception as e:
+            # a failing handler must not take the connection down with it
+            return {"id": request_id, "ok": False, "error": f"internal error: {e!r}"}
+        if self.journal is not None and request["op"] in MUTATIONS:
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.journal.commit
+                )
+            except Exception as e:
+                return {
+                    "id": request_id,
+                    "ok": False,
+                    "applied": True,
+                    "result": result,
+                    "error": f"applied but not journaled: {e!r}",
+                }
+        return {"id": request_id, "ok": True, "result": result}
+
+    async def _handle_connection(self, reader, writer):
+        # pending responses in request order, bounded so a client cannot queue without limit
+        responses = asyncio.Queue(self.max_pipeline)
+        sender = asyncio.create_task(self._send_responses(responses, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await responses.put(_done({"ok": False, "error": "line too long"}))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await responses.put(asyncio.ensure_future(self._handle_line(line)))
+        except ConnectionError:
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+
+    async def _handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"invalid JSON: {e}"}
+        return await self.handle_request(request)
+
+    async def _send_responses(self, responses, writer):
+        while True:
+            future = await responses.get()
+            if future is None:
+                return
+            response = await future
+            try:
+                writer.write(json.dumps(response).encode() + b"\n")
+                # pipelined responses are flushed together
+                if responses.empty():
+                    await writer.drain()
+            except ConnectionError:
+                pass
+
+
+def _done(response):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(response)
+    return future
+
+
+def _field(request, name):
+    value = request.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise RequestError(f"{name} is required")
+    return value.strip()
+
+
+def _amount(value):
+    # numbers are read through str so 0.1 stays 0.1 instead of its float value
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise RequestError(f"amount must be a number, not {value!r}")
+    return str(value)
+
+
+def _line_items(request, name, item_class):
+    items = request.get(name) or []
+    if not isinstance(items, list):
+        raise RequestError(f"{name} must be a list")
+    result = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise RequestError(f"{name} must be a list of objects")
+        result.append(
+            item_class(_field(item, "name").title(), _amount(item.get("amount")))
+        )
+    return result
+
+
+def _get_investment(user, request):
+    name = _field(request, "name").title()
+    investment = user.get_investment(name)
+    if investment is None:
+        raise RequestError(f"investment {name!r} not found")
+    return investment
+
+
+@operation("choose_user", mutates=True)
+def choose_user(registry, user, request):
+    user, created = registry.get_or_create(_field(request, "user"))
+    return {
+        "user": user.username,
+        "created": created,
+        "investments": [investment.name for investment in user.investments],
+    }
+
+
+@operation("create_investment", mutates=True)
+def create_investment(registry, user, request):
+    investment = Investment(
+        _field(request, "name").title(),
+        _line_items(request, "incomes", Income),
+        _line_items(request, "expenses", Expense),
+        _amount(request.get("total_invest", "0")),
+    )
+    user.add_investment(investment)
+    return view(investment)
+
+
+@operation("view_investment")
+def view_investment(registry, user, request):
+    return view(_get_investment(user, request))
+
+
+@operation("edit_investment", mutates=True)
+def edit_investment(registry, user, request):
+    # fields that are left out of the request are left unchanged
+    investment = _get_investment(user, request)
+    # parse everything before changing anything, so a bad request changes nothing
+    incomes = expenses = total_invest = None
+    if "incomes" in request:
+        incomes = _line_items(request, "incomes", Income)
+    if "expenses" in request:
+        expenses = _line_items(request, "expenses", Expense)
+    if "total_invest" in request:
+        total_invest = _amount(request["total_invest"])
+        to_cents(total_invest)
+    if "new_name" in request:
+        investment.set_name(_field(request, "new_name").title())
+    investment.set_incomes(incomes)
+    investment.set_expenses(expenses)
+    if total_invest is not None:
+        investment.set_total_invest(total_invest)
+    return view(investment)
+
+
+@operation("delete_investment", mutates=True)
+def delete_investment(registry, user, request):
+    name = _field(request, "name").title()
+    investment = user.remove_investment(name)
+    if investment is None:
+        raise RequestError(f"investment {name!r} not found")
+    return {"deleted": investment.name}
+
+
+def view(investment):
+    """Describe an Investment the way the REPL's view_investment prints it.
+
+    Keyword arguments:
+    investment -- Investment object.
+    Return: Dict of the name, line items, total_invest and metrics with amounts as strings.
+    """
+    try:
+        roi = investment.roi
+    except ZeroDivisionError:
+        roi = None
+    return {
+        "name": investment.name,
+        "incomes": [
+            {"name": income.name, "amount": str(income.amount)}
+            for income in investment.incomes
+        ],
+        "expenses": [
+            {"name": expense.name, "amount": str(expense.amount)}
+            for expense in investment.expenses
+        ],
+        "total_invest": str(investment.total_invest),
+        "total_income": str(investment.total_income),
+        "total_expense": str(investment.total_expense),
+        "cash_flow": str(investment.cash_flow),
+        "annual_cash_flow": str(investment.annual_cash_flow),
+        "roi": str(roi) if roi is not None else None,
+    }
+
+
+async def serve(host, port, registry=None, journal=None):
+    server = ROIServer(registry, journal=journal)
+    await server.start(host, port)
+    print(f"Serving on {host}:{server.port}")
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve the ROI calculator to many users over newline delimited JSON."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--journal",
+        help="journal file the users are recovered from and edits written to",
+    )
+    args = parser.parse_args(argv)
+    journal = None
+    if args.journal:
+        from roi.journal import Journal
+
+        journal = Journal(args.journal)
+        print(f"Recovered {len(journal.registry)} users from {args.journal}")
+    try:
+        asyncio.run(serve(args.host, args.port, journal=journal))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if journal is not None:
+            journal.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
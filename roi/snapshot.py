@@ -0,0 +1,426 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from functools import partial
+
+from roi.frame import derive_columns
+from roi.money import derive_metrics, from_cents
+from roi.roi import Expense, Income, Investment, User, UserRegistry
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the array module is used without it
+    np = None
+
+MAGIC = b"ROISNAP\x00"
+VERSION = 2
+
+# every section is a column of int64 values, except string_data which holds utf-8 bytes
+SECTIONS = (
+    "string_offsets",
+    "string_data",
+    "user_names",
+    "user_offsets",
+    "next_ids",
+    "names",
+    "investment_ids",
+    "invest_cents",
+    "income_cents",
+    "expense_cents",
+    "income_counts",
+    "item_offsets",
+    "item_names",
+    "item_cents",
+)
+
+# magic, version, byte order of the columns, then the counts and the offset of each section
+HEADER = struct.Struct("<8sII4Q%dQ" % len(SECTIONS))
+BYTE_ORDERS = {"little": 1, "big": 2}
+
+# a User's Investments with their ids in its collection and the next id, read at one moment
+SavedUser = namedtuple("SavedUser", "username investments ids next_id")
+
+
+def saved_user(user):
+    """Read the Investments of a User together with their ids.
+
+    Keyword arguments:
+    user -- User object.
+    Return: SavedUser.
+    """
+    collection = user.investments
+    with user.lock:
+        investments = collection.snapshot()
+        ids = [collection.id_of(investment) for investment in investments]
+        return SavedUser(user.username, investments, ids, collection.next_id)
+
+
+def write_snapshot(path, users):
+    """Write Users and their Investments to a binary snapshot file.
+
+    Amounts are stored as fixed-width int64 cents and every name once in a string table.
+    Investments keep their income and expense totals, so metrics can be derived without reading
+    the line items. Users are sorted by username so they can be found by binary search, and
+    Investments keep their ids in their User's collection. The file is written next to path and
+    moved into place, so readers never see a partial snapshot.
+
+    Keyword arguments:
+    path -- Path of the snapshot file.
+    users -- Iterable of User or SavedUser objects.
+    Return: None
+    """
+    strings = {}
+    columns = {name: array("q") for name in SECTIONS if name != "string_data"}
+
+    def intern(text):
+        string_id = strings.get(text)
+        if string_id is None:
+            string_id = strings[text] = len(strings)
+        return string_id
+
+    columns["user_offsets"].append(0)
+    columns["item_offsets"].append(0)
+    for user in sorted(users, key=lambda user: user.username):
+        if not isinstance(user, SavedUser):
+            user = saved_user(user)
+        columns["user_names"].append(intern(user.username))
+        columns["next_ids"].append(user.next_id)
+        columns["investment_ids"].extend(user.ids)
+        for investment in user.investments:
+            columns["names"].append(intern(investment.name))
+            columns["invest_cents"].append(investment.invest_cents)
+            columns["income_cents"].append(investment.income_cents)
+            columns["expense_cents"].append(investment.expense_cents)
+            columns["income_counts"].append(len(investment.incomes))
+            # incomes come first, then expenses
+            for item in investment.incomes + investment.expenses:
+                columns["item_names"].append(intern(item.name))
+                columns["item_cents"].append(item.cents)
+            columns["item_offsets"].append(len(columns["item_names"]))
+        columns["user_offsets"].append(len(columns["names"]))
+
+    encoded = [text.encode("utf-8") for text in strings]
+    string_data = b"".join(encoded)
+    offsets = columns["string_offsets"]
+    offsets.append(0)
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    sections = [
+        string_data if name == "string_data" else columns[name].tobytes()
+        for name in SECTIONS
+    ]
+    positions = []
+    position = HEADER.size
+    for data in sections:
+        position = _align(position)
+        positions.append(position)
+        position += len(data)
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        BYTE_ORDERS[sys.byteorder],
+        len(strings),
+        len(columns["user_names"]),
+        len(columns["names"]),
+        len(columns["item_names"]),
+        *positions,
+    )
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(header)
+        for position, data in zip(positions, sections):
+            file.write(b"\0" * (position - file.tell()))
+            file.write(data)
+    os.replace(temporary, path)
+
+
+def _align(position):
+    return (position + 7) & ~7
+
+
+class Snapshot:
+    """A snapshot file mapped into memory.
+
+    Opening only reads the header: every column is a zero-copy memoryview of the mapping, so
+    start up time does not depend on the size of the snapshot and pages are read by the OS as
+    they are used. Investments are returned as InvestmentView objects that read the mapping on
+    access, and full Investment objects are only built when asked for.
+
+    Keyword arguments:
+    path -- Path of a file written by write_snapshot.
+    Return: None. Raises ValueError if the file is not a snapshot this version can read.
+    """
+
+    def __init__(self, path) -> None:
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._map)
+        if len(buffer) < HEADER.size:
+            self._release(buffer)
+            raise ValueError(f"{path} is not an roi snapshot")
+        magic, version, byte_order, *fields = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            self._release(buffer)
+            raise ValueError(f"{path} is not an roi snapshot")
+        if version != VERSION:
+            self._release(buffer)
+            raise ValueError(f"unsupported snapshot version {version}")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            self._release(buffer)
+            raise ValueError("snapshot was written on a machine of another byte order")
+        string_count, self.user_count, investment_count, item_count = fields[:4]
+        lengths = {
+            "string_offsets": string_count + 1,
+            "user_names": self.user_count,
+            "user_offsets": self.user_count + 1,
+            "next_ids": self.user_count,
+            "item_offsets": investment_count + 1,
+            "item_names": item_count,
+            "item_cents": item_count,
+        }
+        self._views = [buffer]
+        for name, position in zip(SECTIONS, fields[4:]):
+            if name == "string_data":
+                continue
+            length = lengths.get(name, investment_count)
+            view = buffer[position : position + length * 8].cast("q")
+            self._views.append(view)
+            setattr(self, name, view)
+        start = fields[4 + SECTIONS.index("string_data")]
+        self.string_data = buffer[start : start + self.string_offsets[-1]]
+        self._views.append(self.string_data)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            # the mapping can only be closed once no view of it is left
+            for view in reversed(self._views):
+                view.release()
+            self._views = []
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def _release(self, buffer):
+        buffer.release()
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+    def string(self, string_id):
+        offsets = self.string_offsets
+        return str(
+            self.string_data[offsets[string_id] : offsets[string_id + 1]], "utf-8"
+        )
+
+    def usernames(self):
+        return [self.string(string_id) for string_id in self.user_names]
+
+    """Find a User by binary search over the sorted usernames.
+
+    Keyword arguments:
+    username -- Username, in any case.
+    Return: int row of the User, or None if there is no User by that name.
+    """
+
+    def find_user(self, username):
+        username = username.lower()
+        low, high = 0, self.user_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.string(self.user_names[middle]) < username:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.user_count and self.string(self.user_names[low]) == username:
+            return low
+        return None
+
+    """Get views of the Investments of a User.
+
+    Keyword arguments:
+    username -- Username, in any case.
+    Return: List of InvestmentView, or None if there is no User by that name.
+    """
+
+    def user_investments(self, username):
+        row = self.find_user(username)
+        if row is None:
+            return None
+        return [
+            InvestmentView(self, investment)
+            for investment in range(self.user_offsets[row], self.user_offsets[row + 1])
+        ]
+
+    def investment(self, row):
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return InvestmentView(self, row)
+
+    """Load every User into a registry, building their Investments on first access.
+
+    Keyword arguments:
+    registry -- UserRegistry to load the Users into, a new one by default.
+    Return: The UserRegistry.
+    """
+
+    def load_users(self, registry=None):
+        if registry is None:
+            registry = UserRegistry()
+        for row in range(self.user_count):
+            User(
+                self.string(self.user_names[row]),
+                registry=registry,
+                investment_loader=partial(self._build_investments, row),
+                next_investment_id=self.next_ids[row],
+            )
+        return registry
+
+    def _build_investments(self, user_row):
+        # (id, Investment) pairs, so the User's collection keeps the saved ids
+        return [
+            (self.investment_ids[row], InvestmentView(self, row).to_investment())
+            for row in range(
+                self.user_offsets[user_row], self.user_offsets[user_row + 1]
+            )
+        ]
+
+    """Derive the metrics of every Investment straight from the mapped columns.
+
+    Keyword arguments:
+    use_numpy -- Compute with NumPy, by default when it is installed.
+    Return: Dict of metric name to a column of ints, see InvestmentFrame.compute.
+    Raises NoTotalInvestError if an Investment has a positive cash flow and no total_invest.
+    """
+
+    def compute(self, use_numpy=None):
+        if use_numpy is None:
+            use_numpy = np is not None
+        columns = derive_columns(
+            self.income_cents,
+            self.expense_cents,
+            self.income_counts,
+            self.invest_cents,
+            use_numpy,
+        )
+        if use_numpy:
+            # total_income is the mapped column itself, copy it so the snapshot can be closed
+            columns["total_income"] = columns["total_income"].copy()
+        return columns
+
+
+class InvestmentView:
+    """Read-only view of an Investment in a Snapshot, reading the mapping on access.
+
+    Keyword arguments:
+    snapshot -- The Snapshot.
+    row -- Row of the Investment in the snapshot.
+    Return: None
+    """
+
+    __slots__ = ("_snapshot", "_row")
+
+    def __init__(self, snapshot, row) -> None:
+        self._snapshot = snapshot
+        self._row = row
+
+    @property
+    def name(self):
+        return self._snapshot.string(self._snapshot.names[self._row])
+
+    @property
+    def invest_cents(self):
+        return self._snapshot.invest_cents[self._row]
+
+    @property
+    def income_cents(self):
+        return self._snapshot.income_cents[self._row]
+
+    @property
+    def expense_cents(self):
+        return self._snapshot.expense_cents[self._row]
+
+    @property
+    def total_invest(self):
+        return from_cents(self.invest_cents)
+
+    @property
+    def total_income(self):
+        return from_cents(self._metrics()[0])
+
+    @property
+    def total_expense(self):
+        return from_cents(self._metrics()[1])
+
+    @property
+    def cash_flow(self):
+        return from_cents(self._metrics()[2])
+
+    @property
+    def annual_cash_flow(self):
+        return from_cents(self._metrics()[3])
+
+    @property
+    def roi(self):
+        return from_cents(self._metrics()[4])
+
+    @property
+    def incomes(self):
+        start, count = self._items()
+        return self._line_items(Income, start, start + count)
+
+    @property
+    def expenses(self):
+        start, count = self._items()
+        return self._line_items(Expense, start + count, self._end())
+
+    """Build a full Investment from the view.
+
+    Keyword arguments:
+    None
+    Return: Investment with the same name, line items and total_invest.
+    """
+
+    def to_investment(self):
+        investment = Investment(self.name, self.incomes, self.expenses)
+        investment.set_total_invest(self.total_invest)
+        return investment
+
+    def _metrics(self):
+        snapshot = self._snapshot
+        row = self._row
+        return derive_metrics(
+            snapshot.income_cents[row],
+            snapshot.expense_cents[row],
+            snapshot.income_counts[row],
+            snapshot.invest_cents[row],
+        )
+
+    def _items(self):
+        snapshot = self._snapshot
+        return snapshot.item_offsets[self._row], snapshot.income_counts[self._row]
+
+    def _end(self):
+        return self._snapshot.item_offsets[self._row + 1]
+
+    def _line_items(self, item_class, start, stop):
+        snapshot = self._snapshot
+        return [
+            item_class.from_cents(
+                snapshot.string(snapshot.item_names[item]), snapshot.item_cents[item]
+            )
+            for item in range(start, stop)
+        ]
@@ -0,0 +1,305 @@
+import sqlite3
+from functools import partial
+from itertools import groupby
+
+from roi.money import from_cents
+from roi.roi import Expense, Income, Investment, User, UserRegistry
+
+INCOME = 0
+EXPENSE = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    next_investment_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS investments (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    -- the id of the investment in its User's collection, which follows insertion order
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    invest_cents INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS investments_user_name ON investments (user_id, name_key);
+CREATE TABLE IF NOT EXISTS line_items (
+    investment_id INTEGER NOT NULL REFERENCES investments (id),
+    kind INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    cents INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS line_items_investment ON line_items (investment_id);
+"""
+
+
+class Storage:
+    """Interface for persisting Users with their Investments, Incomes and Expenses.
+
+    Backends implement save_users, load_users, load_investments and delete_user.
+
+    Keyword arguments:
+    None
+    Return: None
+    """
+
+    """Save Users and all of their investments, replacing what was stored for them.
+
+    Keyword arguments:
+    users -- Iterable of User objects.
+    Return: None
+    """
+
+    def save_users(self, users):
+        raise NotImplementedError
+
+    """Load every stored User into a registry.
+
+    Keyword arguments:
+    registry -- UserRegistry to load the Users into, a new one by default.
+    lazy -- When True, a User's investments are only loaded on first access.
+    Return: The UserRegistry.
+    """
+
+    def load_users(self, registry=None, lazy=True):
+        raise NotImplementedError
+
+    """Load the investments of a single user.
+
+    Keyword arguments:
+    username -- Username of the User.
+    Return: List of Investment objects in the order they were saved.
+    """
+
+    def load_investments(self, username):
+        raise NotImplementedError
+
+    """Delete a User and all of their investments.
+
+    Keyword arguments:
+    username -- Username of the User.
+    Return: None
+    """
+
+    def delete_user(self, username):
+        raise NotImplementedError
+
+    def save_user(self, user):
+        self.save_users([user])
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SQLiteStorage(Storage):
+    """Storage backend on a SQLite database.
+
+    Saves run in a single transaction with executemany inserts, and investments are indexed by
+    user and lowercase name. Investments keep their ids in their User's collection.
+
+    Keyword arguments:
+    path -- Path of the database file, ":memory:" for an in-memory database.
+    Return: None
+    """
+
+    def __init__(self, path=":memory:") -> None:
+        self.connection = sqlite3.connect(path)
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+        columns = [
+            row[1] for row in self.connection.execute("PRAGMA table_info(users)")
+        ]
+        if "next_investment_id" not in columns:
+            # databases written before ids were kept number investments from 0 in order
+            self.connection.execute(
+                "ALTER TABLE users "
+                "ADD COLUMN next_investment_id INTEGER NOT NULL DEFAULT 0"
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def save_users(self, users):
+        with self.connection:
+            cursor = self.connection.cursor()
+            (next_id,) = cursor.execute(
+                "SELECT COALESCE(MAX(id), 0) + 1 FROM investments"
+            ).fetchone()
+            investment_rows = []
+            line_item_rows = []
+            for user in users:
+                collection = user.investments
+                with user.lock:
+                    investments = collection.snapshot()
+                    ids = [collection.id_of(investment) for investment in investments]
+                    next_investment_id = collection.next_id
+                user_id = self._replace_user(cursor, user.username, next_investment_id)
+                for position, investment in zip(ids, investments):
+                    investment_rows.append(
+                        (
+                            next_id,
+                            user_id,
+                            position,
+                            investment.name,
+                            investment.name.lower(),
+                            investment.invest_cents,
+                        )
+                    )
+                    _add_line_items(line_item_rows, next_id, INCOME, investment.incomes)
+                    _add_line_items(
+                        line_item_rows, next_id, EXPENSE, investment.expenses
+                    )
+                    next_id += 1
+            cursor.executemany(
+                "INSERT INTO investments VALUES (?, ?, ?, ?, ?, ?)", investment_rows
+            )
+            cursor.executemany(
+                "INSERT INTO line_items VALUES (?, ?, ?, ?, ?)", line_item_rows
+            )
+
+    def _replace_user(self, cursor, username, next_investment_id=0):
+        cursor.execute(
+            "INSERT OR IGNORE INTO users (username) VALUES (?)",
+            (username,),
+        )
+        cursor.execute(
+            "UPDATE users SET next_investment_id = ? WHERE username = ?",
+            (next_investment_id, username),
+        )
+        (user_id,) = cursor.execute(
+            "SELECT id FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        cursor.execute(
+            "DELETE FROM line_items WHERE investment_id IN "
+            "(SELECT id FROM investments WHERE user_id = ?)",
+            (user_id,),
+        )
+        cursor.execute("DELETE FROM investments WHERE user_id = ?", (user_id,))
+        return user_id
+
+    def load_users(self, registry=None, lazy=True):
+        if registry is None:
+            registry = UserRegistry()
+        users = self.connection.execute(
+            "SELECT id, username, next_investment_id FROM users ORDER BY id"
+        )
+        if lazy:
+            for _, username, next_investment_id in users.fetchall():
+                User(
+                    username,
+                    registry=registry,
+                    investment_loader=partial(self._load_saved, username),
+                    next_investment_id=next_investment_id,
+                )
+            return registry
+
+        investments = self._build_investments(
+            "SELECT id, user_id, position, name, invest_cents FROM investments "
+            "ORDER BY id",
+            "SELECT investment_id, kind, name, cents FROM line_items "
+            "ORDER BY investment_id, kind, position",
+            (),
+        )
+        by_user = {
+            user_id: [(position, investment) for _, position, investment in group]
+            for user_id, group in groupby(investments, key=lambda row: row[0])
+        }
+        for user_id, username, next_investment_id in users.fetchall():
+            User(
+                username,
+                by_user.get(user_id),
+                registry=registry,
+                next_investment_id=next_investment_id,
+            )
+        return registry
+
+    def load_investments(self, username):
+        return [investment for _, investment in self._load_saved(username)]
+
+    def _load_saved(self, username):
+        # (id, Investment) pairs of a User's investments
+        investments = self._build_investments(
+            "SELECT i.id, i.user_id, i.position, i.name, i.invest_cents "
+            "FROM investments i "
+            "JOIN users u ON i.user_id = u.id WHERE u.username = ? "
+            "ORDER BY i.id",
+            "SELECT l.investment_id, l.kind, l.name, l.cents FROM line_items l "
+            "JOIN investments i ON l.investment_id = i.id "
+            "JOIN users u ON i.user_id = u.id WHERE u.username = ? "
+            "ORDER BY l.investment_id, l.kind, l.position",
+            (username.lower(),),
+        )
+        return [(position, investment) for _, position, investment in investments]
+
+    """Load a single investment by name.
+
+    Keyword arguments:
+    username -- Username of the User.
+    name -- Name of the Investment, in any case.
+    Return: The first Investment saved with that name, or None.
+    """
+
+    def load_investment(self, username, name):
+        investments = self._build_investments(
+            "SELECT i.id, i.user_id, i.position, i.name, i.invest_cents "
+            "FROM investments i JOIN users u ON i.user_id = u.id "
+            "WHERE u.username = ? AND i.name_key = ? ORDER BY i.position LIMIT 1",
+            "SELECT investment_id, kind, name, cents FROM line_items "
+            "WHERE investment_id = (SELECT i.id FROM investments i "
+            "JOIN users u ON i.user_id = u.id "
+            "WHERE u.username = ? AND i.name_key = ? ORDER BY i.position LIMIT 1) "
+            "ORDER BY kind, position",
+            (username.lower(), name.lower()),
+        )
+        for _, _, investment in investments:
+            return investment
+        return None
+
+    def delete_user(self, username):
+        with self.connection:
+            cursor = self.connection.cursor()
+            user_id = self._replace_user(cursor, username.lower())
+            cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+
+    def _build_investments(self, investment_query, line_item_query, params):
+        # both queries are ordered by investment id, so line items are merged in one pass
+        line_items = groupby(
+            self.connection.execute(line_item_query, params),
+            key=lambda row: row[0],
+        )
+        current_id, current_items = next(line_items, (None, ()))
+        for (
+            investment_id,
+            user_id,
+            position,
+            name,
+            invest_cents,
+        ) in self.connection.execute(investment_query, params):
+            incomes = []
+            expenses = []
+            while current_id is not None and current_id < investment_id:
+                current_id, current_items = next(line_items, (None, ()))
+            if investment_id == current_id:
+                for _, kind, item_name, cents in current_items:
+                    if kind == INCOME:
+                        incomes.append(Income.from_cents(item_name, cents))
+                    else:
+                        expenses.append(Expense.from_cents(item_name, cents))
+                current_id, current_items = next(line_items, (None, ()))
+            investment = Investment(name, incomes, expenses, from_cents(invest_cents))
+            yield user_id, position, investment
+
+
+def _add_line_items(rows, investment_id, kind, items):
+    for position, item in enumerate(items):
+        rows.append((investment_id, kind, position, item.name, item.cents))
@@ -0,0 +1,308 @@
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from roi.roi import (
+    Expense,
+    Income,
+    Investment,
+    InvestmentCollection,
+    User,
+    UserRegistry,
+)
+from roi.server import OPERATIONS, RequestError
+
+# share of each operation in a generated session, the menu of roi_calc.py
+MIX = {
+    "choose_user": 0.05,
+    "create_investment": 0.30,
+    "view_investment": 0.40,
+    "edit_investment": 0.15,
+    "delete_investment": 0.10,
+}
+PERCENTILES = (50, 90, 99, 99.9)
+INCOME_NAMES = ("Rent", "Parking", "Laundry", "Storage")
+EXPENSE_NAMES = ("Taxes", "Insurance", "Repairs", "Utilities", "Management")
+
+
+def generate(operations, users=100, mix=None, seed=0, items=3):
+    """Generate a scripted session of calculator operations.
+
+    Requests are dicts in the format roi.server speaks, so a script can also be replayed
+    against a server. The generator follows which investments each user has, so views, edits
+    and deletes name an investment that exists, and a user's first request is choose_user.
+    An operation that needs an investment on a user without one becomes create_investment.
+
+    Keyword arguments:
+    operations -- Number of requests.
+    users -- Number of distinct users.
+    mix -- Dict of operation name to its relative share, MIX if None.
+    seed -- Seed of the random choices, the same seed gives the same script.
+    items -- Most incomes and expenses of a created investment.
+    Return: Iterator of request dicts.
+    Raises ValueError for an operation the calculator does not have.
+    """
+    mix = MIX if mix is None else mix
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"unknown operations: {', '.join(sorted(unknown))}")
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    # username -> list of the names of its investments
+    owned = {}
+    created = 0
+    for number in range(operations):
+        username = f"user{rng.randrange(users)}"
+        if username not in owned:
+            owned[username] = []
+            yield {"id": number, "op": "choose_user", "user": username}
+            continue
+        op = rng.choices(names, weights)[0]
+        investments = owned[username]
+        if op in ("view_investment", "edit_investment", "delete_investment"):
+            if not investments:
+                op = "create_investment"
+        request = {"id": number, "op": op, "user": username}
+        if op == "create_investment":
+            created += 1
+            request["name"] = f"Invest{created}"
+            request.update(_investment_fields(rng, items))
+            investments.append(request["name"])
+        elif op == "view_investment":
+            request["name"] = rng.choice(investments)
+        elif op == "edit_investment":
+            request["name"] = rng.choice(investments)
+            request.update(_investment_fields(rng, items))
+        elif op == "delete_investment":
+            request["name"] = investments.pop(rng.randrange(len(investments)))
+        yield request
+
+
+def _investment_fields(rng, items):
+    return {
+        "incomes": [
+            {"name": rng.choice(INCOME_NAMES), "amount": rng.randint(100, 3000)}
+            for _ in range(rng.randint(1, items))
+        ],
+        "expenses": [
+            {
+                "name": rng.choice(EXPENSE_NAMES),
+                "amount": f"{rng.randint(0, 80000) / 100}",
+            }
+            for _ in range(rng.randint(0, items))
+        ],
+        "total_invest": rng.randint(10000, 500000),
+    }
+
+
+def write_script(path, requests):
+    with open(path, "w") as file:
+        for request in requests:
+            file.write(json.dumps(request) + "\n")
+
+
+def read_script(path):
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class WorkloadResult:
+    """Throughput, latency and memory of a replayed session.
+
+    Keyword arguments:
+    registry -- UserRegistry the session ran against.
+    Return: None
+    """
+
+    def __init__(self, registry) -> None:
+        self.registry = registry
+        self.operations = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        # op -> list of latencies in nanoseconds
+        self.latencies = {}
+        # current and peak bytes traced by tracemalloc, None unless memory was traced
+        self.traced = None
+        self.peak = None
+        # list of (file:line, bytes, allocations) of the largest allocation sites
+        self.top_allocations = []
+
+    @property
+    def ops_per_second(self):
+        return self.operations / self.elapsed if self.elapsed else 0.0
+
+    """Get latency percentiles, per operation and over every operation.
+
+    Keyword arguments:
+    None
+    Return: Dict of op, and "all", to a dict of count, mean, p50, p90, p99, p99.9 and max in
+    microseconds.
+    """
+
+    def percentiles(self):
+        summary = {}
+        everything = []
+        for op in sorted(self.latencies):
+            summary[op] = _percentiles(self.latencies[op])
+            everything.extend(self.latencies[op])
+        summary["all"] = _percentiles(everything)
+        return summary
+
+    def to_dict(self):
+        return {
+            "operations": self.operations,
+            "errors": self.errors,
+            "elapsed": self.elapsed,
+            "ops_per_second": self.ops_per_second,
+            "latency_us": self.percentiles(),
+            "traced_bytes": self.traced,
+            "peak_bytes": self.peak,
+            "top_allocations": self.top_allocations,
+            "memory_by_type": memory_by_type(self.registry),
+        }
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+    summary = {"count": len(ordered), "mean": sum(ordered) / len(ordered) / 1000}
+    for percentile in PERCENTILES:
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        summary[f"p{percentile:g}"] = ordered[index] / 1000
+    summary["max"] = ordered[-1] / 1000
+    return summary
+
+
+def replay(requests, registry=None, trace_memory=False, top=10):
+    """Run requests against the roi API in this process and measure them.
+
+    Each request goes straight to the roi.server handler for its op, which calls User and
+    Investment the way the interactive calculator does, without input(), the network or the
+    event loop. Requests that fail are counted as errors, and their latency is still recorded.
+
+    Keyword arguments:
+    requests -- Iterable of request dicts, e.g. from generate or read_script. Pass a list to
+    keep generating or reading them out of the elapsed time.
+    registry -- UserRegistry to run against, a new one if None.
+    trace_memory -- Trace allocations with tracemalloc for the peak and the largest allocation
+    sites. Tracing slows every allocation, so a traced run records no latencies.
+    top -- Number of allocation sites to keep.
+    Return: WorkloadResult.
+    """
+    if registry is None:
+        registry = UserRegistry()
+    result = WorkloadResult(registry)
+    if trace_memory:
+        tracemalloc.start()
+    clock = time.perf_counter_ns
+    started = clock()
+    try:
+        for request in requests:
+            op = request["op"]
+            handler = OPERATIONS[op]
+            began = clock()
+            try:
+                user = None
+                if op != "choose_user":
+                    user = registry.get(request["user"])
+                    if user is None:
+                        raise RequestError(f"unknown user {request['user']!r}")
+                handler(registry, user, request)
+            except (RequestError, ArithmeticError, ValueError):
+                result.errors += 1
+            result.operations += 1
+            if trace_memory:
+                continue
+            latencies = result.latencies.get(op)
+            if latencies is None:
+                latencies = result.latencies[op] = []
+            latencies.append(clock() - began)
+        result.elapsed = (clock() - started) / 1e9
+        if trace_memory:
+            result.traced, result.peak = tracemalloc.get_traced_memory()
+            # leave out the harness, so only the roi package's allocations are ranked
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, __file__),)
+            )
+            statistics = snapshot.statistics("lineno")
+            result.top_allocations = [
+                (
+                    f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    stat.size,
+                    stat.count,
+                )
+                for stat in statistics[:top]
+            ]
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result
+
+
+def memory_by_type(registry):
+    """Measure the memory held by the Users, Investments and line items of a registry.
+
+    An object's size is its own, its attribute dict's and that of the lists, dicts and tuples its
+    attributes hold directly, as sys.getsizeof gives them. Names and amounts are left out, since
+    they are often shared between objects.
+
+    Keyword arguments:
+    registry -- UserRegistry.
+    Return: Dict of type name to a dict of the count of objects and their bytes.
+    """
+    sizes = {
+        cls.__name__: {"count": 0, "bytes": 0}
+        for cls in (User, InvestmentCollection, Investment, Income, Expense)
+    }
+    seen = set()
+
+    def add(obj):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        entry = sizes[type(obj).__name__]
+        entry["count"] += 1
+        entry["bytes"] += _size(obj)
+
+    for user in registry.snapshot().values():
+        add(user)
+        if not user.investments_loaded():
+            continue
+        add(user.investments)
+        for investment in user.investments.snapshot():
+            add(investment)
+            for item in investment.incomes + investment.expenses:
+                add(item)
+    return sizes
+
+
+def _size(obj):
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes)
+        values = attributes.values()
+    else:
+        # subclasses such as Income add no slots of their own, LineItem's hold the data
+        values = [
+            getattr(obj, name, None)
+            for cls in type(obj).__mro__
+            for name in getattr(cls, "__slots__", ())
+        ]
+    for value in values:
+        if isinstance(value, (list, dict, tuple)):
+            size += sys.getsizeof(value)
+            if isinstance(value, dict):
+                # e.g. the per-name dicts of an InvestmentCollection's name index
+                size += sum(
+                    sys.getsizeof(inner)
+                    for inner in value.values()
+                    if isinstance(inner, dict)
+                )
+    return size
@@ -1,6 +1,47 @@
 from roi.roi import User, Income, Expense, Investment, UserAlreadyExistsError
+from roi.roi import InvestmentCollection, UserRegistry
+from roi.frame import InvestmentFrame, METRICS
+from roi.lineitems import LineItemArray
+from roi.catalog import LineItemCatalog
+from roi.rollup import PortfolioRollup
+from roi.allocate import allocate
+from roi.workload import generate, memory_by_type, read_script, replay
+from roi.workload import write_script
+from roi.money import Money, format_cents, from_cents, to_cents
+from roi.storage import SQLiteStorage
+from roi.snapshot import Snapshot, write_snapshot
+from roi.history import History, investment_key
+from roi.report import write_report, write_user_reports
+from roi.journal import Journal
+from roi.evaluate import evaluate
+from roi.__main__ import main as roi_main
+from roi.cache import MetricsCache
+from roi.server import ROIServer
+from roi.query import InvestmentIndex
+from roi import instrument
+from roi.importer import import_file, RowError
+from roi.batch import batch_evaluate
+from roi.projection import Assumptions, irr, project
+from roi.scenarios import Normal, Uniform, sweep
+from roi.repl import view_investment
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import random
+import subprocess
+import sys
+import weakref
 import unittest
-from decimal import Decimal
+from unittest import mock
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import combinations
 
 incomes = [
     Income("income1", Decimal("1200.00")),
@@ -39,8 +80,54 @@ class TestUser(unittest.TestCase):
         uname = user3.get_username()
         self.assertEqual(uname, user3.username)
         self.assertEqual(uname, "tony")
-        self.assertEqual(len(User.all_users), 3)
+        # the duplicate MattDubbz is rejected by the registry
+        self.assertEqual(len(User.all_users), 2)
         self.assertIs(User.all_users[uname], user3)
+        self.assertIs(User.all_users["TONY"], user3)
+
+    def test_registry(self):
+        registry = UserRegistry()
+        user = User("Alice", registry=registry)
+        self.assertNotIn("alice", User.all_users)
+        self.assertIn("ALICE", registry)
+        self.assertIs(registry.get("aLiCe"), user)
+        self.assertEqual(list(registry.usernames), ["alice"])
+        with self.assertRaises(UserAlreadyExistsError):
+            registry.register(User("alice", registry=UserRegistry()))
+        self.assertIs(registry.unregister("Alice"), user)
+        self.assertEqual(len(registry), 0)
+        self.assertIsNone(registry.get("alice"))
+
+    def test_investment_lookup(self):
+        user = User("Lookup", registry=UserRegistry())
+        invest1 = Investment("Duplex")
+        invest2 = Investment("Condo")
+        id1 = user.add_investment(invest1)
+        id2 = user.add_investment(invest2)
+        self.assertNotEqual(id1, id2)
+        self.assertEqual(user.add_investment(invest1), id1)
+        self.assertIs(user.get_investment("duplex"), invest1)
+        self.assertIs(user.investments.get_by_id(id2), invest2)
+        invest1.set_name("Triplex")
+        self.assertIsNone(user.get_investment("Duplex"))
+        self.assertIs(user.get_investment("Triplex"), invest1)
+        self.assertIs(user.remove_investment("Triplex"), invest1)
+        self.assertIsNone(user.remove_investment(invest1))
+        self.assertEqual(list(user.investments), [invest2])
+        invest3 = Investment("Duplex")
+        self.assertEqual(user.add_investment(invest3), id2 + 1)
+        self.assertEqual(list(user.investments), [invest2, invest3])
+
+    def test_shared_investment(self):
+        invest = Investment("Shared")
+        first = InvestmentCollection([invest])
+        second = InvestmentCollection([invest])
+        invest.set_name("Renamed")
+        self.assertIs(first.get("renamed"), invest)
+        self.assertIs(second.get("renamed"), invest)
+        first.remove(invest)
+        self.assertNotIn(invest, first)
+        self.assertIn(invest, second)
 
 
 class TestIncome(unittest.TestCase):
@@ -75,6 +162,112 @@ class TestExpense(unittest.TestCase):
         self.assertNotIsInstance(expense3.get_amount(), int)
 
 
+class TestLineItems(unittest.TestCase):
+    def test_compact_line_items(self):
+        income = Income("Rent", "1200.005")
+        self.assertFalse(hasattr(income, "__dict__"))
+        self.assertEqual(income.cents, 120000)
+        self.assertEqual(Income.from_cents("Rent", 120000).get_amount(), income.amount)
+        invest = Investment("Invest1", [income], [], "1000")
+        income.amount = "1300"
+        self.assertEqual(invest.total_income, Decimal("1300.00"))
+
+    def test_line_item_array(self):
+        line_items = LineItemArray.from_items(expenses, Expense)
+        line_items.append("Expense4", "0.015")
+        self.assertEqual(len(line_items), 4)
+        self.assertEqual(line_items.total(), Decimal("450.17"))
+        self.assertIsInstance(line_items[3], Expense)
+        self.assertEqual(line_items[3].get_amount(), Decimal("0.02"))
+        self.assertEqual([e.name for e in line_items][:3], [e.name for e in expenses])
+
+
+def random_amount(rng):
+    # mostly plain decimals, with ties, long fractions, signs, spaces and invalid input
+    whole = "".join(rng.choice("0123456789") for _ in range(rng.randint(0, 24)))
+    fraction = "".join(rng.choice("0123456789") for _ in range(rng.randint(0, 6)))
+    if rng.random() < 0.3:
+        fraction = fraction[:2] + "5" + "0" * rng.randint(0, 3)
+    text = rng.choice(["", "-", "+"]) + whole
+    if fraction or rng.random() < 0.2:
+        text += "." + fraction
+    if rng.random() < 0.05:
+        text += rng.choice(["e3", "x", "_1", ".5", "E-2", " ", "_", "."])
+    if rng.random() < 0.05:
+        position = rng.randint(0, len(text))
+        text = text[:position] + rng.choice(" _+-.٥²") + text[position:]
+    return rng.choice(["", " ", "\n"]) + text + rng.choice(["", " "])
+
+
+class TestMoney(unittest.TestCase):
+    def decimal_cents(self, amount, rounding=None):
+        try:
+            value = Decimal(amount).quantize(Decimal("1.00"), rounding=rounding)
+            return int(value.scaleb(2))
+        except (InvalidOperation, ValueError) as e:
+            return type(e)
+
+    def money_cents(self, amount, rounding="ROUND_HALF_EVEN"):
+        try:
+            return to_cents(amount, rounding)
+        except (InvalidOperation, ValueError) as e:
+            return type(e)
+
+    def test_parsing_matches_decimal(self):
+        rng = random.Random(16)
+        for _ in range(20000):
+            amount = random_amount(rng)
+            self.assertEqual(
+                self.money_cents(amount), self.decimal_cents(amount), amount
+            )
+            self.assertEqual(
+                self.money_cents(amount, ROUND_HALF_UP),
+                self.decimal_cents(amount, ROUND_HALF_UP),
+                amount,
+            )
+        for amount in ("1.005", "1.015", "-2.125", "NaN", "1e2", 7, 1.005, "", "."):
+            self.assertEqual(self.money_cents(amount), self.decimal_cents(amount))
+
+    def test_line_items_match_decimal(self):
+        rng = random.Random(61)
+        for _ in range(2000):
+            amounts = [
+                f"{rng.uniform(-5000, 5000):.{rng.randint(0, 4)}f}" for _ in range(4)
+            ]
+            total_invest = f"{rng.uniform(1, 10**6):.3f}"
+            invest = Investment(
+                "Invest",
+                [Income("Rent", a) for a in amounts[:2]],
+                [Expense("Tax", a) for a in amounts[2:]],
+                total_invest,
+            )
+            quantized = [Decimal(a).quantize(Decimal("1.00")) for a in amounts]
+            cash_flow = quantized[0] + quantized[1] - quantized[2] - quantized[3]
+            annual = cash_flow * 12
+            roi = Decimal("0")
+            if annual > 0:
+                roi = (
+                    annual / Decimal(total_invest).quantize(Decimal("1.00"))
+                ).quantize(Decimal("1.00"))
+            self.assertEqual(str(invest.cash_flow), str(cash_flow))
+            self.assertEqual(str(invest.annual_cash_flow), str(annual))
+            self.assertEqual(str(invest.roi), str(roi))
+
+    def test_arithmetic(self):
+        rent = Money("1200.50")
+        self.assertEqual(rent + Money("0.25") - Money("0.75"), Money("1200.00"))
+        self.assertEqual(sum([rent, rent]), Money("2401.00"))
+        self.assertEqual(rent * 3, Decimal("3601.50"))
+        self.assertEqual(rent.scale("1.035"), Money("1242.52"))
+        self.assertEqual(Money("0.05").scale("0.5", ROUND_HALF_UP), Money("0.03"))
+        self.assertEqual(Money("0.05").scale("0.5"), Money("0.02"))
+        self.assertEqual(Money("100").divide(3), Money("33.33"))
+        self.assertEqual(Money("18000").divide(Money("100000")), Decimal("0.18"))
+        self.assertEqual(str(Money("-1.005", ROUND_HALF_UP)), "-1.01")
+        self.assertEqual(len({Money("1"), Decimal("1.00")}), 1)
+        self.assertEqual(Income("Rent", "10.10").money, Money("10.10"))
+
+
 class TestInvestment(unittest.TestCase):
     def test_create_investment(self):
         invest1 = Investment("Invest1", incomes, expenses, Decimal("155000"))
@@ -104,5 +297,1752 @@ class TestInvestment(unittest.TestCase):
         self.assertEqual(invest4.get_total_invest(), invest4.total_invest)
 
 
+class TestInvestmentEdits(unittest.TestCase):
+    def test_line_item_edits(self):
+        rent = Income("Rent", "2000")
+        invest = Investment("Duplex", [rent], [Expense("Taxes", "300")], "24000")
+        self.assertEqual(invest.cash_flow, Decimal("1700.00"))
+        self.assertEqual(invest.roi, Decimal("0.85"))
+        invest.add_income(Income("Parking", "100"))
+        invest.add_expense(Expense("Insurance", "200.005"))
+        self.assertEqual(invest.total_income, Decimal("2100.00"))
+        self.assertEqual(invest.total_expense, Decimal("500.00"))
+        self.assertEqual(invest.annual_cash_flow, Decimal("19200.00"))
+        self.assertEqual(invest.roi, Decimal("0.80"))
+        invest.update_income("Rent", "2500")
+        self.assertIs(invest.incomes[0], rent)
+        self.assertEqual(invest.total_income, Decimal("2600.00"))
+        invest.remove_expense("Taxes")
+        invest.remove_income(rent)
+        self.assertEqual(len(invest.incomes), 1)
+        self.assertEqual(invest.total_expense, Decimal("200.00"))
+        self.assertEqual(invest.cash_flow, Decimal("-100.00"))
+        self.assertEqual(invest.roi, Decimal("0"))
+        rent.set_amount("5000")
+        self.assertEqual(invest.total_income, Decimal("100.00"))
+        with self.assertRaises(KeyError):
+            invest.update_expense("Taxes", "1")
+
+    def test_set_amount_notifies_investments(self):
+        shared = Income("Rent", "1000")
+        invest1 = Investment("Invest1", [shared], [], "12000")
+        invest2 = Investment("Invest2", [shared, shared], [], "12000")
+        shared.set_amount("2000")
+        self.assertEqual(invest1.total_income, Decimal("2000.00"))
+        self.assertEqual(invest1.roi, Decimal("2.00"))
+        self.assertEqual(invest2.total_income, Decimal("4000.00"))
+        invest1.set_incomes([Income("Other", "10")])
+        shared.set_amount("1")
+        self.assertEqual(invest1.total_income, Decimal("10.00"))
+        self.assertEqual(invest2.total_income, Decimal("2.00"))
+        # items do not keep the investments that held them alive
+        invest_ref = weakref.ref(invest2)
+        del invest2
+        self.assertIsNone(invest_ref())
+        shared.set_amount("3")
+
+    def test_set_total_invest(self):
+        invest = Investment("Invest1", incomes, expenses, Decimal("155000"))
+        self.assertEqual(invest.roi, Decimal("1.30"))
+        invest.set_total_invest("77500")
+        self.assertEqual(invest.roi, Decimal("2.59"))
+
+
+class TestLineItemCatalog(unittest.TestCase):
+    def scan(self, registry, name, item_class):
+        items = [
+            item
+            for user in registry.users()
+            for investment in user.investments
+            for item in (
+                investment.incomes if item_class is Income else investment.expenses
+            )
+            if item.name == name
+        ]
+        return len(items), sum((item.amount for item in items), Decimal("0"))
+
+    def test_shared_items(self):
+        catalog = LineItemCatalog()
+        taxes = catalog.item(Expense, "Taxes", "300")
+        self.assertIs(catalog.item(Expense, "Taxes", "300.00"), taxes)
+        self.assertIsNot(catalog.item(Income, "Taxes", "300"), taxes)
+        self.assertIs(catalog.intern(Expense("Taxes", "300")), taxes)
+        self.assertIs(taxes.name, sys.intern("Taxes"))
+        self.assertEqual(len(catalog), 2)
+        self.assertTrue(taxes.is_shared())
+        with self.assertRaises(TypeError):
+            taxes.set_amount("1")
+        with self.assertRaises(TypeError):
+            taxes.amount = "1"
+        with self.assertRaises(TypeError):
+            taxes.set_name("Tax")
+
+    def test_copy_on_write(self):
+        catalog = LineItemCatalog()
+        taxes = catalog.item(Expense, "Taxes", "300")
+        rent = catalog.item(Income, "Rent", "2000")
+        invest1 = Investment("Invest1", [rent], [taxes], "24000")
+        invest2 = Investment("Invest2", [rent], [taxes], "24000")
+        private = invest1.update_expense("Taxes", "500")
+        self.assertIsNot(private, taxes)
+        self.assertFalse(private.is_shared())
+        self.assertEqual(taxes.amount, Decimal("300.00"))
+        self.assertEqual(invest1.total_expense, Decimal("500.00"))
+        self.assertEqual(invest1.roi, Decimal("0.75"))
+        self.assertEqual(invest2.total_expense, Decimal("300.00"))
+        self.assertEqual(invest2.roi, Decimal("0.85"))
+        private.set_amount("1000")
+        self.assertEqual(invest1.cash_flow, Decimal("1000.00"))
+        invest2.remove_income(rent)
+        self.assertEqual(invest1.total_income, Decimal("2000.00"))
+
+    def test_intern_investments(self):
+        shared = [
+            Investment(invest.name, incomes, expenses, invest.total_invest)
+            for invest in investments
+        ]
+        catalog = LineItemCatalog()
+        self.assertEqual(catalog.intern_investments(shared), 18)
+        self.assertEqual(catalog.intern_investments(shared), 0)
+        self.assertEqual(len(catalog), 6)
+        self.assertIs(shared[0].incomes[1], shared[2].incomes[1])
+        for invest, original in zip(shared, investments):
+            self.assertEqual(invest.roi, original.roi)
+        # editing one investment no longer changes the others
+        shared[0].update_income("Income2", "1")
+        self.assertEqual(shared[1].roi, investments[1].roi)
+
+    def test_totals(self):
+        registry = UserRegistry()
+        catalog = LineItemCatalog()
+        catalog.watch_registry(registry)
+        rng = random.Random(8)
+        names = ["Rent", "Parking", "Taxes", "Insurance"]
+
+        def investment(i):
+            return Investment(
+                f"Invest{i}",
+                [catalog.item(Income, rng.choice(names[:2]), rng.randint(1, 5))],
+                [
+                    catalog.item(Expense, rng.choice(names[2:]), rng.randint(1, 5))
+                    for _ in range(rng.randint(0, 3))
+                ],
+            )
+
+        bob = User("bob", [investment(i) for i in range(50)], registry=registry)
+        alice = User("alice", registry=registry)
+        for i in range(30):
+            alice.add_investment(investment(i))
+        bob.remove_investment(bob.investments.get_by_id(3))
+        edited = bob.investments.get_by_id(4)
+        edited.add_expense(catalog.item(Expense, "Taxes", "2"))
+        edited.update_expense("Taxes", "1000")
+        alice.investments.get_by_id(5).set_expenses([Expense("Taxes", "7")])
+        alice.investments.get_by_id(6).add_expense(Expense("Hoa", "40"))
+        for item_class, name in [
+            (Income, "Rent"),
+            (Expense, "Taxes"),
+            (Expense, "Hoa"),
+        ]:
+            count, total = self.scan(registry, name, item_class)
+            self.assertEqual(catalog.count(name, item_class), count)
+            self.assertEqual(catalog.total(name, item_class), total)
+        self.assertEqual(catalog.totals(Expense)["Hoa"]["total"], Decimal("40.00"))
+        registry.unregister("alice")
+        self.assertEqual(catalog.count("Hoa"), 0)
+        self.assertEqual(
+            catalog.total("Taxes"), self.scan(registry, "Taxes", Expense)[1]
+        )
+        self.assertEqual(catalog.total("Nothing"), Decimal("0"))
+
+    def test_shared_investment(self):
+        registry = UserRegistry()
+        catalog = LineItemCatalog()
+        catalog.watch_registry(registry)
+        duplex = Investment("Duplex", [], [Expense("Taxes", "100")], "100000")
+        bob = User("bob", [duplex], registry=registry)
+        alice = User("alice", [duplex], registry=registry)
+        bob.remove_investment(duplex)
+        # alice still holds it
+        self.assertEqual(catalog.total("Taxes"), Decimal("100.00"))
+        duplex.update_expense("Taxes", "150")
+        self.assertEqual(catalog.count("Taxes"), 1)
+        self.assertEqual(catalog.total("Taxes"), Decimal("150.00"))
+        alice.remove_investment(duplex)
+        self.assertEqual(catalog.count("Taxes"), 0)
+
+    def test_import(self):
+        path = os.path.join(tempfile.mkdtemp(), "portfolio.csv")
+        with open(path, "w") as file:
+            file.write("user,investment,kind,name,amount,total_invest\n")
+            file.write("bob,Duplex,expense,Taxes,300,\n")
+            file.write("alice,Shed,expense,Taxes,300,\n")
+        catalog = LineItemCatalog()
+        registry = import_file(path, catalog=catalog).registry
+        self.assertIs(
+            registry["bob"].get_investment("Duplex").expenses[0],
+            registry["alice"].get_investment("Shed").expenses[0],
+        )
+
+
+class TestPortfolioRollup(unittest.TestCase):
+    def scan(self, invests):
+        invests = list(invests)
+        income = sum(investment.total_income for investment in invests)
+        expense = sum(investment.total_expense for investment in invests)
+        capital = sum(investment.total_invest for investment in invests)
+        weighted = sum(
+            investment.roi * investment.total_invest
+            for investment in invests
+            if investment.total_invest
+        )
+        return {
+            "investments": len(invests),
+            "total_income": income,
+            "total_expense": expense,
+            "cash_flow": income - expense,
+            "total_invest": capital,
+            "roi": (weighted / capital).quantize(Decimal("0.01")) if capital else 0,
+        }
+
+    def assertMatches(self, rollup, invests):
+        summary = rollup.summary()
+        expected = self.scan(invests)
+        for name in ("investments", "total_income", "total_expense", "cash_flow"):
+            self.assertEqual(summary[name], expected[name], name)
+        self.assertEqual(summary["total_invest"], expected["total_invest"])
+        self.assertEqual(summary["annual_cash_flow"], summary["cash_flow"] * 12)
+        # the rollup weighs the exact ROIs, the scan the rounded ones
+        self.assertAlmostEqual(summary["roi"], expected["roi"], delta=Decimal("0.01"))
+
+    def test_user_portfolio(self):
+        user = User("Portfolio", registry=UserRegistry())
+        duplex = Investment(
+            "Duplex", [Income("Rent", "2000")], [Expense("Taxes", "500")], "100000"
+        )
+        user.add_investment(duplex)
+        # expenses only count once an investment has an income
+        land = Investment("Land", [], [Expense("Taxes", "100")], "50000")
+        user.add_investment(land)
+        portfolio = user.portfolio
+        self.assertIs(user.portfolio, portfolio)
+        self.assertEqual(len(portfolio), 2)
+        self.assertEqual(portfolio.total_expense, Decimal("500"))
+        self.assertEqual(portfolio.annual_cash_flow, Decimal("18000"))
+        self.assertEqual(portfolio.total_invest, Decimal("150000"))
+        self.assertEqual(portfolio.roi, Decimal("0.12"))
+
+        land.add_income(Income("Lease", "300"))
+        self.assertEqual(portfolio.cash_flow, Decimal("1700"))
+        duplex.incomes[0].set_amount("2500")
+        duplex.set_total_invest("150000")
+        self.assertEqual(portfolio.total_income, Decimal("2800"))
+        user.remove_investment("Land")
+        self.assertMatches(portfolio, user.investments)
+        self.assertEqual(portfolio.roi, Decimal("0.16"))
+
+    def test_matches_scan(self):
+        rng = random.Random(22)
+        registry = UserRegistry()
+        catalog = LineItemCatalog()
+        for u in range(5):
+            User(f"user{u}", registry=registry)
+        portfolio = registry.portfolio
+        for step in range(400):
+            user = registry[f"user{rng.randrange(5)}"]
+            owned = list(user.investments)
+            action = rng.random()
+            if action < 0.4 or not owned:
+                user.add_investment(
+                    Investment(
+                        f"Invest{step}",
+                        [Income("Rent", rng.randint(0, 3000))] * rng.randint(0, 2),
+                        [catalog.item(Expense, "Taxes", str(rng.randint(0, 500)))],
+                        str(rng.choice([0, rng.randint(1000, 200000)])),
+                    )
+                )
+            elif action < 0.55:
+                user.remove_investment(rng.choice(owned))
+            elif action < 0.7:
+                rng.choice(owned).update_expense("Taxes", str(rng.randint(0, 900)))
+            elif action < 0.85:
+                rng.choice(owned).set_total_invest(str(rng.randint(0, 300000)))
+            else:
+                rng.choice(owned).set_incomes([Income("Rent", rng.randint(0, 4000))])
+        invests = [i for user in registry.users() for i in user.investments]
+        self.assertMatches(portfolio, invests)
+        for user in registry.users():
+            self.assertMatches(user.portfolio, user.investments)
+
+        late = User("Late", [investments[0]], registry=registry)
+        self.assertEqual(len(portfolio), len(invests) + 1)
+        registry.unregister("late")
+        self.assertMatches(portfolio, invests)
+        self.assertEqual(late.portfolio.total_invest, Decimal("155000"))
+
+    def test_shared_investment(self):
+        registry = UserRegistry()
+        duplex = Investment("Duplex", [Income("Rent", "2000")], [], "100000")
+        bob = User("bob", [duplex], registry=registry)
+        alice = User("alice", [duplex], registry=registry)
+        portfolio = registry.portfolio
+        self.assertEqual(len(portfolio), 1)
+        bob.remove_investment(duplex)
+        # alice still holds it
+        self.assertEqual(len(portfolio), 1)
+        duplex.set_total_invest("50000")
+        self.assertEqual(len(portfolio), 1)
+        self.assertEqual(portfolio.total_invest, Decimal("50000"))
+        alice.remove_investment(duplex)
+        duplex.set_total_invest("60000")
+        self.assertEqual(len(portfolio), 0)
+        self.assertEqual(portfolio.total_income, 0)
+
+    def test_collection(self):
+        collection = InvestmentCollection(investments)
+        rollup = PortfolioRollup(collection)
+        self.assertMatches(rollup, investments)
+        rollup.unwatch(collection)
+        self.assertEqual(rollup.summary()["investments"], 0)
+        self.assertEqual(rollup.total_income, 0)
+
+
+class TestConcurrentRegistry(unittest.TestCase):
+    def setUp(self):
+        # switch threads often so the races actually interleave
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.interval)
+
+    def run_threads(self, targets):
+        errors = []
+
+        def run(target):
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def test_get_or_create(self):
+        registry = UserRegistry()
+        barrier = threading.Barrier(8)
+        results = [[] for _ in range(8)]
+
+        def create(worker):
+            def target():
+                barrier.wait()
+                for i in range(200):
+                    results[worker].append(registry.get_or_create(f"User{i}"))
+
+            return target
+
+        self.run_threads([create(worker) for worker in range(8)])
+        self.assertEqual(len(registry), 200)
+        self.assertEqual(sum(created for run in results for _, created in run), 200)
+        for run in results:
+            for i, (user, _) in enumerate(run):
+                self.assertIs(user, registry[f"user{i}"])
+
+    def test_snapshot_reads_during_writes(self):
+        registry = UserRegistry()
+        users = [registry.get_or_create(f"user{i}")[0] for i in range(10)]
+        before = registry.snapshot()
+        stop = threading.Event()
+
+        def write(worker):
+            def target():
+                for i in range(300):
+                    user = users[(worker + i) % len(users)]
+                    investment = Investment(f"Invest{i}", [], [], 1000)
+                    user.add_investment(investment)
+                    if i % 3:
+                        user.remove_investment(investment)
+                    registry.get_or_create(f"writer{worker}-{i % 20}")
+
+            return target
+
+        def read():
+            while not stop.is_set():
+                for user in registry.snapshot().values():
+                    for investment in user.investments.snapshot():
+                        investment.roi
+
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        try:
+            self.run_threads([write(worker) for worker in range(4)])
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+
+        # each writer keeps every third of its 300 investments
+        self.assertEqual(sum(len(user.investments) for user in users), 4 * 100)
+        self.assertEqual(len(registry), 10 + 4 * 20)
+        self.assertEqual(len(before), 10)
+        self.assertEqual(len(registry.snapshot()), len(registry))
+        self.assertIs(registry.snapshot(), registry.snapshot())
+
+    def test_shared_indexes(self):
+        registry = UserRegistry()
+        users = [registry.get_or_create(f"user{i}")[0] for i in range(4)]
+        index = InvestmentIndex.from_registry(registry)
+        catalog = LineItemCatalog()
+        catalog.watch_registry(registry)
+        stop = threading.Event()
+
+        def write(user, seed):
+            def target():
+                for investment in random_investments(150, seed=seed):
+                    user.add_investment(investment)
+                    investment.add_income(Income("Parking", "50"))
+                    # keep the investments that had no other income
+                    if investment.incomes[0].name != "Parking":
+                        user.remove_investment(investment)
+
+            return target
+
+        def read():
+            while not stop.is_set():
+                index.top("cash_flow", 5)
+                index.by_user("roi")
+                catalog.totals(Income)
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for reader in readers:
+            reader.start()
+        try:
+            self.run_threads([write(user, seed) for seed, user in enumerate(users)])
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+
+        rebuilt = InvestmentIndex.from_registry(registry)
+        self.assertEqual(len(index), len(rebuilt))
+        for metric in ("cash_flow", "roi", "total_invest"):
+            self.assertEqual(index.summary(metric), rebuilt.summary(metric))
+            self.assertEqual(index.by_user(metric), rebuilt.by_user(metric))
+        recounted = LineItemCatalog()
+        recounted.watch_registry(registry)
+        self.assertEqual(catalog.totals(Income), recounted.totals(Income))
+        self.assertEqual(catalog.totals(Expense), recounted.totals(Expense))
+
+    def test_collection_snapshot(self):
+        user = User("Snap", registry=UserRegistry())
+        user.add_investment(investments[0])
+        snapshot = user.investments.snapshot()
+        self.assertIs(user.investments.snapshot(), snapshot)
+        user.add_investment(investments[1])
+        self.assertEqual(snapshot, (investments[0],))
+        self.assertEqual(user.investments.snapshot(), tuple(investments[:2]))
+        with user.lock:
+            user.remove_investment("Invest1")
+        self.assertEqual(user.investments.snapshot(), (investments[1],))
+
+
+class TestMetricsCache(unittest.TestCase):
+    def setUp(self):
+        self.rent = Income("Rent", "2000")
+        self.invest = Investment(
+            "Duplex", [self.rent], [Expense("Tax", "500")], "100000"
+        )
+
+    def test_hits_and_invalidation(self):
+        cache = MetricsCache()
+        self.assertEqual(cache.get(self.invest, "roi"), self.invest.roi)
+        self.assertEqual(cache.metrics(self.invest)["cash_flow"], Decimal("1500.00"))
+        # same amounts under other names share the entry
+        twin = Investment(
+            "Twin", [Income("Lease", "2000")], [Expense("Fee", "500")], "100000"
+        )
+        cache.metrics(twin)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        self.rent.set_amount("2500")
+        self.assertEqual(cache.get(self.invest, "roi"), self.invest.roi)
+        self.invest.set_total_invest("50000")
+        self.assertEqual(cache.get(self.invest, "roi"), self.invest.roi)
+        self.invest.set_expenses([])
+        self.assertEqual(cache.get(self.invest, "total_expense"), Decimal("0"))
+        self.assertEqual(cache.misses, 4)
+
+    def test_eviction_and_disk(self):
+        path = os.path.join(tempfile.mkdtemp(), "cache.db")
+        with MetricsCache(maxsize=2, path=path) as cache:
+            for total in ("1000", "2000", "3000"):
+                self.invest.set_total_invest(total)
+                cache.metrics(self.invest)
+            self.assertEqual(cache.stats()["evictions"], 1)
+            self.assertEqual(len(cache), 2)
+        with MetricsCache(path=path) as cache:
+            self.invest.set_total_invest("1000")
+            self.assertEqual(cache.get(self.invest, "roi"), self.invest.roi)
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+            self.assertEqual(cache.stats()["misses"], 0)
+
+
+class TestServer(unittest.TestCase):
+    async def exchange(self, port, requests):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        # every request is sent before any response is read
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in requests]
+        writer.close()
+        return responses
+
+    def test_operations(self):
+        async def run():
+            server = ROIServer(UserRegistry())
+            await server.start(port=0)
+            duplex = {"user": "Bob", "name": "duplex"}
+            responses = await self.exchange(
+                server.port,
+                [
+                    {"op": "choose_user", "user": "Bob", "id": 1},
+                    dict(
+                        duplex,
+                        op="create_investment",
+                        incomes=[{"name": "rent", "amount": "2000"}],
+                        expenses=[{"name": "tax", "amount": 500}],
+                        total_invest="100000",
+                    ),
+                    dict(duplex, op="edit_investment", total_invest="50000"),
+                    dict(duplex, op="view_investment"),
+                    dict(duplex, op="delete_investment"),
+                    dict(duplex, op="view_investment"),
+                    {"op": "view_investment", "user": "nobody", "name": "x"},
+                    dict(duplex, op="create_investment", total_invest="lots"),
+                ],
+            )
+            await server.close()
+            return server, responses
+
+        server, responses = asyncio.run(run())
+        self.assertEqual(responses[0]["id"], 1)
+        self.assertEqual(responses[0]["result"]["user"], "bob")
+        self.assertEqual(responses[1]["result"]["roi"], "0.18")
+        self.assertEqual(responses[3]["result"]["name"], "Duplex")
+        self.assertEqual(responses[3]["result"]["roi"], "0.36")
+        self.assertEqual(responses[3]["result"]["expenses"][0]["name"], "Tax")
+        self.assertEqual(responses[4]["result"], {"deleted": "Duplex"})
+        self.assertEqual([r["ok"] for r in responses[5:]], [False, False, False])
+        self.assertEqual(len(server.registry["bob"].investments), 0)
+
+    def test_concurrent_users(self):
+        async def run():
+            server = ROIServer(UserRegistry())
+            await server.start(port=0)
+            await self.exchange(server.port, [{"op": "choose_user", "user": "shared"}])
+            creates = [
+                [
+                    {
+                        "op": "create_investment",
+                        "user": "shared",
+                        "name": f"client{client} invest{i}",
+                    }
+                    for i in range(20)
+                ]
+                for client in range(10)
+            ]
+            await asyncio.gather(
+                *(self.exchange(server.port, requests) for requests in creates)
+            )
+            await server.close()
+            return server
+
+        server = asyncio.run(run())
+        self.assertEqual(len(server.registry["shared"].investments), 200)
+
+    def test_failed_commit(self):
+        directory = tempfile.mkdtemp()
+        journal = Journal(os.path.join(directory, "portfolio.journal"))
+        server = ROIServer(journal=journal)
+        request = {"op": "choose_user", "user": "bob"}
+        self.assertTrue(asyncio.run(server.handle_request(request))["ok"])
+        # the disk goes away under the journal
+        journal._file.close()
+        response = asyncio.run(
+            server.handle_request(
+                {"op": "create_investment", "user": "bob", "name": "duplex"}
+            )
+        )
+        self.assertFalse(response["ok"])
+        self.assertTrue(response["applied"])
+        self.assertEqual(response["result"]["name"], "Duplex")
+        self.assertIn("not journaled", response["error"])
+        self.assertEqual(len(server.registry["bob"].investments), 1)
+        # reads are not affected, and unknown users leave nothing behind
+        view = {"op": "view_investment", "user": "bob", "name": "duplex"}
+        self.assertTrue(asyncio.run(server.handle_request(view))["ok"])
+        unknown = dict(view, user="nobody")
+        self.assertFalse(asyncio.run(server.handle_request(unknown))["ok"])
+        self.assertNotIn("nobody", server.registry)
+
+
+class TestInvestmentIndex(unittest.TestCase):
+    def setUp(self):
+        self.registry = UserRegistry()
+        self.bob = User("Bob", registry=self.registry)
+        self.rent = Income("Rent", "2000")
+        self.duplex = Investment(
+            "Duplex", [self.rent], [Expense("Tax", "500")], "100000"
+        )
+        self.cabin = Investment("Cabin", [Income("Rent", "900")], [], "60000")
+        self.condo = Investment(
+            "Condo", [Income("Rent", "800")], [Expense("Hoa", "900")]
+        )
+        for investment in (self.duplex, self.cabin, self.condo):
+            self.bob.add_investment(investment)
+        self.index = InvestmentIndex.from_registry(self.registry)
+
+    def test_queries(self):
+        index = self.index
+        # roi is 0.18, 0.18 and 0
+        self.assertEqual(index.top("cash_flow", 2), [self.duplex, self.cabin])
+        self.assertEqual(index.bottom("cash_flow", 1), [self.condo])
+        self.assertEqual(index.top("roi", 0), [])
+        self.assertEqual(
+            index.range("cash_flow", high=0, inclusive=False), [self.condo]
+        )
+        self.assertEqual(len(index.range("roi", "0.05", "0.18")), 2)
+        self.assertEqual(index.count("roi", "0.05", "0.18", inclusive=False), 0)
+        summary = index.summary("cash_flow")
+        self.assertEqual(summary["total"], Decimal("2300"))
+        self.assertEqual(summary["min"], Decimal("-100"))
+        self.assertEqual(index.user_of(self.cabin), "bob")
+
+    def test_follows_changes(self):
+        index = self.index
+        self.rent.set_amount("500")
+        self.assertEqual(index.top("cash_flow", 1), [self.cabin])
+        self.cabin.set_total_invest("0")
+        self.assertEqual(index.count("roi"), 2)
+        self.bob.remove_investment(self.condo)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.bottom("cash_flow", 1), [self.duplex])
+
+        alice = User("Alice", [self.condo], registry=self.registry)
+        self.assertEqual(index.user_of(self.condo), "alice")
+        self.assertEqual(index.by_user("total_invest")["alice"]["count"], 1)
+        self.registry.unregister("bob")
+        self.assertEqual(index.top("cash_flow"), [self.condo])
+
+    def test_shared_investment(self):
+        index = self.index
+        alice = User("Alice", [self.duplex], registry=self.registry)
+        self.assertEqual(len(index), 3)
+        self.bob.remove_investment(self.duplex)
+        # alice still holds it, and it is hers now
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.user_of(self.duplex), "alice")
+        self.assertEqual(index.by_user("cash_flow")["bob"]["count"], 2)
+        self.rent.set_amount("5000")
+        self.assertEqual(index.top("cash_flow", 1), [self.duplex])
+        self.bob.add_investment(self.duplex)
+        index.unwatch(alice)
+        self.assertEqual(index.user_of(self.duplex), "bob")
+        self.bob.remove_investment(self.duplex)
+        self.assertNotIn(self.duplex, index)
+        self.assertEqual(len(index), 2)
+
+    def test_matches_sorting(self):
+        randoms = random_investments(300)
+        collection = InvestmentCollection(randoms)
+        index = InvestmentIndex()
+        index.watch(collection)
+        rng = random.Random(5)
+        for investment in rng.sample(randoms, 50):
+            investment.set_total_invest(str(rng.randint(1, 10**6)))
+        ranked = sorted(randoms, key=lambda investment: investment.roi)
+        self.assertEqual(
+            [investment.roi for investment in index.top("roi", 20)],
+            [investment.roi for investment in ranked[::-1][:20]],
+        )
+
+
+class TestInstrument(unittest.TestCase):
+    def test_counts_and_export(self):
+        original = Investment.__dict__["__init__"]
+        registry = UserRegistry()
+        with instrument.instrumented() as snapshot:
+            self.assertIsNot(Investment.__dict__["__init__"], original)
+            invest = Investment("Duplex", [Income("Rent", "2000")], [], "1000")
+            invest.set_total_invest("2000")
+            invest.roi
+            User("bob", registry=registry)
+            "BOB" in registry
+            stats = snapshot()
+        self.assertIs(Investment.__dict__["__init__"], original)
+        self.assertEqual(stats["investment.construct"]["count"], 1)
+        self.assertEqual(stats["line_item.parse"]["count"], 1)
+        self.assertEqual(stats["investment.roi"]["count"], 1)
+        self.assertEqual(stats["registry.contains"]["count"], 1)
+        self.assertEqual(invest.roi, Decimal("12.00"))
+        # nothing is recorded once disabled
+        Investment("Cabin")
+        self.assertEqual(instrument.snapshot()["investment.construct"]["count"], 1)
+        text = instrument.to_prometheus()
+        self.assertIn(
+            'roi_operation_calls_total{operation="registry.register"} 1', text
+        )
+        self.assertIn("# TYPE roi_operation_seconds_total counter", text)
+
+    def test_profiler(self):
+        path = os.path.join(tempfile.mkdtemp(), "profile.folded")
+        with instrument.profile(path, interval=0.0005):
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                Investment("Duplex", [Income("Rent", "2000")], [], "1000").roi
+        with open(path) as file:
+            lines = file.read().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertIn("test.py:test_profiler", stack)
+        self.assertGreater(int(count), 0)
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.storage = SQLiteStorage()
+        self.registry = UserRegistry()
+        self.user = User("Saver", investments, registry=self.registry)
+        User("Empty", registry=self.registry)
+        self.storage.save_users(self.registry.users())
+
+    def tearDown(self):
+        self.storage.close()
+
+    def assert_same_investments(self, loaded, saved):
+        self.assertEqual(len(loaded), len(saved))
+        for invest, original in zip(loaded, saved):
+            self.assertEqual(invest.name, original.name)
+            self.assertEqual(invest.total_invest, original.total_invest)
+            self.assertEqual(
+                [(i.name, i.amount) for i in invest.incomes],
+                [(i.name, i.amount) for i in original.incomes],
+            )
+            self.assertEqual(
+                [(e.name, e.amount) for e in invest.expenses],
+                [(e.name, e.amount) for e in original.expenses],
+            )
+            self.assertEqual(invest.roi, original.roi)
+
+    def test_lazy_load(self):
+        registry = self.storage.load_users()
+        self.assertEqual(sorted(registry), ["empty", "saver"])
+        user = registry["SAVER"]
+        self.assertFalse(user.investments_loaded())
+        self.assert_same_investments(list(user.investments), investments)
+        self.assertTrue(user.investments_loaded())
+        self.assertEqual(len(registry["empty"].investments), 0)
+
+    def test_eager_load_and_resave(self):
+        self.user.remove_investment("invest2")
+        self.storage.save_user(self.user)
+        registry = self.storage.load_users(lazy=False)
+        self.assertTrue(registry["saver"].investments_loaded())
+        self.assert_same_investments(
+            list(registry["saver"].investments), [investments[0], investments[2]]
+        )
+        invest = self.storage.load_investment("Saver", "INVEST3")
+        self.assert_same_investments([invest], [investments[2]])
+        self.assertIsNone(self.storage.load_investment("saver", "invest2"))
+
+    def test_delete_user(self):
+        self.storage.delete_user("SAVER")
+        self.assertEqual(list(self.storage.load_users()), ["empty"])
+        self.assertEqual(self.storage.load_investments("saver"), [])
+
+
+CSV_IMPORT = """user,investment,kind,name,amount,total_invest
+alice,Duplex,income,Rent,2000,24000
+alice,Duplex,expense,Taxes,300.004,
+alice,Duplex,expense,Insurance,abc,
+Alice,Condo,income,Rent,1500,
+bob,,income,Rent,1,
+bob,Cabin,,,,50000
+alice,duplex,income,Parking,100,
+"""
+
+JSONL_IMPORT = """{"user": "alice", "investment": "Duplex", "kind": "income", "name": "Rent", "amount": "2000", "total_invest": "24000"}
+{"user": "alice", "investment": "Duplex", "kind": "expense", "name": "Taxes", "amount": 300.004}
+
+not json
+{"user": "alice", "investment": "Duplex", "kind": "loan", "name": "Bank", "amount": "1"}
+"""
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.registry = UserRegistry()
+        User("bob", random_investments(50, seed=3), registry=self.registry)
+        User("Alice", [], registry=self.registry)
+        User(
+            "carol",
+            [
+                Investment(
+                    "Café", [Income("Rent", "2000")], [Expense("Tax", "500")], "1"
+                )
+            ],
+            registry=self.registry,
+        )
+        self.path = os.path.join(tempfile.mkdtemp(), "portfolio.snap")
+        write_snapshot(self.path, self.registry.users())
+
+    def test_views(self):
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 51)
+            self.assertEqual(snapshot.usernames(), ["alice", "bob", "carol"])
+            self.assertEqual(snapshot.user_investments("ALICE"), [])
+            self.assertIsNone(snapshot.user_investments("dave"))
+            views = snapshot.user_investments("bob")
+            for view, investment in zip(views, self.registry["bob"].investments):
+                self.assertEqual(view.name, investment.name)
+                self.assertEqual(view.roi, investment.roi)
+                self.assertEqual(view.total_expense, investment.total_expense)
+                self.assertEqual(
+                    [(item.name, item.amount) for item in view.expenses],
+                    [(item.name, item.amount) for item in investment.expenses],
+                )
+            cafe = snapshot.user_investments("carol")[0]
+            self.assertEqual(cafe.name, "Café")
+            self.assertEqual(cafe.roi, Decimal("18000.00"))
+            expected = InvestmentFrame.from_investments(
+                list(self.registry["bob"].investments) + [cafe.to_investment()],
+                use_numpy=False,
+            ).compute()
+            computed = snapshot.compute(use_numpy=False)
+            for metric in METRICS:
+                self.assertEqual(list(computed[metric]), list(expected[metric]))
+
+    def test_load_users(self):
+        with Snapshot(self.path) as snapshot:
+            registry = snapshot.load_users()
+            self.assertFalse(registry["bob"].investments_loaded())
+            self.assertEqual(
+                [investment.roi for investment in registry["bob"].investments],
+                [investment.roi for investment in self.registry["bob"].investments],
+            )
+
+    def test_rejects_other_files(self):
+        with open(self.path, "r+b") as file:
+            file.seek(8)
+            file.write(b"\x03")
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(24)
+        self.investments = random_investments(20, seed=24)
+        self.user = User("Owner", self.investments, registry=UserRegistry())
+        self.path = os.path.join(tempfile.mkdtemp(), "actuals.hist")
+        self.history = History(self.path, block_size=32)
+        # (day, investment key, is an income, cents) of every actual
+        self.rows = []
+        for month in range(36):
+            day = date(2021 + month // 12, month % 12 + 1, rng.randint(1, 28))
+            for investment in self.investments:
+                key = investment_key(self.user, investment)
+                for item in investment.incomes + investment.expenses:
+                    cents = item.cents + rng.randint(-500, 500)
+                    self.history.record(
+                        (self.user, investment), item, day, from_cents(cents)
+                    )
+                    self.rows.append((day, key, isinstance(item, Income), cents))
+
+    def tearDown(self):
+        self.history.close()
+
+    def scan(self, name, start, end):
+        income = expense = 0
+        for day, row_name, is_income, cents in self.rows:
+            if start <= day < end and name in (None, row_name):
+                if is_income:
+                    income += cents
+                else:
+                    expense += cents
+        return income, expense
+
+    def test_ranges_match_scan(self):
+        rng = random.Random(5)
+        python = History(block_size=32, use_numpy=False)
+        for day, name, is_income, cents in self.rows:
+            item = (Income if is_income else Expense).from_cents("Actual", cents)
+            python.record(name, item, day)
+        for _ in range(100):
+            start = date(2020, 12, 1).toordinal() + rng.randint(0, 1200)
+            start = date.fromordinal(start)
+            end = date.fromordinal(start.toordinal() + rng.randint(0, 500))
+            name = rng.choice([None, "owner#3", "missing"])
+            expected = self.scan(name, start, end)
+            self.assertEqual(self.history.totals_cents(name, start, end), expected)
+            self.assertEqual(python.totals_cents(name, start, end), expected)
+
+    def test_block_index(self):
+        blocks = len(self.history.min_day)
+        self.assertEqual(blocks, -(-len(self.history) // 32))
+        # actuals arrive in date order, so a year only touches the blocks at its edges
+        self.history.totals_cents(None, date(2022, 1, 1), date(2023, 1, 1))
+        self.assertLessEqual(self.history.scanned, 2)
+        self.history.totals_cents(None)
+        self.assertEqual(self.history.scanned, 0)
+
+    def test_realized_roi(self):
+        investment = self.investments[0]
+        pair = (self.user, investment)
+        start, end = self.history.window(months=12)
+        self.assertEqual(end, max(row[0] for row in self.rows) + timedelta(days=1))
+        self.assertEqual(start.year, end.year - 1)
+        income, expense = self.scan("owner#0", start, end)
+        comparison = self.history.compare(pair)
+        self.assertEqual(
+            comparison["realized_annual_cash_flow"], from_cents(income - expense)
+        )
+        self.assertEqual(comparison["projected_roi"], investment.roi)
+        self.assertEqual(
+            comparison["roi_difference"],
+            comparison["realized_roi"] - investment.roi,
+        )
+        self.assertEqual(self.history.realized_roi(pair), comparison["realized_roi"])
+        # a quarter is annualized by its months
+        quarter = self.history.trailing_cash_flow(pair, end, months=3)
+        self.assertEqual(
+            self.history.compare(pair, end, 3)["realized_annual_cash_flow"],
+            quarter * 4,
+        )
+        with self.assertRaises(TypeError):
+            self.history.compare(investment)
+
+    def test_keys(self):
+        history = History()
+        rent = Income("Rent", "1000")
+        bob = User("bob", registry=UserRegistry())
+        alice = User("alice", registry=UserRegistry())
+        duplex = Investment("Duplex", [rent], [], "100000")
+        same_name = Investment("Duplex", [rent], [], "100000")
+        bob.add_investment(duplex)
+        alice.add_investment(same_name)
+        history.record_investment((bob, duplex), "2024-01-01")
+        history.record_investment((alice, same_name), "2024-01-01")
+        history.record((alice, same_name), rent, "2024-02-01", "10")
+        # same-named investments of different users keep apart
+        self.assertEqual(history.cash_flow((bob, duplex)), Decimal("1000"))
+        self.assertEqual(history.cash_flow((alice, same_name)), Decimal("1010"))
+        # and a rename keeps the history
+        duplex.set_name("Triplex")
+        self.assertEqual(history.cash_flow((bob, duplex)), Decimal("1000"))
+        self.assertEqual(history.keys, ["bob#0", "alice#0"])
+        with self.assertRaises(TypeError):
+            history.record(duplex, rent, "2024-03-01")
+        with self.assertRaises(ValueError):
+            history.record((alice, duplex), rent, "2024-03-01")
+
+    def test_keys_survive_reload(self):
+        registry = UserRegistry()
+        ann = User("ann", registry=registry)
+        history = History()
+        for name in ("A", "B", "C"):
+            investment = Investment(name, [Income("Rent", "1000")], [], "100000")
+            ann.add_investment(investment)
+            history.record_investment((ann, investment), "2024-01-01")
+        ann.remove_investment("A")
+        # the newest id is not given out again either
+        ann.remove_investment("C")
+        directory = tempfile.mkdtemp()
+        journal_path = os.path.join(directory, "portfolio.journal")
+        with Journal(journal_path, registry, compact_every=None):
+            pass
+        snapshot_path = os.path.join(directory, "portfolio.snap")
+        write_snapshot(snapshot_path, [ann])
+        storage = SQLiteStorage()
+        storage.save_users([ann])
+
+        with Snapshot(snapshot_path) as snapshot:
+            from_snapshot = snapshot.load_users()["ann"]
+            from_snapshot.investments
+        with Journal(journal_path) as journal:
+            reloaded = [
+                storage.load_users(lazy=False)["ann"],
+                storage.load_users()["ann"],
+                from_snapshot,
+                journal.registry["ann"],
+            ]
+            for user in reloaded:
+                b = user.get_investment("B")
+                self.assertEqual(investment_key(user, b), "ann#1")
+                self.assertEqual(history.cash_flow((user, b)), Decimal("1000"))
+                self.assertEqual(user.add_investment(Investment("D")), 3)
+        storage.close()
+
+    def test_reopen(self):
+        self.history.close()
+        with open(self.path, "ab") as file:
+            # a record cut short by a crash
+            file.write(b"R\x40\x00\x00\x00torn")
+        with History(self.path, block_size=32) as history:
+            self.assertEqual(len(history), len(self.rows))
+            self.assertEqual(
+                history.totals_cents(), self.scan(None, date.min, date.max)
+            )
+            history.record("Extra", Income("Rent", "10"), "2024-06-01")
+        with History(self.path) as history:
+            self.assertEqual(len(history), len(self.rows) + 1)
+            self.assertEqual(history.cash_flow("Extra"), Decimal("10"))
+        with open(self.path, "wb") as file:
+            file.write(b"not a history file")
+        with self.assertRaises(ValueError):
+            History(self.path)
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.registry = UserRegistry()
+        User("bob", random_investments(20, seed=4), registry=self.registry)
+        User(
+            "carol",
+            [
+                Investment(
+                    "Duplex",
+                    [Income("Rent", "2000")],
+                    [Expense("Tax", "500")],
+                    "100000",
+                ),
+                Investment("Free", [Income("Rent", "100")], [], "0"),
+                Investment("Idle", [], [Expense("Tax", "500")], "0"),
+            ],
+            registry=self.registry,
+        )
+        self.directory = tempfile.mkdtemp()
+
+    def test_format_cents(self):
+        for cents in (0, 5, -5, 100, -100, 15012, -15012, 10**20 + 7):
+            self.assertEqual(format_cents(cents), str(from_cents(cents)))
+
+    def test_csv(self):
+        path = os.path.join(self.directory, "report.csv")
+        self.assertEqual(write_report(self.registry.users(), path, chunk_size=7), 23)
+        with open(path, newline="", encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        investments = list(self.registry["bob"].investments)
+        investments += self.registry["carol"].investments
+        self.assertEqual(len(rows), len(investments))
+        for row, investment in zip(rows[:20], investments):
+            self.assertEqual(row["user"], "bob")
+            self.assertEqual(row["investment"], investment.name)
+            self.assertEqual(Decimal(row["cash_flow"]), investment.cash_flow)
+            self.assertEqual(Decimal(row["total_expense"]), investment.total_expense)
+            self.assertEqual(Decimal(row["roi"]), investment.roi)
+        duplex, free, idle = rows[20:]
+        self.assertEqual(duplex["roi"], "0.18")
+        self.assertEqual(free["roi"], "")
+        self.assertEqual(free["annual_cash_flow"], "1200.00")
+        self.assertEqual((idle["total_expense"], idle["roi"]), ("0.00", "0.00"))
+
+    def test_jsonl_and_text(self):
+        path = os.path.join(self.directory, "report.jsonl")
+        write_report([self.registry["carol"]], path, "jsonl")
+        with open(path, encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(
+            [row["investment"] for row in rows], ["Duplex", "Free", "Idle"]
+        )
+        self.assertEqual(rows[0]["total_income"], "2000.00")
+        path = os.path.join(self.directory, "report.txt")
+        write_report([self.registry["carol"]], path, "text")
+        with open(path, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[2].startswith("carol"))
+        self.assertTrue(lines[2].endswith("0.18"))
+        with self.assertRaises(ValueError):
+            write_report([], path, "xml")
+
+    def test_text_overflow(self):
+        rich = User(
+            "rich",
+            [Investment("Tower", [Income("Rent", "123456789012.34")], [], "10")],
+            registry=self.registry,
+        )
+        path = os.path.join(self.directory, "rich.txt")
+        write_report([rich], path, "text")
+        with open(path, encoding="utf-8") as file:
+            line = file.read().splitlines()[2]
+        # total_income is too wide for its column, so it is marked instead of cut short
+        self.assertNotIn("23456789012.34", line)
+        self.assertIn(" " + "#" * 14 + " ", line)
+        self.assertIn(" 1481481468148.08 ", line)
+
+    def test_user_reports(self):
+        for workers in (0, 2):
+            directory = os.path.join(self.directory, str(workers))
+            paths = dict(
+                (user.username, path)
+                for user, path in write_user_reports(
+                    self.registry.users(), directory, workers=workers
+                )
+            )
+            self.assertEqual(sorted(paths), ["bob", "carol"])
+            with open(paths["carol"], encoding="utf-8") as file:
+                self.assertEqual(len(file.read().splitlines()), 4)
+
+    def test_user_report_names(self):
+        users = [
+            User(username, [investment], registry=UserRegistry())
+            for username, investment in zip(("a/b", "a_b", "a b"), investments)
+        ]
+        # the same username from another registry
+        users.append(User("a_b", [], registry=UserRegistry()))
+        for workers in (0, 2):
+            directory = os.path.join(self.directory, f"names{workers}")
+            written = write_user_reports(users, directory, workers=workers)
+            # both users named a_b are listed, each with its own report
+            self.assertEqual([user for user, _ in written], users)
+            paths = [path for _, path in written]
+            self.assertEqual(len(set(paths)), 4)
+            self.assertEqual(
+                sorted(os.listdir(directory)), sorted(map(os.path.basename, paths))
+            )
+            self.assertTrue(paths[0].startswith(os.path.join(directory, "a_b-")))
+            with open(paths[0], encoding="utf-8") as file:
+                self.assertIn("Invest1", file.read())
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "portfolio.journal")
+
+    def state(self, registry):
+        return {
+            user.username: [
+                (
+                    investment.name,
+                    investment.total_invest,
+                    [(item.name, item.amount) for item in investment.incomes],
+                    [(item.name, item.amount) for item in investment.expenses],
+                )
+                for investment in user.investments
+            ]
+            for user in registry.users()
+        }
+
+    def edit(self, registry):
+        bob = User("bob", random_investments(5, seed=5), registry=registry)
+        alice = User("alice", registry=registry)
+        duplex = Investment("Duplex", [Income("Rent", "2000")], [], "100000")
+        alice.add_investment(duplex)
+        duplex.add_expense(Expense("Tax", "500.25"))
+        duplex.set_total_invest("90000")
+        duplex.set_name("Triplex")
+        bob.remove_investment(bob.investments.get_by_id(0))
+        bob.investments.get_by_id(3).incomes[0].set_amount("1.50")
+        User("carol", [Investment("Shed")], registry=registry)
+        registry.unregister("carol")
+
+    def test_recover(self):
+        registry = UserRegistry()
+        journal = Journal(self.path, registry, batch_size=3, compact_every=None)
+        self.edit(registry)
+        journal.commit()
+        expected = self.state(registry)
+        # no close, the process is gone and a torn record is left behind
+        with open(self.path, "ab") as file:
+            file.write(b'0badc0de {"op":')
+        recovered = Journal(self.path, compact_every=None)
+        self.assertEqual(self.state(recovered.registry), expected)
+        self.assertGreater(recovered.recovered, 0)
+        # edits after recovery keep applying to the same investments
+        recovered.registry["bob"].investments.get_by_id(1).set_total_invest("5")
+        recovered.registry["bob"].remove_investment(
+            recovered.registry["bob"].investments.get_by_id(2)
+        )
+        recovered.close()
+        expected = self.state(recovered.registry)
+        with Journal(self.path) as journal:
+            self.assertEqual(self.state(journal.registry), expected)
+
+    def test_compaction(self):
+        registry = UserRegistry()
+        journal = Journal(self.path, registry, batch_size=1, compact_every=10)
+        self.edit(registry)
+        journal.close()
+        self.assertGreater(journal.compactions, 1)
+        snapshots = [
+            name for name in os.listdir(self.directory) if name.endswith(".snap")
+        ]
+        self.assertEqual(len(snapshots), 1)
+        with Journal(self.path) as recovered:
+            self.assertEqual(self.state(recovered.registry), self.state(registry))
+            self.assertLess(recovered.recovered, 10)
+
+    def test_group_commit(self):
+        registry = UserRegistry()
+        user = User("bob", random_investments(8, seed=6), registry=registry)
+        journal = Journal(self.path, registry, compact_every=None)
+
+        def work(investment):
+            for i in range(50):
+                investment.set_total_invest(str(1000 + i))
+                journal.commit()
+
+        threads = [
+            threading.Thread(target=work, args=(investment,))
+            for investment in user.investments
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal.close()
+        with Journal(self.path) as recovered:
+            self.assertEqual(self.state(recovered.registry), self.state(registry))
+
+    def test_concurrent_writers(self):
+        registry = UserRegistry()
+        users = [User(f"user{i}", registry=registry) for i in range(4)]
+        journal = Journal(
+            self.path, registry, batch_size=1, compact_every=5, fsync=False
+        )
+
+        def work(user, seed):
+            for investment in random_investments(40, seed=seed):
+                user.add_investment(investment)
+                investment.set_total_invest("1000")
+            user.remove_investment(user.investments.get_by_id(0))
+
+        threads = [
+            threading.Thread(target=work, args=(user, seed))
+            for seed, user in enumerate(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+        # a writer that compacts or commits under its User's lock deadlocks here
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        journal.close()
+        self.assertGreater(journal.compactions, 1)
+        with Journal(self.path) as recovered:
+            self.assertEqual(self.state(recovered.registry), self.state(registry))
+
+    def test_removed_user_pending(self):
+        registry = UserRegistry()
+        journal = Journal(self.path, registry, compact_every=None)
+        user = User("x", registry=registry)
+        journal.commit()
+        user.add_investment(Investment("Duplex", [Income("Rent", "2000")]))
+        registry.unregister("x")
+        journal.compact()
+        journal.close()
+        with Journal(self.path) as recovered:
+            self.assertEqual(self.state(recovered.registry), {})
+
+    def test_server(self):
+        journal = Journal(self.path, compact_every=None)
+        server = ROIServer(journal=journal)
+        requests = [
+            {"op": "choose_user", "user": "bob"},
+            {
+                "op": "create_investment",
+                "user": "bob",
+                "name": "duplex",
+                "incomes": [{"name": "rent", "amount": "2000"}],
+                "total_invest": "100000",
+            },
+            {
+                "op": "edit_investment",
+                "user": "bob",
+                "name": "duplex",
+                "total_invest": 5,
+            },
+        ]
+        for request in requests:
+            self.assertTrue(asyncio.run(server.handle_request(request))["ok"])
+        # the edits are committed before the responses, so nothing is lost without close
+        recovered = Journal(self.path)
+        duplex = recovered.registry["bob"].get_investment("Duplex")
+        self.assertEqual(duplex.total_invest, Decimal("5.00"))
+        self.assertEqual(duplex.total_income, Decimal("2000.00"))
+        recovered.close()
+
+    def test_rejects_other_files(self):
+        with open(self.path, "w") as file:
+            file.write("user,investment\n")
+        with self.assertRaises(ValueError):
+            Journal(self.path)
+
+
+class TestAllocate(unittest.TestCase):
+    def candidates(self, rng, count):
+        return [
+            Investment(
+                f"Invest{i}",
+                [Income("Rent", rng.randint(0, 3000))] * rng.randint(0, 1),
+                [Expense("Taxes", rng.randint(0, 800))],
+                rng.choice([0, rng.randint(1, 300) * 1000, rng.randint(1, 3000) * 100]),
+            )
+            for i in range(count)
+        ]
+
+    def brute_force(self, invests, budget):
+        best = 0
+        for size in range(len(invests) + 1):
+            for chosen in combinations(invests, size):
+                if sum(investment.total_invest for investment in chosen) <= budget:
+                    cash_flow = sum(
+                        max(investment.annual_cash_flow, 0) for investment in chosen
+                    )
+                    best = max(best, cash_flow)
+        return best
+
+    def test_matches_brute_force(self):
+        rng = random.Random(23)
+        for _ in range(60):
+            invests = self.candidates(rng, rng.randint(0, 10))
+            budget = Decimal(rng.randint(0, 500000))
+            best = self.brute_force(invests, budget)
+            for method in ("auto", "dp", "branch_and_bound"):
+                allocation = allocate(invests, budget, method)
+                self.assertEqual(allocation.annual_cash_flow, best, method)
+                self.assertLessEqual(allocation.total_invest, budget)
+                self.assertTrue(allocation.optimal)
+                self.assertEqual(allocation.gap, 0)
+            greedy = allocate(invests, budget, "greedy")
+            self.assertLessEqual(greedy.annual_cash_flow, best)
+            self.assertGreaterEqual(greedy.upper_bound, best)
+
+    def test_choice(self):
+        duplex = Investment("Duplex", [Income("Rent", "2000")], [], "100000")
+        condo = Investment("Condo", [Income("Rent", "1100")], [], "60000")
+        shed = Investment("Shed", [Income("Rent", "1000")], [], "50000")
+        land = Investment("Land", [], [Expense("Taxes", "100")], "1000")
+        # the best ratio, Duplex, is not in the best choice
+        allocation = allocate([duplex, condo, shed, land], "110000")
+        self.assertEqual(allocation.investments, [condo, shed])
+        self.assertEqual(allocation.annual_cash_flow, Decimal("25200"))
+        with self.assertRaises(ValueError):
+            allocate([duplex], "-1")
+        with self.assertRaises(ValueError):
+            allocate([duplex], "1", method="bogus")
+
+    def test_time_limit(self):
+        # cash flows close to a fixed share of the price make the search long
+        rng = random.Random(5)
+        invests = []
+        for i in range(3000):
+            price = rng.randint(10000, 100000)
+            invests.append(
+                Investment(f"Invest{i}", [Income("Rent", price // 12 + 100)], [], price)
+            )
+        budget = sum(investment.total_invest for investment in invests) / 2
+        greedy = allocate(invests, budget, "greedy")
+        for method in ("branch_and_bound", "dp"):
+            allocation = allocate(invests, budget, method, time_limit=0)
+            self.assertTrue(allocation.timed_out)
+            self.assertLessEqual(allocation.total_invest, budget)
+            self.assertGreaterEqual(allocation.cash_flow_cents, greedy.cash_flow_cents)
+            self.assertGreaterEqual(allocation.upper_bound, allocation.annual_cash_flow)
+            self.assertLess(allocation.gap, 0.01)
+
+
+class TestWorkload(unittest.TestCase):
+    def test_generate(self):
+        requests = list(generate(2000, users=20, seed=3))
+        self.assertEqual(requests, list(generate(2000, users=20, seed=3)))
+        self.assertNotEqual(requests, list(generate(2000, users=20, seed=4)))
+        first = {}
+        for request in requests:
+            first.setdefault(request["user"], request["op"])
+        self.assertEqual(set(first.values()), {"choose_user"})
+        only_views = list(generate(50, users=2, mix={"view_investment": 1}))
+        # views on a user without investments become creates
+        self.assertEqual(
+            {request["op"] for request in only_views},
+            {"choose_user", "create_investment", "view_investment"},
+        )
+        with self.assertRaises(ValueError):
+            list(generate(10, mix={"bogus": 1}))
+
+    def test_replay(self):
+        requests = list(generate(3000, users=30, seed=5))
+        path = os.path.join(tempfile.mkdtemp(), "session.jsonl")
+        write_script(path, requests)
+        self.assertEqual(list(read_script(path)), requests)
+
+        result = replay(read_script(path))
+        self.assertEqual(result.operations, len(requests))
+        self.assertEqual(result.errors, 0)
+        self.assertGreater(result.ops_per_second, 0)
+        latency = result.percentiles()
+        self.assertEqual(latency["all"]["count"], len(requests))
+        self.assertLessEqual(latency["all"]["p50"], latency["all"]["p99"])
+        self.assertLessEqual(latency["all"]["p99.9"], latency["all"]["max"])
+
+        # the registry ends up with what was created and not deleted
+        names = {}
+        for request in requests:
+            owned = names.setdefault(request["user"], set())
+            if request["op"] == "create_investment":
+                owned.add(request["name"])
+            elif request["op"] == "delete_investment":
+                owned.discard(request["name"])
+        for username, owned in names.items():
+            user = result.registry[username]
+            self.assertEqual({i.name for i in user.investments}, owned)
+        sizes = memory_by_type(result.registry)
+        self.assertEqual(sizes["User"]["count"], len(names))
+        self.assertEqual(
+            sizes["Investment"]["count"], sum(len(owned) for owned in names.values())
+        )
+        self.assertGreater(sizes["Income"]["bytes"], 0)
+
+        # requests the calculator rejects are counted and still timed
+        failed = replay(
+            [
+                {"op": "view_investment", "user": "nobody", "name": "Duplex"},
+                {"op": "delete_investment", "user": username, "name": "Missing"},
+            ],
+            registry=result.registry,
+        )
+        self.assertEqual(failed.errors, 2)
+        self.assertEqual(failed.percentiles()["all"]["count"], 2)
+
+    def test_trace_memory(self):
+        result = replay(list(generate(500, users=5, seed=6)), trace_memory=True)
+        self.assertEqual(result.operations, 500)
+        self.assertGreaterEqual(result.peak, result.traced)
+        self.assertGreater(result.traced, 0)
+        self.assertTrue(result.top_allocations)
+        self.assertEqual(result.latencies, {})
+        self.assertFalse(
+            any(
+                site.startswith(replay.__code__.co_filename)
+                for site, _, _ in result.top_allocations
+            )
+        )
+        self.assertIn("memory_by_type", result.to_dict())
+
+    def test_memory_by_type_counts_slots(self):
+        taxes = Expense("Taxes", "100")
+        registry = UserRegistry()
+        User(
+            "Landlord",
+            [Investment(f"Invest{i}", [], [taxes]) for i in range(100)],
+            registry=registry,
+        )
+        sizes = memory_by_type(registry)
+        # the owners list is held in a LineItem slot, Expense adds none of its own
+        self.assertGreaterEqual(
+            sizes["Expense"]["bytes"],
+            sys.getsizeof(taxes) + sys.getsizeof(taxes._owners),
+        )
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "small.csv")
+        with open(self.path, "w") as file:
+            file.write("user,investment,kind,name,amount,total_invest\n")
+            file.write("bob,Duplex,income,Rent,2000,100000\n")
+            file.write("bob,Duplex,expense,Tax,500,\n")
+            file.write("alice,Shed,expense,Paint,10,\n")
+
+    def test_evaluate_matches_batch(self):
+        randoms = random_investments(200, seed=7)
+        expected = batch_evaluate(randoms, workers=0)
+        self.assertEqual(tuple(evaluate(randoms)), METRICS)
+        for results in (evaluate(randoms), evaluate(randoms, chunk_size=50)):
+            for metric in METRICS:
+                self.assertEqual(list(results[metric]), list(expected[metric]))
+
+    def test_evaluate_command(self):
+        output = os.path.join(self.directory, "metrics.csv")
+        self.assertEqual(roi_main(["evaluate", self.path, "--output", output]), 0)
+        with open(output, newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["investment"] for row in rows], ["Duplex", "Shed"])
+        self.assertEqual(rows[0]["roi"], "0.18")
+        self.assertEqual(rows[1]["total_expense"], "0.00")
+        self.assertEqual(roi_main(["allocate", self.path, "--budget", "100"]), 0)
+        self.assertEqual(roi_main(["bogus"]), 2)
+
+    def test_lazy_imports(self):
+        # a small evaluate run must not load the NumPy engine, storage or the server
+        code = (
+            "import sys\n"
+            "from roi.__main__ import main\n"
+            f"main(['evaluate', {self.path!r}])\n"
+            "heavy = ('numpy', 'roi.frame', 'sqlite3', 'asyncio', 'concurrent.futures')\n"
+            "print(','.join(name for name in heavy if name in sys.modules))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+
+class TestImport(unittest.TestCase):
+    def write(self, suffix, text):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def check_csv_result(self, result):
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(result.investments, 3)
+        self.assertEqual([error.line for error in result.errors], [4, 6])
+        self.assertIsInstance(result.errors[0], RowError)
+        alice = result.registry["alice"]
+        duplex = alice.get_investment("Duplex")
+        self.assertEqual(duplex.total_income, Decimal("2100.00"))
+        self.assertEqual(duplex.total_expense, Decimal("300.00"))
+        self.assertEqual(duplex.total_invest, Decimal("24000.00"))
+        self.assertEqual(alice.get_investment("condo").total_income, Decimal("1500"))
+        cabin = result.registry["bob"].get_investment("Cabin")
+        self.assertEqual(len(cabin.incomes), 0)
+        self.assertEqual(cabin.total_invest, Decimal("50000"))
+
+    def test_import_csv(self):
+        self.check_csv_result(import_file(self.write(".csv", CSV_IMPORT)))
+
+    def test_import_csv_parallel(self):
+        path = self.write(".csv", CSV_IMPORT)
+        self.check_csv_result(import_file(path, workers=2))
+
+    def test_import_jsonl(self):
+        path = self.write(".jsonl", JSONL_IMPORT)
+        registry = UserRegistry()
+        result = import_file(path, registry)
+        self.assertIs(result.registry, registry)
+        self.assertEqual([error.line for error in result.errors], [4, 5])
+        duplex = registry["alice"].get_investment("duplex")
+        self.assertEqual(duplex.cash_flow, Decimal("1700.00"))
+        self.assertEqual(duplex.roi, Decimal("0.85"))
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestProjection(unittest.TestCase):
+    def setUp(self):
+        self.invests = [
+            Investment(
+                "Duplex", [Income("Rent", "2000")], [Expense("Tax", "500")], "100000"
+            ),
+            Investment("Vacant", [], [Expense("Tax", "500")], "1000"),
+        ]
+
+    def test_flat_projection(self):
+        projection = project(self.invests, Assumptions(years=10, discount_rate=0.0))
+        self.assertEqual(projection.cash_flow.shape, (2, 120))
+        self.assertTrue((projection.cash_flow[0] == 1500).all())
+        self.assertTrue((projection.cash_flow[1] == 0).all())
+        self.assertEqual(projection.summary(0)["payback_months"], 67)
+        self.assertAlmostEqual(projection.summary(0)["final_roi"], 1.8)
+        self.assertAlmostEqual(projection.summary(0)["npv"], 80000)
+        self.assertIsNone(projection.summary(1)["payback_months"])
+        self.assertIsNone(projection.summary(1)["irr"])
+
+    def test_rejects_partial_years(self):
+        for years in (0, -1, 0.5, 0.9, 1.5):
+            with self.assertRaises(ValueError):
+                project(self.invests, Assumptions(years=years))
+        whole = project(self.invests, Assumptions(years=2.0))
+        self.assertEqual(whole.cash_flow.shape, (2, 24))
+
+    def test_growth_and_loan(self):
+        assumptions = Assumptions(
+            years=30,
+            rent_growth=0.03,
+            expense_inflation=[0.02, 0.0],
+            vacancy=0.05,
+            loan_rate=0.06,
+            loan_years=30,
+        )
+        projection = project(self.invests, assumptions, loan_amounts=[100000, None])
+        self.assertAlmostEqual(projection.income[0, 11], 1900)
+        self.assertAlmostEqual(projection.income[0, 12], 1900 * 1.03)
+        self.assertAlmostEqual(projection.expense[0, 24], 500 * 1.02**2)
+        self.assertAlmostEqual(projection.debt_service[0, 0], 599.55, places=2)
+        self.assertAlmostEqual(projection.loan_balance[0, -1], 0, places=6)
+        self.assertTrue((projection.debt_service[1] == 0).all())
+        summary = projection.summary(0)
+        monthly = (1 + summary["irr"]) ** (1 / 12) - 1
+        flows = numpy.concatenate([[-100000], projection.cash_flow[0]])
+        self.assertAlmostEqual((flows / (1 + monthly) ** numpy.arange(361)).sum(), 0, 4)
+
+        assumptions.expense_inflation = [0.02, 0.0] * 5
+        chunked = project(self.invests * 5, assumptions, [100000, None] * 5, False, 3)
+        self.assertIsNone(chunked.cash_flow)
+        self.assertTrue(numpy.allclose(chunked.npv[::2], projection.npv[0]))
+
+    def test_batched_irr(self):
+        rates = irr([[-1000] + [100] * 12, [-1000, 2000, -1100] + [0] * 10])
+        self.assertAlmostEqual(rates[0], 0.0292285, places=6)
+        self.assertTrue(numpy.isnan(rates[1]))
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestScenarios(unittest.TestCase):
+    def setUp(self):
+        self.invests = [
+            Investment(
+                "Duplex", [Income("Rent", "2000")], [Expense("Tax", "500")], "100000"
+            ),
+            Investment("Vacant", [], [Expense("Tax", "500")], "1000"),
+        ]
+
+    def test_grid(self):
+        grid = sweep(self.invests, income=[0.5, 1.0], expense=[1.0, 3.0])
+        duplex, vacant = grid
+        self.assertEqual(duplex.scenarios, 4)
+        # cash flows of 500, -500, 1500 and 500
+        self.assertAlmostEqual(duplex.mean_cash_flow, 500)
+        self.assertEqual(duplex.negative_cash_flow_probability, 0.25)
+        self.assertEqual(duplex.cash_flow_percentiles[50], 500)
+        self.assertAlmostEqual(duplex.max_roi, 0.18)
+        self.assertEqual(duplex.min_roi, 0)
+        self.assertEqual(vacant.mean_roi, 0)
+        self.assertEqual(vacant.negative_cash_flow_probability, 0)
+
+    def test_monte_carlo_is_reproducible(self):
+        kwargs = dict(
+            income=Normal(1.0, 0.3), expense=Uniform(0.5, 2.0), scenarios=5000
+        )
+        first = sweep(self.invests, seed=7, chunk_size=1000, **kwargs)[0]
+        second = sweep(self.invests, seed=7, chunk_size=1000, workers=2, **kwargs)[0]
+        self.assertEqual(first.roi_percentiles, second.roi_percentiles)
+        self.assertEqual(first.mean_cash_flow, second.mean_cash_flow)
+        self.assertAlmostEqual(first.mean_cash_flow, 2000 - 500 * 1.25, delta=30)
+        self.assertGreater(first.negative_cash_flow_probability, 0)
+        sampled = sweep(
+            self.invests, seed=7, chunk_size=1000, max_samples=500, **kwargs
+        )[0]
+        self.assertAlmostEqual(
+            sampled.roi_percentiles[50], first.roi_percentiles[50], 2
+        )
+        # chunks are folded into a fixed size sample in order, wherever they ran
+        folded = sweep(
+            self.invests, seed=7, chunk_size=1000, max_samples=500, workers=2, **kwargs
+        )[0]
+        self.assertEqual(folded.roi_percentiles, sampled.roi_percentiles)
+        self.assertEqual(folded.max_roi, first.max_roi)
+
+
+def random_investments(count, seed=0):
+    rng = random.Random(seed)
+    investments = []
+    for i in range(count):
+        invest_incomes = [
+            Income(f"income{j}", f"{rng.randint(0, 500000) / 100:.3f}")
+            for j in range(rng.randint(0, 4))
+        ]
+        invest_expenses = [
+            Expense(f"expense{j}", f"{rng.randint(0, 300000) / 100:.3f}")
+            for j in range(rng.randint(0, 4))
+        ]
+        total_invest = str(rng.choice([rng.randint(1, 10**8), -rng.randint(1, 10**6)]))
+        investments.append(
+            Investment(f"invest{i}", invest_incomes, invest_expenses, total_invest)
+        )
+    return investments
+
+
+class TestInvestmentFrame(unittest.TestCase):
+    def assert_frame_matches(self, frame, investments):
+        for row, invest in enumerate(investments):
+            metrics = frame.row_metrics(row)
+            for metric in METRICS:
+                self.assertEqual(metrics[metric], getattr(invest, metric), metric)
+
+    def test_matches_investment(self):
+        randoms = random_investments(500)
+        frame = InvestmentFrame.from_investments(investments + randoms, use_numpy=False)
+        self.assertEqual(len(frame), 503)
+        self.assert_frame_matches(frame, investments + randoms)
+
+    def test_matches_investment_numpy(self):
+        try:
+            frame = InvestmentFrame.from_investments(
+                random_investments(500), use_numpy=True
+            )
+        except ImportError:
+            self.skipTest("numpy is not installed")
+        self.assert_frame_matches(frame, random_investments(500))
+
+    def test_round_trip(self):
+        frame = InvestmentFrame.from_investments(investments)
+        invests = frame.to_investments()
+        self.assertEqual([i.name for i in invests], ["Invest1", "Invest2", "invest3"])
+        self.assertEqual(len(invests[0].incomes), 3)
+        self.assertEqual(invests[0].incomes[1].amount, Decimal("500.12"))
+        self.assertEqual(invests[1].total_invest, Decimal("15.00"))
+        for invest, original in zip(invests, investments):
+            self.assertEqual(invest.roi, original.roi)
+
+    def test_zero_total_invest(self):
+        frame = InvestmentFrame(use_numpy=False)
+        frame.append("empty")
+        self.assertEqual(frame.row_metrics(0)["roi"], Decimal("0"))
+        frame.append("free", [("rent", "100")], [], "0")
+        with self.assertRaises(ZeroDivisionError):
+            frame.compute()
+
+
+class TestBatchEvaluate(unittest.TestCase):
+    def test_matches_single_process(self):
+        randoms = random_investments(300, seed=1)
+        expected = InvestmentFrame.from_investments(randoms, use_numpy=False).compute()
+        for workers in (0, 2):
+            results = batch_evaluate(iter(randoms), workers=workers, chunk_size=64)
+            for metric in METRICS:
+                self.assertEqual(list(results[metric]), list(expected[metric]))
+
+    def test_no_total_invest(self):
+        randoms = random_investments(10, seed=2)
+        randoms.append(Investment("free", [Income("rent", "100")], [], "0"))
+        with self.assertRaisesRegex(ZeroDivisionError, "free"):
+            batch_evaluate(randoms, workers=2, chunk_size=4)
+
+
+class TestRepl(unittest.TestCase):
+    def test_view_without_total_invest(self):
+        user = User("bob", registry=UserRegistry())
+        user.add_investment(Investment("Duplex", [Income("Rent", "2000")], [], "0"))
+        out = io.StringIO()
+        with mock.patch("builtins.input", return_value="duplex"):
+            with contextlib.redirect_stdout(out):
+                view_investment(user)
+        self.assertIn("Cash Flow is 2000", out.getvalue())
+        self.assertIn("ROI is undefined", out.getvalue())
+
+
 if __name__ == "__main__":
     unittest.main()